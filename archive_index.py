@@ -0,0 +1,550 @@
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+from journal import get_journal_path, read_journal_hashes
+from lib import get_destinations
+from manifest_store import get_manifest_dir, read_manifest
+from metadata_cache import MetadataCache, get_cache_path
+
+INDEX_FILENAME = "archive_index.sqlite"
+
+# Format des dates dans l'index : l'ordre alphabétique est l'ordre chronologique
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Colonnes de la table 'files' et leur type SQLite
+INDEX_COLUMNS = {
+    "path": "TEXT",
+    "file_path": "TEXT",
+    "station": "TEXT",
+    "date_acquisition": "TEXT",
+    "year": "INTEGER",
+    "month": "TEXT",
+    "is_timelapse": "INTEGER",
+    "sequence": "INTEGER",
+    "burst": "INTEGER",
+    "size": "INTEGER",
+    "hash": "TEXT",
+    "hash_sha256": "TEXT",
+    "hash_md5_no_metadata": "TEXT",
+}
+
+# Index de la table 'files' : (station, date) sert aussi aux requêtes par station
+INDEXES = {
+    "station_date": ["station", "date_acquisition"],
+    "date": ["date_acquisition"],
+    "timelapse_station_date": ["is_timelapse", "station", "date_acquisition"],
+    "station_burst": ["station", "burst", "sequence"],
+    "sequence": ["sequence"],
+    "hash": ["hash"],
+    "hash_sha256": ["hash_sha256"],
+    "hash_md5_no_metadata": ["hash_md5_no_metadata"],
+}
+
+# Colonnes cherchées par les requêtes sur un hash
+HASH_COLUMNS = ("hash", "hash_sha256", "hash_md5_no_metadata")
+
+# Regroupements possibles des agrégations ; ceux de la table 'monthly' pré-agrégée
+GROUP_COLUMNS = {
+    "station": "station",
+    "year": "year",
+    "month": "month",
+    "day": "substr(date_acquisition, 1, 10)",
+    "is_timelapse": "is_timelapse",
+    "sequence": "sequence",
+}
+MONTHLY_COLUMNS = ("station", "year", "month", "is_timelapse")
+
+
+def get_index_path(cleaned_dir):
+    """Return the location of the archive index of a cleaned directory."""
+    return os.path.join(cleaned_dir, ".tmp", INDEX_FILENAME)
+
+
+def manifest_mtime(cleaned_dir):
+    """
+    Return the last modification time of the manifests of a cleaned directory.
+
+    Returns
+    -------
+    float
+        Latest mtime of the Parquet and CSV manifests and of the placement
+        journal (0 if there are none).
+    """
+    tmp_dir = os.path.join(cleaned_dir, ".tmp")
+    paths = glob.glob(os.path.join(tmp_dir, "structure_*.csv"))
+    paths += glob.glob(get_journal_path(cleaned_dir))
+    for kind in ("timelapse", "camera", "hashes"):
+        paths += glob.glob(
+            os.path.join(get_manifest_dir(cleaned_dir), kind, "**", "*"),
+            recursive=True,
+        )
+    return max((os.path.getmtime(p) for p in paths), default=0)
+
+
+def load_manifests(cleaned_dir):
+    """
+    Gather the placed files of a cleaned directory from its manifests.
+
+    Parameters
+    ----------
+    cleaned_dir : str
+        Path to the cleaned arborescence.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per placed file with the INDEX_COLUMNS: 'path' is the file in
+        the cleaned arborescence, 'file_path' its source. 'burst' numbers the
+        sequences of each station in date order (the images of a burst share
+        it, 'sequence' being their rank in the burst; None for timelapses).
+        The SHA-256 and pixel MD5 come from the 'hashes' manifest
+        (written by run_hash.sh), when it exists.
+
+    Notes
+    -----
+    The MD5 ('hash') of the manifests is only known for the files compared
+    with others during the duplicate check. It is completed with the MD5
+    computed while copying (placement journal, --verify) and then with the
+    MD5 of the placed files kept in the metadata cache (e.g. by upload.py),
+    when their size and date still match.
+    """
+    frames = []
+    for kind, timelapse in (("timelapse", True), ("camera", False)):
+        df = read_manifest(cleaned_dir, kind)
+        if len(df) == 0:
+            continue
+        df = df[df["date_acquisition"].notna() & df["new_name"].notna()]
+        df = df.assign(
+            path=get_destinations(df, cleaned_dir, timelapse=timelapse),
+            is_timelapse=timelapse,
+        )
+        if "sequence" not in df.columns:
+            df["sequence"] = pd.NA
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=list(INDEX_COLUMNS))
+    df = pd.concat(frames, ignore_index=True)
+
+    dates = pd.to_datetime(df["date_acquisition"])
+    df["station"] = df["new_dir"].astype(str)
+    df["date_acquisition"] = dates.dt.strftime(DATE_FORMAT)
+    df["year"] = dates.dt.year
+    df["month"] = dates.dt.strftime("%Y-%m")
+    df["sequence"] = df["sequence"].astype("Int64")
+    # Une rafale commence à chaque image de rang 1 de la station
+    df = df.sort_values(["station", "date_acquisition"], kind="stable")
+    starts = (df["sequence"] == 1).fillna(False).astype(int)
+    df["burst"] = starts.groupby(df["station"]).cumsum().astype("Int64")
+    df.loc[df["is_timelapse"], "burst"] = pd.NA
+    df["hash"] = _placed_hashes(cleaned_dir, df)
+
+    hashes = read_manifest(
+        cleaned_dir, "hashes", ["file_path", "hash_sha256", "hash_md5_no_metadata"]
+    )
+    if len(hashes) > 0:
+        hashes = hashes.assign(
+            path=hashes["file_path"].map(os.path.abspath)
+        ).drop_duplicates("path")
+        df = df.merge(
+            hashes[["path", "hash_sha256", "hash_md5_no_metadata"]],
+            on="path",
+            how="left",
+        )
+    for column in INDEX_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    return df[list(INDEX_COLUMNS)]
+
+
+def _placed_hashes(cleaned_dir, df):
+    """MD5 of the placed files: manifest, then placement journal, then cache."""
+    hashes = (
+        df["hash"].astype(object)
+        if "hash" in df.columns
+        else pd.Series(None, index=df.index, dtype=object)
+    )
+    hashes = hashes.where(hashes.notna(), None)
+    paths = df["path"].map(os.path.abspath)
+
+    # Copies de l'exécution journalisée, si la taille correspond encore
+    recorded = read_journal_hashes(cleaned_dir)
+    if recorded:
+        sizes = pd.to_numeric(df["size"], errors="coerce")
+        known = [
+            recorded[p][1] if p in recorded and recorded[p][0] == size else None
+            for p, size in zip(paths, sizes)
+        ]
+        known = pd.Series(known, index=df.index, dtype=object)
+        hashes = hashes.where(hashes.notna(), known)
+
+    cache_path = get_cache_path(cleaned_dir)
+    missing = hashes.isna()
+    if missing.any() and os.path.exists(cache_path):
+        with MetadataCache(cache_path) as cache:
+            entries = cache.get_many(paths[missing].tolist())
+        cached = pd.Series(
+            [entries[p]["hash_md5"] if p in entries else None for p in paths],
+            index=df.index,
+            dtype=object,
+        )
+        hashes = hashes.where(hashes.notna(), cached)
+    return hashes
+
+
+def _bounds(start=None, end=None):
+    """Convert a date range to index dates; a date-only end includes its day."""
+    bounds = []
+    if start is not None:
+        bounds.append(pd.Timestamp(start).strftime(DATE_FORMAT))
+    else:
+        bounds.append(None)
+    if end is not None:
+        end_ts = pd.Timestamp(end)
+        if len(str(end).strip()) <= 10:
+            end_ts += pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+        bounds.append(end_ts.strftime(DATE_FORMAT))
+    else:
+        bounds.append(None)
+    return bounds
+
+
+def _where(
+    stations=None,
+    start=None,
+    end=None,
+    timelapse=None,
+    sequence=None,
+    burst=None,
+    file_hash=None,
+):
+    """Build the WHERE clause and parameters of a query on the 'files' table."""
+    clauses, params = [], []
+    if stations is not None:
+        stations = list(stations)
+        clauses.append(f"station IN ({','.join('?' * len(stations))})")
+        params += stations
+    start, end = _bounds(start, end)
+    if start is not None:
+        clauses.append("date_acquisition >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("date_acquisition <= ?")
+        params.append(end)
+    if timelapse is not None:
+        clauses.append("is_timelapse = ?")
+        params.append(int(timelapse))
+    if sequence is not None:
+        clauses.append("sequence = ?")
+        params.append(int(sequence))
+    if burst is not None:
+        clauses.append("burst = ?")
+        params.append(int(burst))
+    if file_hash is not None:
+        # Une sous-requête par colonne : chacune utilise son index
+        clauses.append(
+            "rowid IN ("
+            + " UNION ".join(
+                f"SELECT rowid FROM files WHERE {column} = ?" for column in HASH_COLUMNS
+            )
+            + ")"
+        )
+        params += [file_hash] * len(HASH_COLUMNS)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+class ArchiveIndex:
+    """
+    Indexed copy of the manifests of a cleaned archive, stored in SQLite.
+
+    Parameters
+    ----------
+    db_path : str
+        Path of the SQLite database (created if missing).
+
+    Notes
+    -----
+    The 'files' table holds one row per placed file (see load_manifests),
+    indexed as in INDEXES so that range queries on a station and a period,
+    and lookups by sequence, burst or hash, only read the matching rows.
+    The 'monthly' table holds the number of files and bytes per station,
+    month and type, so that the usual aggregations do not scan the files.
+    The index is rebuilt from the manifests, which stay the reference.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def built_at(self):
+        """Return the time of the last build (epoch seconds), or None."""
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'built_at'"
+        ).fetchone()
+        return float(row[0]) if row is not None else None
+
+    def build(self, cleaned_dir):
+        """
+        Rebuild the index from the manifests of a cleaned directory.
+
+        Parameters
+        ----------
+        cleaned_dir : str
+            Path to the cleaned arborescence.
+
+        Returns
+        -------
+        int
+            Number of indexed files.
+        """
+        built_at = time.time()
+        df = load_manifests(cleaned_dir)
+        columns = ", ".join(f"{name} {kind}" for name, kind in INDEX_COLUMNS.items())
+        with self.conn:
+            self.conn.execute("DROP TABLE IF EXISTS files")
+            self.conn.execute("DROP TABLE IF EXISTS monthly")
+            self.conn.execute(f"CREATE TABLE files ({columns})")
+            # Valeurs manquantes pandas -> NULL SQLite
+            rows = df.astype(object).where(df.notna(), None).itertuples(index=False)
+            self.conn.executemany(
+                f"INSERT INTO files VALUES ({','.join('?' * len(INDEX_COLUMNS))})",
+                rows,
+            )
+            for name, index_columns in INDEXES.items():
+                self.conn.execute(
+                    f"CREATE INDEX idx_{name} ON files ({', '.join(index_columns)})"
+                )
+            self.conn.execute(f"""
+                CREATE TABLE monthly AS
+                SELECT {', '.join(MONTHLY_COLUMNS)},
+                    COUNT(*) AS n_files, SUM(size) AS n_bytes
+                FROM files GROUP BY {', '.join(MONTHLY_COLUMNS)}
+                """)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('built_at', ?), ('cleaned_dir', ?)",
+                (str(built_at), os.path.abspath(cleaned_dir)),
+            )
+        self.conn.execute("ANALYZE")
+        return len(df)
+
+    def query(
+        self,
+        stations=None,
+        start=None,
+        end=None,
+        timelapse=None,
+        sequence=None,
+        burst=None,
+        file_hash=None,
+        columns=None,
+        limit=None,
+    ):
+        """
+        Select indexed files.
+
+        Parameters
+        ----------
+        stations : list of str, optional
+            Only these stations (default: None, all of them).
+        start, end : str or datetime, optional
+            Acquisition period, bounds included; an end without time includes
+            its whole day (default: None, unbounded).
+        timelapse : bool, optional
+            Only timelapse frames (True) or camera images (False) (default: None).
+        sequence : int, optional
+            Rank in the burst, e.g. 1 for the first image of each burst
+            (default: None).
+        burst : int, optional
+            Burst number within the station (default: None).
+        file_hash : str, optional
+            MD5, SHA-256 or pixel MD5 of the file (default: None).
+        columns : list of str, optional
+            Columns to return, among INDEX_COLUMNS (default: None, all of them).
+        limit : int, optional
+            Maximum number of rows (default: None).
+
+        Returns
+        -------
+        pandas.DataFrame
+            Matching files, ordered by station and date.
+        """
+        columns = list(columns) if columns is not None else list(INDEX_COLUMNS)
+        unknown = [c for c in columns if c not in INDEX_COLUMNS]
+        if unknown:
+            raise ValueError(f"Colonnes inconnues: {', '.join(unknown)}")
+        where, params = _where(
+            stations, start, end, timelapse, sequence, burst, file_hash
+        )
+        sql = (
+            f"SELECT {', '.join(columns)} FROM files{where} "
+            "ORDER BY station, date_acquisition"
+        )
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def aggregate(
+        self, by=("station",), stations=None, start=None, end=None, timelapse=None
+    ):
+        """
+        Count the indexed files and their bytes by group.
+
+        Parameters
+        ----------
+        by : sequence of str, optional
+            Grouping columns, among GROUP_COLUMNS (default: ("station",)).
+        stations, start, end, timelapse : optional
+            Filters, as in query (default: None).
+
+        Returns
+        -------
+        pandas.DataFrame
+            One row per group with 'n_files' and 'n_bytes'.
+
+        Notes
+        -----
+        Groupings on station, year, month and type without a period are
+        answered from the pre-aggregated 'monthly' table.
+        """
+        by = list(by)
+        unknown = [c for c in by if c not in GROUP_COLUMNS]
+        if unknown:
+            raise ValueError(
+                f"Regroupements inconnus: {', '.join(unknown)}. "
+                f"Possibles: {', '.join(GROUP_COLUMNS)}"
+            )
+        where, params = _where(stations, start, end, timelapse)
+        if start is None and end is None and set(by) <= set(MONTHLY_COLUMNS):
+            table, counts = "monthly", "SUM(n_files), SUM(n_bytes)"
+        else:
+            table, counts = "files", "COUNT(*), SUM(size)"
+        groups = ", ".join(f"{GROUP_COLUMNS[c]} AS {c}" for c in by)
+        sql = f"SELECT {groups + ', ' if by else ''}{counts} FROM {table}{where}"
+        if by:
+            sql += f" GROUP BY {', '.join(by)} ORDER BY {', '.join(by)}"
+        df = pd.read_sql_query(sql, self.conn, params=params)
+        df.columns = by + ["n_files", "n_bytes"]
+        return df
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+
+def open_index(cleaned_dir, rebuild=False):
+    """
+    Open the index of a cleaned directory, (re)building it if needed.
+
+    Parameters
+    ----------
+    cleaned_dir : str
+        Path to the cleaned arborescence.
+    rebuild : bool, optional
+        Rebuild even if the index is up to date (default: False).
+
+    Returns
+    -------
+    ArchiveIndex
+        Index built after the last change of the manifests.
+    """
+    index = ArchiveIndex(get_index_path(cleaned_dir))
+    built_at = index.built_at()
+    if rebuild or built_at is None or manifest_mtime(cleaned_dir) > built_at:
+        t0 = time.perf_counter()
+        n_files = index.build(cleaned_dir)
+        print(
+            f"Index construit: {n_files} fichiers en {time.perf_counter() - t0:.1f} s"
+        )
+    return index
+
+
+def _split(text):
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Query the manifests of a cleaned archive."
+    )
+    parser.add_argument("command", choices=["build", "query", "count"])
+    parser.add_argument("cleaned_dir", help="Cleaned arborescence (CLEANED)")
+    parser.add_argument("--station", default=None, help="Stations, comma separated")
+    parser.add_argument("--from", dest="start", default=None, help="First date")
+    parser.add_argument("--to", dest="end", default=None, help="Last date (included)")
+    kind = parser.add_mutually_exclusive_group()
+    kind.add_argument("--timelapse", dest="timelapse", action="store_true")
+    kind.add_argument("--camera", dest="timelapse", action="store_false")
+    parser.set_defaults(timelapse=None)
+    parser.add_argument("--sequence", type=int, default=None)
+    parser.add_argument("--burst", type=int, default=None)
+    parser.add_argument("--hash", default=None)
+    parser.add_argument(
+        "--columns", default=None, help="Columns to print, comma separated"
+    )
+    parser.add_argument(
+        "--by",
+        default="station",
+        help=f"count: grouping columns among {','.join(GROUP_COLUMNS)}",
+    )
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--output", default=None, help="Write the result to a CSV")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.cleaned_dir):
+        print(f"Error: Directory '{args.cleaned_dir}' not found.")
+        sys.exit(1)
+
+    with open_index(args.cleaned_dir, rebuild=args.command == "build") as index:
+        if args.command == "build":
+            print(f"{index.count()} fichiers dans {index.db_path}")
+            sys.exit(0)
+        stations = _split(args.station) if args.station else None
+        t0 = time.perf_counter()
+        if args.command == "query":
+            result = index.query(
+                stations=stations,
+                start=args.start,
+                end=args.end,
+                timelapse=args.timelapse,
+                sequence=args.sequence,
+                burst=args.burst,
+                file_hash=args.hash,
+                columns=_split(args.columns) if args.columns else None,
+                limit=args.limit,
+            )
+        else:
+            result = index.aggregate(
+                by=_split(args.by),
+                stations=stations,
+                start=args.start,
+                end=args.end,
+                timelapse=args.timelapse,
+            )
+        elapsed_ms = 1000 * (time.perf_counter() - t0)
+        if args.output is not None:
+            result.to_csv(args.output, index=False)
+            print(f"{len(result)} lignes écrites dans {args.output}")
+        else:
+            with pd.option_context("display.max_rows", None, "display.width", 200):
+                print(result.to_string(index=False))
+        print(f"{len(result)} lignes en {elapsed_ms:.1f} ms")
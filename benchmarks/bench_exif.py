@@ -0,0 +1,87 @@
+"""
+Benchmark the fast EXIF reader against the Pillow path on a synthetic corpus.
+
+Usage
+-----
+python benchmarks/bench_exif.py [--n-files 2000] [--workdir /tmp/camtrap_bench_exif]
+"""
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image
+
+from exif_reader import (
+    read_datetime_original,
+    read_datetime_original_pillow,
+    read_exif_fields,
+)
+
+
+def make_corpus(workdir, n_files, size=(2048, 1536)):
+    """Write n_files JPEGs with a DateTimeOriginal and a Reconyx-like maker note."""
+    os.makedirs(workdir, exist_ok=True)
+    base = Image.effect_noise(size, 64).convert("RGB")
+    start = datetime(2024, 6, 1, 12, 0, 0)
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(workdir, f"RCNX{i:04d}.JPG")
+        paths.append(path)
+        if os.path.exists(path):
+            continue
+        exif = Image.Exif()
+        exif[0x010F] = "RECONYX"
+        exif_ifd = exif.get_ifd(0x8769)
+        exif_ifd[0x9003] = (start + timedelta(seconds=7 * i)).strftime(
+            "%Y:%m:%d %H:%M:%S"
+        )
+        exif_ifd[0x927C] = (
+            struct.pack("<H", 0xF101)
+            + b"\x00" * 10
+            + b"M\x00"
+            + struct.pack("<HH", i % 3 + 1, 3)
+        )
+        base.save(path, exif=exif, quality=85)
+    return paths
+
+
+def bench(label, func, paths):
+    t0 = time.perf_counter()
+    for p in paths:
+        func(p)
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<30} {elapsed:8.3f} s  {len(paths) / elapsed:10.0f} files/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--n-files", type=int, default=2000)
+    parser.add_argument(
+        "--workdir", default=os.path.join(tempfile.gettempdir(), "camtrap_bench_exif")
+    )
+    args = parser.parse_args()
+
+    paths = make_corpus(args.workdir, args.n_files)
+
+    # Vérifier que les deux chemins donnent le même résultat
+    for p in paths[:50]:
+        assert read_datetime_original(p) == datetime.strptime(
+            read_datetime_original_pillow(p), "%Y:%m:%d %H:%M:%S"
+        )
+    print(f"Sample maker note fields: {read_exif_fields(paths[1])}")
+
+    slow = bench("Pillow _getexif + TAGS", read_datetime_original_pillow, paths)
+    fast = bench("exif_reader (APP1 only)", read_datetime_original, paths)
+    print(f"Speed-up: x{slow / fast:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Time the steps of main and the main lib functions on synthetic corpora.
+
+For each corpus size, a RAW tree is generated with benchmarks/corpus.py
+(reused if it already exists with the same parameters), then:
+- lib.get_file_paths, lib.extract_metadata, lib.check_doublon and
+  lib.add_sequence2name are timed on the whole corpus,
+- lib.get_metadata_structure and lib.process_files, called once per file,
+  are timed on an evenly spread sample of the files (--sample),
+- main is run in each requested mode and the metrics of its steps are read
+  from the run_metrics_<id>.json it writes (metrics.RunMetrics).
+Everything runs offline. The results, with the machine, package versions and
+git commit, are written as JSON so that runs before and after a change can
+be compared. The full suite (10k, 100k and 1M files) needs about 10 GB of
+disk in the working directory.
+
+Usage
+-----
+python benchmarks/bench_pipeline.py [--sizes 10000,100000,1000000]
+    [--workdir /tmp/camtrap_bench] [--output bench_pipeline.json]
+    [--schema camerainfo|renaming] [--modes batch,streaming,pipelined]
+    [--placement copy] [--sample 5000] [--skip-main]
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import PIL
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate_corpus
+from lib import (
+    StationResolver,
+    add_file_number,
+    add_new_names,
+    add_sequence2name,
+    check_doublon,
+    extract_metadata,
+    get_file_paths,
+    get_metadata_structure,
+    process_files,
+)
+from main_process_images import main as run_main
+
+CORRESPONDENCE_FILES = {
+    "camerainfo": "corresp_camerainfo.csv",
+    "renaming": "corresp_renaming.csv",
+}
+
+
+def timed(name, n_items, func, *args, **kwargs):
+    """
+    Call func once and return (result, record of its duration).
+
+    n_items is the number of items processed, or None to count the items
+    func returns.
+    """
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    seconds = time.perf_counter() - t0
+    if n_items is None:
+        n_items = len(result)
+    record = {
+        "name": name,
+        "n_items": n_items,
+        "seconds": round(seconds, 4),
+        "items_per_s": round(n_items / seconds, 1) if seconds > 0 else None,
+    }
+    print(
+        f"  {name:<28} {n_items:>9} items {seconds:10.3f} s "
+        f"{record['items_per_s'] or 0:12.0f} items/s"
+    )
+    return result, record
+
+
+def sample_evenly(items, n_sample):
+    """Return about n_sample items spread over the whole list."""
+    step = max(1, len(items) // max(1, n_sample))
+    return items[::step][:n_sample]
+
+
+def bench_functions(raw_dir, scratch_dir, corresponding_dir, n_sample, placement):
+    """Time the lib functions on one corpus."""
+    records = []
+    files, record = timed(
+        "get_file_paths", None, get_file_paths, raw_dir, type_file=".jpg"
+    )
+    records.append(record)
+
+    resolver = StationResolver(corresponding_dir)
+    sample = sample_evenly(files, n_sample)
+
+    def metadata_loop():
+        return [get_metadata_structure(f, resolver, ".jpg") for f in sample]
+
+    records.append(timed("get_metadata_structure", len(sample), metadata_loop)[1])
+
+    structure, record = timed(
+        "extract_metadata",
+        len(files),
+        extract_metadata,
+        files,
+        resolver,
+        ".jpg",
+        progress=False,
+    )
+    records.append(record)
+
+    structure = add_file_number(structure)
+    (unique, _), record = timed(
+        "check_doublon", len(structure), check_doublon, structure.copy()
+    )
+    records.append(record)
+
+    named = add_new_names(unique, ".jpg")
+    named, record = timed(
+        "add_sequence2name", len(named), add_sequence2name, named, by="new_dir"
+    )
+    records.append(record)
+
+    rows = named[named["date_acquisition"].notna() & named["new_name"].notna()]
+    rows = sample_evenly(list(rows.itertuples(index=False)), n_sample)
+    shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    def placement_loop():
+        for row in rows:
+            process_files(row, scratch_dir, mode=placement)
+
+    records.append(timed("process_files", len(rows), placement_loop)[1])
+    shutil.rmtree(scratch_dir, ignore_errors=True)
+    return records
+
+
+def bench_main(raw_dir, cleaned_dir, corresponding_dir, mode, placement, log_path):
+    """Run main once and return its wall time and step metrics."""
+    shutil.rmtree(cleaned_dir, ignore_errors=True)
+    t0 = time.perf_counter()
+    with open(log_path, "a", encoding="utf-8") as log:
+        with contextlib.redirect_stdout(log):
+            run_main(
+                raw_dir,
+                corresponding_dir,
+                ".jpg",
+                [],
+                [],
+                [],
+                [],
+                use_cache=False,
+                placement=placement,
+                output_dir=cleaned_dir,
+                streaming=mode == "streaming",
+                pipelined=mode == "pipelined",
+            )
+    wall = time.perf_counter() - t0
+    paths = sorted(glob.glob(os.path.join(cleaned_dir, ".tmp", "run_metrics_*.json")))
+    metrics = None
+    if paths:
+        with open(paths[-1], encoding="utf-8") as f:
+            metrics = json.load(f)
+    print(f"  main ({mode}, {placement}){'':<11} {wall:10.3f} s")
+    if metrics is not None:
+        for stage in metrics["stages"]:
+            print(f"    {stage['name']:<50} {stage['wall_s']:10.3f} s")
+    return {
+        "mode": mode,
+        "placement": placement,
+        "wall_s": round(wall, 3),
+        "metrics": metrics,
+    }
+
+
+def environment():
+    """Describe the machine and the versions the results were obtained with."""
+    try:
+        commit = subprocess.run(
+            ["git", "-C", REPO, "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": {
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "pillow": PIL.__version__,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument(
+        "--workdir", default=os.path.join(tempfile.gettempdir(), "camtrap_bench")
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="JSON results (default: <workdir>/bench_pipeline_<date>.json)",
+    )
+    parser.add_argument(
+        "--schema", choices=sorted(CORRESPONDENCE_FILES), default="camerainfo"
+    )
+    parser.add_argument("--modes", default="batch")
+    parser.add_argument("--placement", default="copy")
+    parser.add_argument("--sample", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-main", action="store_true")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    os.makedirs(args.workdir, exist_ok=True)
+    output = args.output or os.path.join(
+        args.workdir, f"bench_pipeline_{time.strftime('%Y%m%d%H%M%S')}.json"
+    )
+    results = {"environment": environment(), "args": vars(args), "results": []}
+
+    for n_files in sizes:
+        root = os.path.join(args.workdir, f"corpus_{n_files}")
+        print(f"Corpus de {n_files} fichiers: {root}")
+        corpus = generate_corpus(root, n_files=n_files, seed=args.seed)
+        print(f"  généré en {corpus['generate_s']:.1f} s")
+        corresponding_dir = pd.read_csv(
+            os.path.join(root, CORRESPONDENCE_FILES[args.schema]),
+            sep=None,
+            engine="python",
+        )
+        raw_dir = os.path.join(root, "RAW")
+        result = {
+            "n_files": n_files,
+            "corpus": corpus,
+            "functions": bench_functions(
+                raw_dir,
+                os.path.join(root, "SCRATCH"),
+                corresponding_dir,
+                args.sample,
+                args.placement,
+            ),
+            "main": [],
+        }
+        if not args.skip_main:
+            for mode in modes:
+                result["main"].append(
+                    bench_main(
+                        raw_dir,
+                        os.path.join(root, "CLEANED"),
+                        corresponding_dir,
+                        mode,
+                        args.placement,
+                        os.path.join(root, "main.log"),
+                    )
+                )
+        results["results"].append(result)
+        # Écrire après chaque taille pour garder les résultats d'une suite interrompue
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(f"Résultats: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Check and benchmark the vectorized sequence numbering of lib.add_sequence_column.
+
+The vectorized implementation is compared with the former row-by-row loop on
+randomized timestamps (bursts, ties, gaps around the 1-minute threshold,
+missing dates), then timed on a large synthetic table.
+
+Usage
+-----
+python benchmarks/bench_sequence.py [--n-rows 1000000] [--n-checks 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lib import add_sequence_column
+
+
+def legacy_add_sequence_column(df):
+    """Former row-by-row implementation, kept as the reference."""
+    df = df.sort_values("date_acquisition", kind="stable", na_position="last").copy()
+    df.loc[:, "date_acquisition"] = pd.to_datetime(df["date_acquisition"])
+    df.loc[:, "sequence"] = 1
+    sequence_counter = 1
+    time_ref = df.loc[df.index[0], "date_acquisition"]
+    for i in df.index[1:]:
+        current_time = pd.to_datetime(df.loc[i, "date_acquisition"])
+        if current_time <= time_ref + pd.Timedelta(minutes=1):
+            sequence_counter += 1
+            df.loc[i, "sequence"] = sequence_counter
+        else:
+            time_ref = pd.to_datetime(df.loc[i, "date_acquisition"])
+            sequence_counter = 1
+            df.loc[i, "sequence"] = sequence_counter
+    return df
+
+
+def random_structure(rng, n_rows, n_stations):
+    """Random camera-trap-like timestamps: bursts, exact ties and long gaps."""
+    steps = rng.choice(
+        [0, 1, 2, 10, 59, 60, 61, 120, 3600, 86400], size=n_rows
+    ) * np.int64(10**9) + rng.choice([0, 1, 500_000_000], size=n_rows)
+    times = pd.Timestamp("2024-01-01").value + np.cumsum(steps)
+    rng.shuffle(times)
+    dates = pd.Series(pd.to_datetime(times))
+    dates[rng.random(n_rows) < 0.02] = pd.NaT
+    return pd.DataFrame(
+        {
+            "file_path": [f"RCNX{i:06d}.JPG" for i in range(n_rows)],
+            "date_acquisition": dates,
+            "new_dir": rng.choice(
+                [f"station{i}" for i in range(n_stations)], size=n_rows
+            ),
+        }
+    )
+
+
+def check_equivalence(n_checks, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(n_checks):
+        df = random_structure(rng, int(rng.integers(1, 300)), int(rng.integers(1, 4)))
+        grouped = add_sequence_column(df, by="new_dir")
+        for station, sub in df.groupby("new_dir"):
+            expected = legacy_add_sequence_column(sub)
+            single = add_sequence_column(sub)
+            got = grouped[grouped.new_dir == station]
+            assert list(expected.index) == list(single.index) == list(got.index)
+            assert (
+                list(expected.sequence) == list(single.sequence) == list(got.sequence)
+            )
+    print(f"{n_checks} randomized tables: identical to the row-by-row loop")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequence numbering benchmark.")
+    parser.add_argument("--n-rows", type=int, default=1_000_000)
+    parser.add_argument("--n-checks", type=int, default=200)
+    parser.add_argument("--n-legacy", type=int, default=5_000)
+    args = parser.parse_args()
+
+    check_equivalence(args.n_checks)
+
+    rng = np.random.default_rng(1)
+    df = random_structure(rng, args.n_legacy, 1)
+    t0 = time.perf_counter()
+    legacy_add_sequence_column(df)
+    legacy = time.perf_counter() - t0
+    print(f"legacy loop       {args.n_legacy:>9} rows {legacy:8.3f} s")
+
+    df = random_structure(rng, args.n_rows, 70)
+    t0 = time.perf_counter()
+    add_sequence_column(df, by="new_dir")
+    vectorized = time.perf_counter() - t0
+    print(f"vectorized        {args.n_rows:>9} rows {vectorized:8.3f} s")
+    print(
+        f"legacy extrapolated to {args.n_rows} rows: ~{legacy * args.n_rows / args.n_legacy:.0f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
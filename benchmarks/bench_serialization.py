@@ -0,0 +1,96 @@
+"""
+Measure what the metadata stage pickles per file, before and after sharing the resolver.
+
+Before: every joblib task carried (get_metadata_structure, file_path,
+corresponding_dir, type_file), i.e. the whole correspondence DataFrame.
+After: the StationResolver is sent once per worker process through the pool
+initializer and the tasks only carry chunks of file paths
+(lib.extract_metadata).
+
+Usage
+-----
+python benchmarks/bench_serialization.py [--csv list_pp/MB_camerainfo_20250423.csv]
+    [--n-files 100000] [--n-workers 8] [--chunk-size 256]
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from lib import METADATA_CHUNK_SIZE, StationResolver, get_metadata_structure
+
+
+def fake_paths(corresponding_dir, n_files):
+    """Camera-trap-like paths spread over the stations of the table."""
+    column = "station" if "station" in corresponding_dir.columns else "current_name"
+    stations = corresponding_dir[column].dropna().astype(str).tolist()
+    return [
+        f"/data/RAW/MB/{stations[i % len(stations)]}/releve1/100RECNX/RCNX{i % 10000:04d}.JPG"
+        for i in range(n_files)
+    ]
+
+
+def measure(label, payloads, n_files):
+    """Pickle every payload and report the cost per file."""
+    start = time.perf_counter()
+    n_bytes = sum(
+        len(pickle.dumps(p, protocol=pickle.HIGHEST_PROTOCOL)) for p in payloads
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<40} {n_bytes / n_files:10.1f} bytes/file "
+        f"{elapsed / n_files * 1e6:8.2f} us/file  ({n_bytes / 1e6:.1f} Mo in total)"
+    )
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--csv", default=os.path.join(ROOT, "list_pp", "MB_camerainfo_20250423.csv")
+    )
+    parser.add_argument("--n-files", type=int, default=100000)
+    parser.add_argument("--n-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=METADATA_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    corresponding_dir = pd.read_csv(args.csv, sep=None, engine="python")
+    print(
+        f"Correspondence table: {corresponding_dir.shape[0]} rows x "
+        f"{corresponding_dir.shape[1]} columns, {args.n_files} files"
+    )
+    paths = fake_paths(corresponding_dir, args.n_files)
+    resolver = StationResolver(corresponding_dir)
+    for path in paths:
+        resolver.resolve(path)
+
+    before = measure(
+        "DataFrame in every task (before)",
+        ((get_metadata_structure, (p, corresponding_dir, ".jpg")) for p in paths),
+        args.n_files,
+    )
+    measure(
+        "Resolver in every task",
+        ((get_metadata_structure, (p, resolver, ".jpg")) for p in paths),
+        args.n_files,
+    )
+    chunks = [
+        paths[i : i + args.chunk_size] for i in range(0, len(paths), args.chunk_size)
+    ]
+    after = measure(
+        "Resolver once per worker + chunks (after)",
+        [(resolver, ".jpg")] * args.n_workers + chunks,
+        args.n_files,
+    )
+    print(f"Speed-up: x{before / after:.0f}")
+
+
+if __name__ == "__main__":
+    main()
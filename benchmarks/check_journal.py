@@ -0,0 +1,174 @@
+"""
+Check the recovery of interrupted placements from the placement journal.
+
+Each scenario builds a small RAW tree in a temporary folder, leaves the
+placements in the state a crash would (journal cut in the middle of a line,
+move interrupted before the rename of its temporary file, copy renamed but
+not yet recorded), replays the journal and checks every destination against
+its source. A last scenario places files in two successive runs and checks
+that the journal keeps the MD5 of both.
+
+Usage
+-----
+python benchmarks/check_journal.py [--n-files 50]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from journal import (
+    PlacementJournal,
+    get_journal_path,
+    read_journal_hashes,
+    replay_journal,
+)
+from placement import PART_SUFFIX, place_files
+
+
+def md5(path):
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def make_sources(root, n_files):
+    """Files with distinct contents, and the MD5 of each."""
+    src_dir = os.path.join(root, "RAW")
+    os.makedirs(src_dir)
+    sources, hashes = [], {}
+    for i in range(n_files):
+        path = os.path.join(src_dir, f"RCNX{i:04d}.JPG")
+        with open(path, "wb") as f:
+            f.write(os.urandom(1000 + i))
+        sources.append(path)
+        hashes[path] = md5(path)
+    destinations = [os.path.join(root, "CLEANED", os.path.basename(p)) for p in sources]
+    return sources, destinations, hashes
+
+
+def check_destinations(sources, destinations, hashes):
+    for src, dst in zip(sources, destinations):
+        assert os.path.exists(dst), f"{dst} manquant"
+        assert md5(dst) == hashes[src], f"{dst} corrompu"
+        assert not os.path.lexists(dst + PART_SUFFIX), f"{dst}{PART_SUFFIX} restant"
+
+
+def check_truncated_journal(root, n_files):
+    """Copies interrupted half-way, with the last journal line cut."""
+    sources, destinations, hashes = make_sources(root, n_files)
+    journal_path = os.path.join(root, "journal.jsonl")
+    half = n_files // 2
+    with PlacementJournal(journal_path) as journal:
+        place_files(sources[:half], destinations[:half], journal=journal)
+        journal.plan(list(zip(sources[half:], destinations[half:])), "copy")
+    # Copie en cours au moment de l'arrêt : fichier temporaire incomplet
+    os.makedirs(os.path.dirname(destinations[half]), exist_ok=True)
+    with open(destinations[half] + PART_SUFFIX, "wb") as f:
+        f.write(b"\xff\xd8")
+    # Dernière ligne coupée par l'arrêt
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "done", "src": "')
+
+    with PlacementJournal(journal_path, resume=True) as journal:
+        assert len(journal.unfinished()) == n_files - half
+        stats = replay_journal(journal)
+    assert stats["n_files"] == n_files - half, stats
+    check_destinations(sources, destinations, hashes)
+    print(f"journal tronqué: {stats['n_files']} copies rejouées, OK")
+
+
+def check_part_recovery(root, n_files):
+    """Moves interrupted between the move to dst.part and the rename."""
+    sources, destinations, hashes = make_sources(root, n_files)
+    journal_path = os.path.join(root, "journal.jsonl")
+    with PlacementJournal(journal_path) as journal:
+        journal.plan(list(zip(sources, destinations)), "move")
+    os.makedirs(os.path.dirname(destinations[0]))
+    moved = n_files // 2
+    for src, dst in zip(sources[:moved], destinations[:moved]):
+        shutil.move(src, dst + PART_SUFFIX)
+
+    with PlacementJournal(journal_path, resume=True) as journal:
+        replay_journal(journal)
+        assert not journal.unfinished()
+    check_destinations(sources, destinations, hashes)
+    assert not any(os.path.exists(src) for src in sources)
+    print(f"reprise des {PART_SUFFIX}: {moved} déplacements terminés, OK")
+
+
+def check_unrecorded_copy(root, n_files):
+    """Copies renamed to their final name without 'done' record."""
+    sources, destinations, hashes = make_sources(root, n_files)
+    journal_path = os.path.join(root, "journal.jsonl")
+    with PlacementJournal(journal_path) as journal:
+        journal.plan(list(zip(sources, destinations)), "copy")
+    os.makedirs(os.path.dirname(destinations[0]))
+    for dst in destinations:
+        # Données non encore écrites sur disque au moment de l'arrêt
+        with open(dst, "wb") as f:
+            f.write(b"")
+
+    with PlacementJournal(journal_path, resume=True) as journal:
+        stats = replay_journal(journal)
+    assert stats["n_files"] == n_files, stats
+    check_destinations(sources, destinations, hashes)
+    with open(journal_path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert sum(r["op"] == "done" for r in records) == n_files
+    print(f"copies non journalisées: {stats['n_files']} copies refaites, OK")
+
+
+def check_successive_runs(root, n_files):
+    """Two runs into the same CLEANED keep the MD5 computed by both."""
+    sources, destinations, hashes = make_sources(root, n_files)
+    journal_path = get_journal_path(os.path.join(root, "CLEANED"))
+    half = n_files // 2
+    for part in (slice(0, half), slice(half, None)):
+        with PlacementJournal(journal_path, checksum=True) as journal:
+            place_files(sources[part], destinations[part], journal=journal)
+    recorded = read_journal_hashes(os.path.join(root, "CLEANED"))
+    assert len(recorded) == n_files, len(recorded)
+    for src, dst in zip(sources, destinations):
+        assert recorded[os.path.abspath(dst)][1] == hashes[src]
+
+    # Destination remplacée sans hash : son ancien MD5 est oublié
+    os.remove(destinations[0])
+    with PlacementJournal(journal_path) as journal:
+        place_files(sources[:1], destinations[:1], journal=journal)
+    recorded = read_journal_hashes(os.path.join(root, "CLEANED"))
+    assert len(recorded) == n_files - 1, len(recorded)
+    assert os.path.abspath(destinations[0]) not in recorded
+
+    # Nouvelle exécution : le journal est compacté aux copies avec hash
+    PlacementJournal(journal_path).close()
+    with open(journal_path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert sum(r["op"] == "done" for r in records) == n_files - 1
+    assert not any(r["op"] == "plan" for r in records)
+    print(f"exécutions successives: {len(recorded)} MD5 conservés, OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n-files", type=int, default=50)
+    args = parser.parse_args()
+
+    for check in (
+        check_truncated_journal,
+        check_part_recovery,
+        check_unrecorded_copy,
+        check_successive_runs,
+    ):
+        with tempfile.TemporaryDirectory() as root:
+            check(root, args.n_files)
+
+
+if __name__ == "__main__":
+    main()
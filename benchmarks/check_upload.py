@@ -0,0 +1,193 @@
+"""
+Check that uploads skip unchanged files and repair corrupted remote files.
+
+Runs upload.upload_tree on a small tree with both transports:
+- LocalTransport, to a temporary directory,
+- SSHTransport, through fake 'ssh' and 'rsync' commands put first on the
+  PATH: ssh runs the remote command locally, rsync copies the files and,
+  like the real one, skips those whose size and modification time match
+  unless --ignore-times or --checksum is given.
+
+Scenarios:
+- no-op re-upload: a second upload sends nothing and does not call rsync,
+- corrupted transfer: the first copy of a file is corrupted (same size and
+  date); the checksum after the batch catches it and the retry repairs it,
+- corrupted remote file: a file modified on the NAS with the same size and
+  date is found by --rescan and sent again.
+
+Usage
+-----
+python benchmarks/check_upload.py [--n-files 20]
+"""
+
+import argparse
+import os
+import shutil
+import stat
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from upload import LocalTransport, SSHTransport, upload_tree
+
+FAKE_SSH = """#!/bin/sh
+# ssh [-p port] hôte commande : commande exécutée localement
+[ "$1" = "-p" ] && shift 2
+shift
+exec sh -c "$1"
+"""
+
+FAKE_RSYNC = """#!{python}
+import os, shutil, sys
+
+args = sys.argv[1:]
+force = "--ignore-times" in args or "--checksum" in args
+positional, i = [], 0
+while i < len(args):
+    if args[i] == "-e":
+        i += 2
+        continue
+    if not args[i].startswith("-"):
+        positional.append(args[i])
+    i += 1
+src, dest = positional[0], positional[1].split(":", 1)[1]
+state = os.environ["FAKE_RSYNC_STATE"]
+corrupt_path = os.path.join(state, "corrupt")
+corrupt = open(corrupt_path).read() if os.path.exists(corrupt_path) else None
+for path in filter(None, sys.stdin.read().split("\\0")):
+    s, d = os.path.join(src, path), os.path.join(dest, path)
+    if not force and os.path.exists(d):
+        # Vérification rapide de rsync : même taille et même date
+        if os.path.getsize(d) == os.path.getsize(s) and int(
+            os.path.getmtime(d)
+        ) == int(os.path.getmtime(s)):
+            continue
+    os.makedirs(os.path.dirname(d), exist_ok=True)
+    shutil.copy2(s, d)
+    with open(os.path.join(state, "sent"), "a") as f:
+        f.write(path + "\\n")
+    if path == corrupt:
+        os.remove(corrupt_path)
+        with open(d, "r+b") as f:
+            first = f.read(1)
+            f.seek(0)
+            f.write(bytes([first[0] ^ 0xFF]))
+        shutil.copystat(s, d)
+"""
+
+
+def install_fake_commands(bin_dir, state_dir):
+    """Put fake ssh and rsync first on the PATH."""
+    os.makedirs(bin_dir)
+    for name, content in (
+        ("ssh", FAKE_SSH),
+        ("rsync", FAKE_RSYNC.format(python=sys.executable)),
+    ):
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+    os.environ["FAKE_RSYNC_STATE"] = state_dir
+
+
+def make_tree(cleaned_dir, n_files):
+    """A small cleaned arborescence of distinct files."""
+    for i in range(n_files):
+        directory = os.path.join(cleaned_dir, "2024", f"station{i % 3}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"IMG_{i:04d}.JPG"), "wb") as f:
+            f.write(os.urandom(2000 + i))
+
+
+def remote_matches(cleaned_dir, remote_dir, path):
+    with open(os.path.join(cleaned_dir, path), "rb") as f:
+        local = f.read()
+    with open(os.path.join(remote_dir, path), "rb") as f:
+        return f.read() == local
+
+
+def corrupt_keeping_date(path):
+    """Change the first byte of a file, keeping its size and dates."""
+    st = os.stat(path)
+    with open(path, "r+b") as f:
+        first = f.read(1)
+        f.seek(0)
+        f.write(bytes([first[0] ^ 0xFF]))
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def check_transport(name, make_transport, root, n_files, state_dir):
+    cleaned_dir = os.path.join(root, "CLEANED")
+    remote_dir = os.path.join(root, "NAS", "CLEANED")
+    make_tree(cleaned_dir, n_files)
+    target = "2024/station0/IMG_0000.JPG"
+    sent_log = os.path.join(state_dir, "sent")
+
+    # Transfert corrompu une fois : détecté par le contrôle et renvoyé
+    with open(os.path.join(state_dir, "corrupt"), "w") as f:
+        f.write(target)
+    if name == "local":
+        # Sans rsync : corrompre la première copie après l'envoi
+        transport = make_transport(remote_dir)
+        send = transport.send
+
+        def send_corrupt_once(local_root, paths):
+            send(local_root, paths)
+            if os.path.exists(os.path.join(state_dir, "corrupt")) and target in paths:
+                os.remove(os.path.join(state_dir, "corrupt"))
+                corrupt_keeping_date(os.path.join(remote_dir, target))
+
+        transport.send = send_corrupt_once
+    else:
+        transport = make_transport(remote_dir)
+    stats = upload_tree(cleaned_dir, transport, n_streams=2, batch_size=8)
+    assert stats["n_sent"] == n_files and stats["n_failed"] == 0, stats
+    assert remote_matches(cleaned_dir, remote_dir, target)
+    print(f"{name}: transfert corrompu renvoyé, OK")
+
+    # Nouvel envoi sans changement : rien n'est envoyé
+    n_lines = _count_lines(sent_log)
+    stats = upload_tree(cleaned_dir, make_transport(remote_dir), n_streams=2)
+    assert stats["n_sent"] == 0, stats
+    assert _count_lines(sent_log) == n_lines
+    print(f"{name}: nouvel envoi sans changement, rien d'envoyé, OK")
+
+    # Fichier modifié sur le NAS (même taille, même date) : réparé par --rescan
+    corrupt_keeping_date(os.path.join(remote_dir, target))
+    stats = upload_tree(cleaned_dir, make_transport(remote_dir), rescan=True)
+    assert stats["n_sent"] == 1 and stats["n_failed"] == 0, stats
+    assert remote_matches(cleaned_dir, remote_dir, target)
+    print(f"{name}: fichier distant corrompu réparé par --rescan, OK")
+
+
+def _count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n-files", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        state_dir = os.path.join(root, "state")
+        os.makedirs(state_dir)
+        install_fake_commands(os.path.join(root, "bin"), state_dir)
+        for name, make_transport in (
+            ("local", LocalTransport),
+            ("ssh", lambda remote_dir: SSHTransport("nas", remote_dir)),
+        ):
+            case = os.path.join(root, name)
+            os.makedirs(case)
+            check_transport(name, make_transport, case, args.n_files, state_dir)
+            shutil.rmtree(case)
+
+
+if __name__ == "__main__":
+    main()
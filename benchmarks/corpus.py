@@ -0,0 +1,346 @@
+"""
+Generate a synthetic camera-trap RAW tree shaped like the real archives.
+
+Layout: <root>/RAW/<massif>/<Station-Alt>/releve<k>/<1NN>RECNX/RCNX####.JPG,
+with Reconyx-like bursts of three photos one second apart, one timelapse
+photo per day at the configured hour, exact duplicates of some photos (as
+when a card is dumped twice), AVI clips with an IDIT date and two
+correspondence tables, one per schema accepted by lib.StationResolver:
+corresp_camerainfo.csv ('station', 'running', 'move_to', 'timelapse') and
+corresp_renaming.csv ('current_name', 'replacement_name', 'site').
+
+The JPEGs are a small noise image encoded once; each file is that template
+with its own DateTimeOriginal and a COM segment holding a unique id and a
+random padding, so files are distinct and have varied sizes. Generating a
+million files only costs writing them.
+
+Usage
+-----
+python benchmarks/corpus.py <root> [--n-files 10000] [--seed 0]
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+# Sites utilisés pour nommer les stations ('Blaitiere-1700'...)
+SITES = [
+    "Blaitiere",
+    "Para",
+    "LesPres",
+    "Loriaz",
+    "Charamillon",
+    "Tour",
+    "Argentiere",
+    "Montroc",
+    "Plan",
+    "Lognan",
+]
+
+MASSIFS = ["MB", "BA"]
+
+# Date écrite dans le modèle, remplacée fichier par fichier
+DATE_PLACEHOLDER = b"2000:01:01 00:00:00"
+
+# Nombre maximal de photos d'un dossier 1NNRECNX
+FILES_PER_FOLDER = 9999
+
+DEFAULTS = {
+    "n_files": 10000,
+    "files_per_station": 5000,
+    "files_per_releve": 2500,
+    "burst_size": 3,
+    "timelapse_hour": 9,
+    "duplicate_rate": 0.01,
+    "avi_rate": 0.02,
+    "image_size": (64, 48),
+    "max_padding": 2048,
+    "start": "2022-06-01",
+    "seed": 0,
+}
+
+CORPUS_INFO = "corpus.json"
+
+
+def jpeg_template(image_size, seed=0):
+    """
+    Encode the noise image shared by all the photos.
+
+    Returns
+    -------
+    tuple of (bytes, int, int)
+        JPEG bytes, offset of the DateTimeOriginal value and offset right
+        after the Exif APP1 segment, where the COM segment is inserted.
+    """
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(image_size[1], image_size[0], 3))
+    image = Image.fromarray(pixels.astype(np.uint8), "RGB")
+    exif = Image.Exif()
+    exif[0x010F] = "RECONYX"
+    exif.get_ifd(0x8769)[0x9003] = DATE_PLACEHOLDER.decode()
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", exif=exif, quality=85)
+    data = buffer.getvalue()
+
+    # Parcourir les segments jusqu'à l'APP1 Exif
+    offset = 2
+    while data[offset] == 0xFF and data[offset + 1] != 0xE1:
+        offset += 2 + struct.unpack(">H", data[offset + 2 : offset + 4])[0]
+    app1_end = offset + 2 + struct.unpack(">H", data[offset + 2 : offset + 4])[0]
+    return data, data.index(DATE_PLACEHOLDER), app1_end
+
+
+def avi_stub(date):
+    """Return a minimal RIFF/AVI file whose IDIT chunk holds date."""
+    idit = date.strftime("%a %b %d %H:%M:%S %Y").encode() + b"\n\x00"
+    avih = struct.pack("<4sI", b"avih", 56) + b"\x00" * 56
+    hdrl = b"LIST" + struct.pack("<I", 4 + len(avih)) + b"hdrl" + avih
+    idit_chunk = b"IDIT" + struct.pack("<I", len(idit)) + idit
+    movi = b"LIST" + struct.pack("<I", 4 + 8) + b"movi" + b"00dc" + b"\x00" * 4
+    body = b"AVI " + hdrl + idit_chunk + movi
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def station_dates(rng, n_photos, start, burst_size, timelapse_hour):
+    """
+    Acquisition dates of one station: daily timelapse shots plus bursts.
+
+    Returns
+    -------
+    tuple of (numpy.ndarray, int)
+        Sorted datetime64[s] dates and number of timelapse shots.
+    """
+    n_days = max(1, n_photos // 50)
+    start = np.datetime64(start, "s") + np.timedelta64(
+        int(rng.integers(0, 365)) * 86400, "s"
+    )
+    # Timelapse : une photo par jour à l'heure programmée, 0 à 8 s de retard
+    days = np.arange(n_days) * 86400 + timelapse_hour * 3600
+    timelapse = days + rng.integers(0, 9, size=n_days)
+
+    # Déclenchements : rafales de burst_size photos à une seconde d'intervalle,
+    # loin de l'heure du timelapse
+    n_bursts = -(-(n_photos - n_days) // burst_size)
+    burst_days = rng.integers(0, n_days, size=n_bursts) * 86400
+    burst_times = rng.integers(0, 86400 - burst_size, size=n_bursts)
+    near_timelapse = np.abs(burst_times - timelapse_hour * 3600) < 60
+    burst_times[near_timelapse] += 120
+    burst_starts = burst_days + burst_times
+    bursts = (burst_starts[:, None] + np.arange(burst_size)).ravel()
+    bursts = bursts[: n_photos - n_days]
+
+    offsets = np.sort(np.concatenate([timelapse, bursts]))
+    return start + offsets.astype("timedelta64[s]"), n_days
+
+
+def format_exif_dates(dates):
+    """Format datetime64 dates as EXIF 'YYYY:MM:DD HH:MM:SS' bytes."""
+    text = np.datetime_as_string(dates, unit="s")
+    text = np.char.replace(np.char.replace(text, "-", ":"), "T", " ")
+    return [value.encode() for value in text]
+
+
+def stations_of(n_files, files_per_station):
+    """Return (massif, folder name, station id) of the stations of the corpus."""
+    n_stations = max(1, -(-n_files // files_per_station))
+    stations = []
+    for i in range(n_stations):
+        site = SITES[i % len(SITES)]
+        altitude = 1200 + 100 * (i // len(SITES))
+        folder = f"{site}-{altitude}"
+        stations.append(
+            (MASSIFS[i % len(MASSIFS)], folder, f"{site.lower()}{altitude}")
+        )
+    return stations
+
+
+def write_correspondence(root, stations, timelapse_hour):
+    """Write the correspondence tables of both schemas."""
+    hour = timelapse_hour % 12 or 12
+    schedule = f"{hour}{'am' if timelapse_hour < 12 else 'pm'}"
+    pd.DataFrame(
+        {
+            "h_tlapse": [massif for massif, _, _ in stations],
+            "station": [station for _, _, station in stations],
+            "running": "Y",
+            "move_to": None,
+            "timelapse": schedule,
+        }
+    ).to_csv(os.path.join(root, "corresp_camerainfo.csv"), index=False)
+    pd.DataFrame(
+        {
+            "current_name": [station for _, _, station in stations],
+            "replacement_name": [
+                f"{massif.lower()}{i:03d}" for i, (massif, _, _) in enumerate(stations)
+            ],
+            "site": [massif for massif, _, _ in stations],
+        }
+    ).to_csv(os.path.join(root, "corresp_renaming.csv"), sep=";", index=False)
+
+
+def generate_corpus(root, **params):
+    """
+    Generate a synthetic RAW tree, unless the same one already exists.
+
+    Parameters
+    ----------
+    root : str
+        Output directory; the photos are written under root/RAW.
+    **params
+        Overrides of DEFAULTS: 'n_files' (number of photos and clips),
+        'files_per_station', 'files_per_releve', 'burst_size',
+        'timelapse_hour', 'duplicate_rate', 'avi_rate', 'image_size',
+        'max_padding', 'start' and 'seed'.
+
+    Returns
+    -------
+    dict
+        Parameters and counts of the corpus ('n_jpg', 'n_timelapse',
+        'n_duplicates', 'n_avi', 'n_bytes', 'n_stations', 'generate_s'), also
+        saved in root/corpus.json.
+    """
+    params = {**DEFAULTS, **params}
+    params["image_size"] = list(params["image_size"])
+    info_path = os.path.join(root, CORPUS_INFO)
+    if os.path.exists(info_path):
+        with open(info_path, encoding="utf-8") as f:
+            info = json.load(f)
+        if info["params"] == params:
+            return info
+        # Corpus généré avec d'autres paramètres
+        shutil.rmtree(root)
+    elif os.path.isdir(root) and os.listdir(root):
+        raise ValueError(f"{root} n'est pas vide et n'est pas un corpus généré")
+    os.makedirs(root, exist_ok=True)
+
+    t0 = time.perf_counter()
+    rng = np.random.default_rng(params["seed"])
+    template, date_offset, com_offset = jpeg_template(
+        params["image_size"], params["seed"]
+    )
+    head, tail = template[:date_offset], template[date_offset + len(DATE_PLACEHOLDER) :]
+    tail_head, tail_rest = (
+        tail[: com_offset - date_offset - len(DATE_PLACEHOLDER)],
+        tail[com_offset - date_offset - len(DATE_PLACEHOLDER) :],
+    )
+    padding = bytes(params["max_padding"])
+
+    stations = stations_of(params["n_files"], params["files_per_station"])
+    write_correspondence(root, stations, params["timelapse_hour"])
+    counts = {"n_jpg": 0, "n_timelapse": 0, "n_duplicates": 0, "n_avi": 0, "n_bytes": 0}
+    remaining = params["n_files"]
+    file_id = 0
+    for i, (massif, folder, _) in enumerate(stations):
+        n_station = min(params["files_per_station"], remaining)
+        remaining -= n_station
+        n_avi = int(n_station * params["avi_rate"])
+        n_duplicates = int(n_station * params["duplicate_rate"])
+        n_photos = n_station - n_avi - n_duplicates
+        dates, n_timelapse = station_dates(
+            rng,
+            n_photos,
+            params["start"],
+            params["burst_size"],
+            params["timelapse_hour"],
+        )
+        exif_dates = format_exif_dates(dates)
+        sizes = rng.integers(0, params["max_padding"] + 1, size=n_photos)
+        counts["n_timelapse"] += n_timelapse
+
+        station_dir = os.path.join(root, "RAW", massif, folder)
+        written = []
+        for j in range(n_photos):
+            releve, index = divmod(j, params["files_per_releve"])
+            subfolder, number = divmod(index, FILES_PER_FOLDER)
+            directory = os.path.join(
+                station_dir, f"releve{releve + 1}", f"{100 + subfolder}RECNX"
+            )
+            if number == 0:
+                os.makedirs(directory, exist_ok=True)
+            payload = f"camtrap-bench {file_id:012d}".encode() + padding[: sizes[j]]
+            com = b"\xff\xfe" + struct.pack(">H", 2 + len(payload)) + payload
+            data = head + exif_dates[j] + tail_head + com + tail_rest
+            path = os.path.join(directory, f"RCNX{number + 1:04d}.JPG")
+            with open(path, "wb") as f:
+                f.write(data)
+            written.append((directory, number, data))
+            counts["n_bytes"] += len(data)
+            file_id += 1
+        counts["n_jpg"] += n_photos
+
+        # Doublons exacts, sous un autre numéro du même dossier
+        last_number = {}
+        for directory, number, _ in written:
+            last_number[directory] = max(last_number.get(directory, 0), number + 1)
+        for k in rng.choice(
+            len(written), size=min(n_duplicates, len(written)), replace=False
+        ):
+            directory, _, data = written[k]
+            last_number[directory] += 1
+            path = os.path.join(directory, f"RCNX{last_number[directory]:04d}.JPG")
+            with open(path, "wb") as f:
+                f.write(data)
+            counts["n_duplicates"] += 1
+            counts["n_bytes"] += len(data)
+
+        # Vidéos déposées dans le premier relevé
+        if n_avi:
+            directory = os.path.join(station_dir, "releve1", "100RECNX")
+            os.makedirs(directory, exist_ok=True)
+            for k, date in enumerate(rng.choice(dates, size=n_avi)):
+                data = avi_stub(pd.Timestamp(date).to_pydatetime())
+                with open(os.path.join(directory, f"IMAG{k + 1:04d}.AVI"), "wb") as f:
+                    f.write(data)
+                counts["n_bytes"] += len(data)
+            counts["n_avi"] += n_avi
+
+    info = {
+        "params": params,
+        **counts,
+        "n_stations": len(stations),
+        "generate_s": round(time.perf_counter() - t0, 3),
+    }
+    with open(info_path, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("root")
+    parser.add_argument("--n-files", type=int, default=DEFAULTS["n_files"])
+    parser.add_argument(
+        "--files-per-station", type=int, default=DEFAULTS["files_per_station"]
+    )
+    parser.add_argument(
+        "--timelapse-hour", type=int, default=DEFAULTS["timelapse_hour"]
+    )
+    parser.add_argument(
+        "--duplicate-rate", type=float, default=DEFAULTS["duplicate_rate"]
+    )
+    parser.add_argument("--avi-rate", type=float, default=DEFAULTS["avi_rate"])
+    parser.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+    args = parser.parse_args()
+
+    info = generate_corpus(
+        args.root,
+        n_files=args.n_files,
+        files_per_station=args.files_per_station,
+        timelapse_hour=args.timelapse_hour,
+        duplicate_rate=args.duplicate_rate,
+        avi_rate=args.avi_rate,
+        seed=args.seed,
+    )
+    print(json.dumps({k: v for k, v in info.items() if k != "params"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Colonnes d'une table de règles de correction des dates
+RULE_COLUMNS = [
+    "station",
+    "selector",
+    "reference_image",
+    "true_date",
+    "offset",
+    "offset_unit",
+]
+
+# Colonnes d'audit ajoutées à la structure
+OFFSET_COLUMN = "date_offset"
+RULE_COLUMN = "date_rule"
+
+# Comme l'ancien patch_area : décalage tronqué au jour entier (l'heure est juste)
+DEFAULT_OFFSET_UNIT = "D"
+
+
+def _is_set(value):
+    return value is not None and not pd.isna(value) and str(value).strip() != ""
+
+
+def make_rules(rules):
+    """
+    Normalize and check a table of date correction rules.
+
+    Parameters
+    ----------
+    rules : pandas.DataFrame, list of dict or str
+        Rules with RULE_COLUMNS (missing columns are empty), or the path of
+        a CSV or JSON file of rules (see load_rules). Each rule has:
+        - 'station': station (new_dir) to correct,
+        - 'selector': pandas query selecting the files of the station to
+          correct, e.g. "file_number > 141" (empty: the whole station),
+        - either 'reference_image' and 'true_date': name of an image (with or
+          without extension) and its true date, the offset being the
+          difference with its recorded date, truncated to 'offset_unit'
+          ('D' by default, 's' to keep hours and minutes),
+        - or 'offset': a fixed offset, e.g. "-1 days 02:00:00" or "3h".
+
+    Returns
+    -------
+    pandas.DataFrame
+        Rules with RULE_COLUMNS, empty values as None. The index of a
+        DataFrame is kept: it numbers the rules in the audit column.
+
+    Raises
+    ------
+    ValueError
+        If a rule has no station, or not exactly one of a reference image
+        with its true date and an offset.
+    """
+    if isinstance(rules, str):
+        rules = load_rules(rules)
+    rules = pd.DataFrame(rules)
+    for column in RULE_COLUMNS:
+        if column not in rules.columns:
+            rules[column] = None
+    # Colonnes 'object' : les valeurs absentes restent None
+    rules = pd.DataFrame(
+        [
+            {key: value if _is_set(value) else None for key, value in rule.items()}
+            for rule in rules[RULE_COLUMNS].to_dict("records")
+        ],
+        columns=RULE_COLUMNS,
+        index=rules.index,
+        dtype=object,
+    )
+    for i, rule in zip(rules.index, rules.to_dict("records")):
+        has_reference = rule["reference_image"] is not None
+        if rule["station"] is None:
+            raise ValueError(f"Règle {i}: pas de station")
+        if has_reference != (rule["true_date"] is not None):
+            raise ValueError(
+                f"Règle {i} ({rule['station']}): 'reference_image' et 'true_date' "
+                "vont ensemble"
+            )
+        if has_reference == (rule["offset"] is not None):
+            raise ValueError(
+                f"Règle {i} ({rule['station']}): donner une image de référence "
+                "ou un décalage, pas les deux"
+            )
+    return rules
+
+
+def load_rules(path):
+    """
+    Read a table of date correction rules.
+
+    Parameters
+    ----------
+    path : str
+        CSV file (separator detected) or JSON file (list of objects) with
+        RULE_COLUMNS.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Rules, not yet checked (see make_rules).
+    """
+    if os.path.splitext(path)[1].lower() == ".json":
+        with open(path, encoding="utf-8") as f:
+            return pd.DataFrame(json.load(f))
+    return pd.read_csv(path, sep=None, engine="python", dtype=str)
+
+
+def rules_from_patches(
+    area2patch_g, query_condition_g, last_image_issue_g, correct_date_g
+):
+    """
+    Convert the per-area corrections of main to a rule table.
+
+    Parameters
+    ----------
+    area2patch_g, query_condition_g, last_image_issue_g, correct_date_g : list
+        One entry per area: station, selector, reference image and its true
+        date; entries without area are ignored.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Rules as returned by make_rules.
+    """
+    return make_rules(
+        [
+            {
+                "station": area2patch,
+                "selector": query_condition,
+                "reference_image": last_image_issue,
+                "true_date": correct_date,
+            }
+            for area2patch, query_condition, last_image_issue, correct_date in zip(
+                area2patch_g, query_condition_g, last_image_issue_g, correct_date_g
+            )
+            if area2patch
+        ]
+    )
+
+
+def collect_rules(
+    area2patch_g,
+    query_condition_g,
+    last_image_issue_g,
+    correct_date_g,
+    date_rules=None,
+):
+    """
+    Gather the per-area corrections of main and a rule table.
+
+    Parameters
+    ----------
+    area2patch_g, query_condition_g, last_image_issue_g, correct_date_g : list
+        Per-area corrections (see rules_from_patches).
+    date_rules : pandas.DataFrame, list of dict or str, optional
+        More rules, or the path of their file (default: None).
+
+    Returns
+    -------
+    pandas.DataFrame
+        All the rules, as returned by make_rules.
+    """
+    rules = rules_from_patches(
+        area2patch_g, query_condition_g, last_image_issue_g, correct_date_g
+    )
+    if date_rules is not None:
+        rules = pd.concat([rules, make_rules(date_rules)], ignore_index=True)
+    return rules
+
+
+def _group_positions(keys):
+    """
+    Group the rows by key.
+
+    Returns
+    -------
+    tuple of (pandas.Index, numpy.ndarray, numpy.ndarray)
+        Distinct keys, positions of the rows sorted by key (increasing within
+        a key) and bounds: the rows of key k are order[bounds[k]:bounds[k + 1]].
+    """
+    codes, uniques = pd.factorize(keys)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return pd.Index(uniques), order, bounds
+
+
+def _stem(file_path):
+    """Name of a file without folder nor extension."""
+    return os.path.splitext(os.path.basename(str(file_path)))[0]
+
+
+def reference_index(structure, rows):
+    """
+    Index some images by station and name.
+
+    Parameters
+    ----------
+    structure : pandas.DataFrame
+        File metadata with 'file_path' and 'new_dir' columns.
+    rows : numpy.ndarray
+        Positions of the rows to index (e.g. those of the stations with a
+        reference image).
+
+    Returns
+    -------
+    _KeyPositions
+        Lookup whose get((station, name without extension)) returns the
+        positions of the images, or None.
+    """
+    rows = np.sort(rows)
+    subset = structure.iloc[rows]
+    # Dossier et extension retirés en une seule passe vectorisée
+    stems = (
+        subset["file_path"]
+        .astype(str)
+        .str.replace(r"^.*[/\\]|\.[^./\\]*$", "", regex=True)
+    )
+    keys = subset["new_dir"].astype(str) + "/" + stems
+    uniques, order, bounds = _group_positions(keys)
+    return _KeyPositions(uniques, rows[order], bounds)
+
+
+class _KeyPositions:
+    """Positions of the rows of each key, found through a hash table."""
+
+    def __init__(self, uniques, positions, bounds):
+        self.uniques = uniques
+        self.positions = positions
+        self.bounds = bounds
+
+    def get(self, key):
+        code = self.uniques.get_indexer(["/".join(key)])[0]
+        if code < 0:
+            return None
+        return self.positions[self.bounds[code] : self.bounds[code + 1]]
+
+
+def _reference_position(structure, rule, rows, references):
+    """Position of the reference image of a rule among its selected rows."""
+    candidates = None
+    if references is not None:
+        candidates = references.get((rule["station"], _stem(rule["reference_image"])))
+    if candidates is not None:
+        candidates = candidates[np.isin(candidates, rows)]
+        if len(candidates) > 0:
+            return candidates[0]
+    # Identifiant qui n'est pas un nom de fichier (ex: 'releve2/RCNX3502')
+    paths = structure["file_path"].iloc[rows].astype(str)
+    matches = rows[paths.str.contains(rule["reference_image"], regex=False).values]
+    if len(matches) == 0:
+        raise ValueError(
+            f"Image de référence '{rule['reference_image']}' introuvable parmi "
+            f"les fichiers sélectionnés de {rule['station']}"
+        )
+    return matches[0]
+
+
+def apply_date_corrections(structure, rules, audit=True):
+    """
+    Correct the acquisition dates of the files selected by a table of rules.
+
+    Parameters
+    ----------
+    structure : pandas.DataFrame
+        File metadata with 'file_path', 'new_dir' and 'date_acquisition'
+        columns, and those used by the selectors (e.g. 'file_number').
+    rules : pandas.DataFrame, list of dict or str
+        Correction rules, see make_rules.
+    audit : bool, optional
+        Add the OFFSET_COLUMN ('date_offset', offset applied to each file,
+        NaT if none) and RULE_COLUMN ('date_rule', number of the rule
+        applied) columns (default: True).
+
+    Returns
+    -------
+    pandas.DataFrame
+        structure, with corrected 'date_acquisition' as datetime64.
+
+    Raises
+    ------
+    ValueError
+        If two rules select the same file, or if a reference image is not
+        found among the files selected by its rule.
+
+    Notes
+    -----
+    The files of each station are located once, as are the images by
+    (station, name), so that a rule only reads the rows of its station and
+    finds its reference image without scanning the paths. The offsets of
+    all the rules are then added to the dates in a single operation.
+    Rules on stations without files are skipped with a warning.
+    """
+    rules = make_rules(rules)
+    dates = pd.to_datetime(structure["date_acquisition"])
+    offsets = np.full(len(structure), np.timedelta64("NaT"), dtype="timedelta64[ns]")
+    owners = np.full(len(structure), -1)
+    uniques, order, bounds = _group_positions(structure["new_dir"])
+    station_rows = {
+        station: order[bounds[code] : bounds[code + 1]]
+        for code, station in enumerate(uniques)
+    }
+    reference_stations = set(rules.loc[rules["reference_image"].notna(), "station"])
+    reference_rows = [
+        rows for station, rows in station_rows.items() if station in reference_stations
+    ]
+    references = (
+        reference_index(structure, np.concatenate(reference_rows))
+        if reference_rows
+        else None
+    )
+
+    labels = rules.index
+    for k, (i, rule) in enumerate(zip(labels, rules.to_dict("records"))):
+        rows = station_rows.get(rule["station"])
+        if rows is None:
+            print(f"Warning: règle {i}, pas de fichiers pour {rule['station']}")
+            continue
+        if rule["selector"] is not None:
+            selected = structure.iloc[rows].eval(rule["selector"])
+            rows = rows[np.asarray(selected, dtype=bool)]
+        overlap = rows[owners[rows] >= 0]
+        if len(overlap) > 0:
+            raise ValueError(
+                f"Les règles {labels[owners[overlap[0]]]} et {i} sélectionnent "
+                f"{len(overlap)} fichiers en commun (ex: "
+                f"{structure['file_path'].iloc[overlap[0]]})"
+            )
+        owners[rows] = k
+        if rule["offset"] is not None:
+            offset = pd.Timedelta(rule["offset"]).to_timedelta64()
+        else:
+            position = _reference_position(structure, rule, rows, references)
+            recorded = dates.iloc[position]
+            if pd.isna(recorded):
+                raise ValueError(
+                    f"Image de référence '{rule['reference_image']}' sans date"
+                )
+            unit = rule["offset_unit"] or DEFAULT_OFFSET_UNIT
+            offset = (
+                (pd.Timestamp(rule["true_date"]) - recorded)
+                .to_timedelta64()
+                .astype(f"timedelta64[{unit}]")
+            )
+        offsets[rows] = offset
+
+    offsets = pd.Series(offsets, index=structure.index)
+    structure["date_acquisition"] = dates.where(owners < 0, dates + offsets)
+    if audit:
+        structure[OFFSET_COLUMN] = offsets
+        # Numéro de la règle (index de la table), manquant si aucune
+        rule_numbers = pd.Series(
+            labels[np.maximum(owners, 0)] if len(labels) > 0 else owners,
+            index=structure.index,
+        )
+        if pd.api.types.is_integer_dtype(rule_numbers):
+            rule_numbers = rule_numbers.astype("Int64")
+        structure[RULE_COLUMN] = rule_numbers.mask(owners < 0)
+    return structure
@@ -0,0 +1,165 @@
+import os
+
+import pandas as pd
+
+# Extensions prises en charge par le pipeline et type de fichier associé
+SUPPORTED_EXTENSIONS = {
+    ".jpg": "image",
+    ".jpeg": "image",
+    ".png": "image",
+    ".tif": "image",
+    ".tiff": "image",
+    ".bmp": "image",
+    ".avi": "video",
+    ".mov": "video",
+    ".mp4": "video",
+}
+
+# Dossiers techniques des NAS et systèmes d'exploitation à ignorer
+JUNK_DIRS = {
+    "@eaDir",
+    "#recycle",
+    "#snapshot",
+    "$RECYCLE.BIN",
+    "System Volume Information",
+}
+
+# Colonnes du manifeste de fichiers
+MANIFEST_COLUMNS = ["file_path", "extension", "kind", "size", "mtime_ns", "inode"]
+
+
+def _is_junk_dir(name):
+    return name in JUNK_DIRS or name.startswith(".")
+
+
+def iter_files(directory, extensions=None, exclude_dirs=()):
+    """
+    Walk a directory tree once with os.scandir and yield the supported files.
+
+    Parameters
+    ----------
+    directory : str
+        Root directory to search.
+    extensions : dict, optional
+        Mapping lower-case extension -> kind (default: SUPPORTED_EXTENSIONS).
+    exclude_dirs : iterable of str, optional
+        Directories not to descend into, e.g. the CLEANED output (default: ()).
+
+    Yields
+    ------
+    tuple
+        (file_path, extension, kind, size, mtime_ns, inode) for each file.
+
+    Notes
+    -----
+    Skips '@eaDir'-style NAS folders, hidden directories and '._*' AppleDouble
+    files. The stat result of each DirEntry is reused for size, mtime and
+    inode, so no extra os.stat call is needed by later stages.
+    """
+    if extensions is None:
+        extensions = SUPPORTED_EXTENSIONS
+    excluded = {os.path.abspath(d) for d in exclude_dirs}
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not _is_junk_dir(entry.name) and (
+                            not excluded or os.path.abspath(entry.path) not in excluded
+                        ):
+                            stack.append(entry.path)
+                        continue
+                    if entry.name.startswith("._"):
+                        continue
+                    extension = os.path.splitext(entry.name)[1].lower()
+                    if extension not in extensions or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    yield (
+                        entry.path,
+                        extension,
+                        extensions[extension],
+                        st.st_size,
+                        st.st_mtime_ns,
+                        getattr(st, "st_ino", 0) or 0,
+                    )
+        except PermissionError as e:
+            print(f"Warning: impossible de lire le dossier {current}: {e}")
+
+
+def discover_files(directory, extensions=None, exclude_dirs=()):
+    """
+    Build the typed file manifest of a directory tree in a single traversal.
+
+    Parameters
+    ----------
+    directory : str
+        Root directory to search.
+    extensions : dict, optional
+        Mapping lower-case extension -> kind (default: SUPPORTED_EXTENSIONS).
+    exclude_dirs : iterable of str, optional
+        Directories not to descend into (default: ()).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Manifest with columns 'file_path', 'extension', 'kind' ('image' or
+        'video'), 'size', 'mtime_ns' and 'inode', sorted by file_path.
+
+    Notes
+    -----
+    The manifest is shared by the metadata, hashing and placement stages so
+    that the tree is only walked once for all file types.
+    """
+    manifest = pd.DataFrame(
+        list(iter_files(directory, extensions, exclude_dirs)), columns=MANIFEST_COLUMNS
+    ).astype({"size": "int64", "mtime_ns": "int64", "inode": "int64"})
+    return manifest.sort_values("file_path", ignore_index=True)
+
+
+def filter_manifest(manifest, type_file):
+    """
+    Select the files of a manifest matching a file extension.
+
+    Parameters
+    ----------
+    manifest : pandas.DataFrame
+        Manifest returned by discover_files.
+    type_file : str or tuple of str
+        Extension(s) to keep, matched case-insensitively on the file name.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The matching rows, with a fresh index.
+    """
+    if isinstance(type_file, str):
+        type_file = (type_file,)
+    type_file = tuple(t.lower() for t in type_file)
+    mask = manifest["file_path"].str.lower().str.endswith(type_file)
+    return manifest[mask].reset_index(drop=True)
+
+
+def manifest_stats(manifest):
+    """
+    Return the cache validity keys of a manifest.
+
+    Parameters
+    ----------
+    manifest : pandas.DataFrame
+        Manifest returned by discover_files.
+
+    Returns
+    -------
+    dict
+        Mapping file_path -> (size, mtime_ns, inode), as expected by
+        MetadataCache.get_many.
+    """
+    return dict(
+        zip(
+            manifest["file_path"],
+            zip(manifest["size"], manifest["mtime_ns"], manifest["inode"]),
+        )
+    )
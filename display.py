@@ -3,7 +3,9 @@ from threading import Event
 import time
 
 class TermLoading():
-    def __init__(self):
+    def __init__(self, metrics=None):
+        # metrics.RunMetrics optionnel : une étape mesurée par message affiché
+        self.metrics = metrics
         self.message = ""
         self.finish_message = ""
         self.__failed = False
@@ -20,6 +22,8 @@ class TermLoading():
     @finished.setter
     def finished(self, finished):
         if isinstance(finished, bool):
+            if finished:
+                self.__stop_stage('ok')
             self.__finished = finished
             if finished:
                 self.__threadEvent.set()
@@ -34,6 +38,8 @@ class TermLoading():
     @failed.setter
     def failed(self, failed):
         if isinstance(failed, bool):
+            if failed:
+                self.__stop_stage('failed')
             self.__failed = failed
             if failed:
                 self.__threadEvent.set()
@@ -45,8 +51,19 @@ class TermLoading():
         self.message = loading_message
         self.finish_message = finish_message
         self.failed_message = failed_message
+        if self.metrics is not None:
+            self.metrics.start(loading_message)
         self.show_loading()
 
+    def __stop_stage(self, status):
+        if self.metrics is None:
+            return
+        stage = self.metrics.stop(status)
+        if stage is not None:
+            summary = ' (%s)' % self.metrics.stage_summary(stage)
+            self.finish_message += summary
+            self.failed_message += summary
+
     def show_loading(self):
         self.finished = False
         self.failed = False
@@ -63,7 +80,8 @@ class TermLoading():
             print('')
             while not self.finished and not self.failed:
                 i = (i + 1) % len(symbols)
-                print('\r\033[K%s %s' % (symbols[i], self.message), flush=True, end='')
+                rates = self.metrics.rate_text() if self.metrics is not None else ''
+                print('\r\033[K%s %s' % (symbols[i], self.message) + (' [%s]' % rates if rates else ''), flush=True, end='')
                 self.__threadEvent.wait(0.1)
                 self.__threadEvent.clear()
             if self.finished is True and not self.failed:
@@ -0,0 +1,282 @@
+import struct
+from datetime import datetime
+
+from PIL import Image
+from PIL.ExifTags import TAGS
+
+# Tags TIFF/EXIF utilisés
+TAG_EXIF_IFD = 0x8769
+TAG_MAKER_NOTE = 0x927C
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_SUBSEC_TIME_ORIGINAL = 0x9291
+
+# Taille des types TIFF (BYTE, ASCII, SHORT, LONG, RATIONAL, SBYTE, UNDEFINED,
+# SSHORT, SLONG, SRATIONAL)
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8}
+
+# Un segment APP1 ne peut pas dépasser 64 Ko
+DEFAULT_READ_SIZE = 65536
+
+
+class ExifReadError(Exception):
+    """Raised when the fast EXIF path cannot handle a file."""
+
+
+def _find_exif_segment(f, read_size=DEFAULT_READ_SIZE):
+    """
+    Locate the first Exif APP1 segment of a JPEG file and return its TIFF payload.
+
+    Parameters
+    ----------
+    f : file object
+        JPEG file opened in binary mode, positioned at the start.
+    read_size : int, optional
+        Number of bytes read at once (default: 65536).
+
+    Returns
+    -------
+    bytes or None
+        The TIFF block (starting at the byte order mark), or None if the JPEG has
+        no Exif segment before the image data.
+
+    Raises
+    ------
+    ExifReadError
+        If the file is not a JPEG or the marker structure is corrupted.
+    """
+    buf = f.read(read_size)
+    if buf[:2] != b"\xff\xd8":
+        raise ExifReadError("Not a JPEG file")
+
+    pos = 2
+    while True:
+        if pos + 4 > len(buf):
+            buf += f.read(read_size)
+            if pos + 4 > len(buf):
+                raise ExifReadError("Truncated JPEG header")
+        if buf[pos] != 0xFF:
+            raise ExifReadError(f"Invalid JPEG marker at offset {pos}")
+        marker = buf[pos + 1]
+        if marker == 0xFF:
+            # Octet de remplissage
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):
+            # Fin d'image ou début des données compressées : pas d'EXIF
+            return None
+        length = struct.unpack(">H", buf[pos + 2 : pos + 4])[0]
+        end = pos + 2 + length
+        if marker == 0xE1:
+            if end > len(buf):
+                buf += f.read(end - len(buf))
+            segment = buf[pos + 4 : end]
+            if segment[:6] == b"Exif\x00\x00":
+                return segment[6:]
+        pos = end
+
+
+def _read_ifd(tiff, offset, endian):
+    """
+    Read the entries of an IFD.
+
+    Parameters
+    ----------
+    tiff : bytes
+        TIFF block of the Exif segment.
+    offset : int
+        Offset of the IFD inside the TIFF block.
+    endian : str
+        Struct byte order prefix ('<' or '>').
+
+    Returns
+    -------
+    dict
+        Mapping tag id -> (type, count, raw value field or offset).
+    """
+    if offset + 2 > len(tiff):
+        raise ExifReadError(f"IFD offset {offset} out of bounds")
+    n_entries = struct.unpack(endian + "H", tiff[offset : offset + 2])[0]
+    entries = {}
+    pos = offset + 2
+    for _ in range(n_entries):
+        if pos + 12 > len(tiff):
+            raise ExifReadError("Truncated IFD")
+        tag, typ, count = struct.unpack(endian + "HHI", tiff[pos : pos + 8])
+        entries[tag] = (typ, count, tiff[pos + 8 : pos + 12])
+        pos += 12
+    return entries
+
+
+def _entry_bytes(tiff, entry, endian):
+    """Return the raw bytes of an IFD entry value (inline or at its offset)."""
+    typ, count, field = entry
+    size = TYPE_SIZES.get(typ, 1) * count
+    if size <= 4:
+        return field[:size]
+    offset = struct.unpack(endian + "I", field)[0]
+    if offset + size > len(tiff):
+        raise ExifReadError("Tag value out of bounds")
+    return tiff[offset : offset + size]
+
+
+def _entry_string(tiff, entry, endian):
+    """Decode an ASCII IFD entry, stripping NUL padding and spaces."""
+    return (
+        _entry_bytes(tiff, entry, endian)
+        .split(b"\x00")[0]
+        .decode("ascii", errors="replace")
+        .strip()
+    )
+
+
+def _parse_reconyx_maker_note(data):
+    """
+    Extract trigger and sequence information from a Reconyx HyperFire maker note.
+
+    Parameters
+    ----------
+    data : bytes
+        Raw maker note.
+
+    Returns
+    -------
+    dict
+        'trigger_mode', 'sequence_number' and 'sequence_length' when the maker note
+        is a HyperFire one, empty dict otherwise.
+
+    Notes
+    -----
+    Layout follows ExifTool's Reconyx HyperFire table: little-endian int16u words,
+    MakerNoteVersion 0xf101 at word 0, TriggerMode (2 chars) at word 6 and
+    Sequence (index, count) at words 7-8.
+    """
+    if len(data) < 18 or struct.unpack("<H", data[:2])[0] != 0xF101:
+        return {}
+    trigger_mode = data[12:14].split(b"\x00")[0].decode("ascii", errors="replace")
+    sequence_number, sequence_length = struct.unpack("<HH", data[14:18])
+    return {
+        "trigger_mode": trigger_mode,
+        "sequence_number": sequence_number,
+        "sequence_length": sequence_length,
+    }
+
+
+def read_exif_fields(file_path, read_size=DEFAULT_READ_SIZE):
+    """
+    Read the acquisition fields of a JPEG without decoding or fully parsing it.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the JPEG file.
+    read_size : int, optional
+        Number of bytes read at once (default: 65536).
+
+    Returns
+    -------
+    dict
+        Dictionary containing (when present in the file):
+        - 'DateTimeOriginal': str, raw EXIF value (tag 0x9003)
+        - 'SubSecTimeOriginal': str (tag 0x9291)
+        - 'trigger_mode', 'sequence_number', 'sequence_length': Reconyx maker note
+
+    Raises
+    ------
+    ExifReadError
+        If the fast path cannot handle the file (not a JPEG, corrupted segment...).
+
+    Notes
+    -----
+    Only the first APP1 segment is read: the reader jumps from IFD0 to the EXIF
+    sub-IFD and picks the few tags it needs, so only a few kilobytes are
+    usually read from disk.
+    """
+    with open(file_path, "rb") as f:
+        tiff = _find_exif_segment(f, read_size)
+    if tiff is None:
+        return {}
+
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        raise ExifReadError("Invalid TIFF byte order")
+    magic, ifd0_offset = struct.unpack(endian + "HI", tiff[2:8])
+    if magic != 42:
+        raise ExifReadError("Invalid TIFF header")
+
+    ifd0 = _read_ifd(tiff, ifd0_offset, endian)
+    if TAG_EXIF_IFD not in ifd0:
+        return {}
+    exif_offset = struct.unpack(endian + "I", ifd0[TAG_EXIF_IFD][2])[0]
+    exif_ifd = _read_ifd(tiff, exif_offset, endian)
+
+    fields = {}
+    if TAG_DATETIME_ORIGINAL in exif_ifd:
+        fields["DateTimeOriginal"] = _entry_string(
+            tiff, exif_ifd[TAG_DATETIME_ORIGINAL], endian
+        )
+    if TAG_SUBSEC_TIME_ORIGINAL in exif_ifd:
+        fields["SubSecTimeOriginal"] = _entry_string(
+            tiff, exif_ifd[TAG_SUBSEC_TIME_ORIGINAL], endian
+        )
+    if TAG_MAKER_NOTE in exif_ifd:
+        try:
+            maker_note = _entry_bytes(tiff, exif_ifd[TAG_MAKER_NOTE], endian)
+            fields.update(_parse_reconyx_maker_note(maker_note))
+        except ExifReadError:
+            pass
+    return fields
+
+
+def read_datetime_original_pillow(file_path):
+    """
+    Read DateTimeOriginal through Pillow (slow path).
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the image file.
+
+    Returns
+    -------
+    str or None
+        The raw DateTimeOriginal value, or None if the image has no such tag.
+    """
+    image = Image.open(file_path)
+    exif_data = image._getexif()
+    if exif_data is None:
+        return None
+    for tag_id, value in exif_data.items():
+        if TAGS.get(tag_id, tag_id) == "DateTimeOriginal":
+            return value
+    return None
+
+
+def read_datetime_original(file_path):
+    """
+    Read the acquisition date of an image, trying the fast EXIF path first.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the image file.
+
+    Returns
+    -------
+    datetime.datetime or None
+        The DateTimeOriginal of the image, or None if the image has no such tag.
+
+    Notes
+    -----
+    Falls back to Pillow for files the fast path cannot handle (PNG, TIFF,
+    corrupted JPEG markers...).
+    """
+    try:
+        value = read_exif_fields(file_path).get("DateTimeOriginal")
+    except (ExifReadError, struct.error):
+        value = read_datetime_original_pillow(file_path)
+    if value is None:
+        return None
+    return datetime.strptime(value.strip("\x00 "), "%Y:%m:%d %H:%M:%S")
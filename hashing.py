@@ -0,0 +1,341 @@
+import argparse
+import hashlib
+import io
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+from PIL import Image, UnidentifiedImageError
+from tqdm import tqdm
+
+from discovery import discover_files
+from manifest_store import ManifestStore, partitions_from_paths
+
+# Lectures par blocs de 4 Mo : le disque externe est le goulot d'étranglement
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Octets lus en début et fin de fichier pour le pré-filtre des doublons
+DEFAULT_EDGE_SIZE = 16 * 1024
+
+# Colonnes du CSV lu par run_extract_duplicates.sh
+HASH_CSV_COLUMNS = ["file_path", "hash_sha256", "hash_md5_no_metadata"]
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg")
+
+
+def pixel_hash_from_bytes(data):
+    """
+    Calculate the MD5 hash of the decoded pixels of an image.
+
+    Parameters
+    ----------
+    data : bytes-like
+        Encoded image content.
+
+    Returns
+    -------
+    str
+        MD5 of the raw 8-bit RGB buffer, equivalent to `convert file rgb:- | md5sum`.
+
+    Notes
+    -----
+    The hash ignores the metadata (EXIF, maker notes...), so two copies of the
+    same image with different tags have the same pixel hash.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        rgb = image.convert("RGB")
+        return hashlib.md5(rgb.tobytes()).hexdigest()
+
+
+def hash_file(
+    file_path,
+    algorithms=("md5", "sha256"),
+    pixel_hash=False,
+    buffer_size=DEFAULT_BUFFER_SIZE,
+    use_mmap=False,
+):
+    """
+    Calculate several digests of a file while reading it only once.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file to hash.
+    algorithms : tuple of str, optional
+        hashlib algorithms to compute (default: ("md5", "sha256")).
+    pixel_hash : bool, optional
+        If True, also compute the MD5 of the decoded pixels from the same bytes
+        (default: False).
+    buffer_size : int, optional
+        Size of the read buffer in bytes (default: 4 MiB).
+    use_mmap : bool, optional
+        If True, map the file in memory instead of reading it in blocks
+        (default: False).
+
+    Returns
+    -------
+    dict
+        Mapping algorithm name -> hexadecimal digest, plus 'size' and, if
+        requested, 'pixels' (pixel hash, or 'ERROR: <message>' when the image
+        cannot be decoded).
+
+    Notes
+    -----
+    Every block read is fed to all digests at the same time. When the pixel
+    hash is requested, the blocks are kept in memory and decoded by Pillow, so
+    the file is never read a second time.
+    """
+    digests = {name: hashlib.new(name) for name in algorithms}
+    chunks = [] if pixel_hash else None
+    size = 0
+
+    with open(file_path, "rb") as f:
+        if use_mmap and os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                for d in digests.values():
+                    d.update(view)
+                size = len(mm)
+                if pixel_hash:
+                    chunks.append(bytes(view))
+                view.release()
+        else:
+            buffer = bytearray(buffer_size)
+            view = memoryview(buffer)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                block = view[:n]
+                for d in digests.values():
+                    d.update(block)
+                if pixel_hash:
+                    chunks.append(bytes(block))
+                size += n
+
+    result = {name: d.hexdigest() for name, d in digests.items()}
+    result["size"] = size
+    if pixel_hash:
+        try:
+            result["pixels"] = pixel_hash_from_bytes(b"".join(chunks))
+        except UnidentifiedImageError:
+            result["pixels"] = f"ERROR: cannot identify image file '{file_path}'"
+        except Exception as e:
+            message = str(e).splitlines()[0] if str(e) else type(e).__name__
+            result["pixels"] = f"ERROR: {message.replace(',', ';')}"
+    return result
+
+
+def hash_edges(file_path, edge_size=DEFAULT_EDGE_SIZE):
+    """
+    Calculate the MD5 of the first and last bytes of a file.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file to hash.
+    edge_size : int, optional
+        Number of bytes read at each end of the file (default: 16 KiB).
+
+    Returns
+    -------
+    str
+        MD5 of the head and tail of the file (the whole file if it is smaller
+        than twice edge_size).
+
+    Notes
+    -----
+    Used as a cheap pre-filter: two files with different edge hashes cannot be
+    identical, so only files colliding on size and edge hash need a full read.
+    """
+    digest = hashlib.md5()
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= 2 * edge_size:
+            digest.update(f.read())
+        else:
+            digest.update(f.read(edge_size))
+            f.seek(size - edge_size)
+            digest.update(f.read(edge_size))
+    return digest.hexdigest()
+
+
+def hash_row(file_path, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Build one row of the hash CSV for a file.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the image to hash.
+    buffer_size : int, optional
+        Size of the read buffer in bytes (default: 4 MiB).
+
+    Returns
+    -------
+    str
+        'file_path,hash_sha256,hash_md5_no_metadata' line (without newline).
+        Decoding or read errors are reported as 'ERROR: <message>' in the third
+        column, like run_hash.sh did with the ImageMagick error output.
+    """
+    try:
+        result = hash_file(
+            file_path, algorithms=("sha256",), pixel_hash=True, buffer_size=buffer_size
+        )
+    except OSError as e:
+        message = str(e).replace(",", ";")
+        return f"{file_path},,ERROR: {message}"
+    return f"{file_path},{result['sha256']},{result['pixels']}"
+
+
+def find_images(directory, extensions=IMAGE_EXTENSIONS):
+    """
+    List the images of a directory tree, skipping Synology '@eaDir' folders.
+
+    Parameters
+    ----------
+    directory : str
+        Root directory to search.
+    extensions : tuple of str, optional
+        Lower-case extensions to keep (default: (".jpg", ".jpeg")).
+
+    Returns
+    -------
+    list of str
+        Sorted list of image paths.
+    """
+    manifest = discover_files(directory, {ext: "image" for ext in extensions})
+    return manifest["file_path"].tolist()
+
+
+def write_hash_csv(
+    file_paths,
+    output_csv,
+    buffer_size=DEFAULT_BUFFER_SIZE,
+    n_workers=None,
+    chunksize=32,
+):
+    """
+    Hash a list of images and write the CSV consumed by run_extract_duplicates.sh.
+
+    Parameters
+    ----------
+    file_paths : list of str
+        Images to hash.
+    output_csv : str
+        Path of the CSV to write (columns: file_path,hash_sha256,hash_md5_no_metadata).
+    buffer_size : int, optional
+        Size of the read buffer in bytes (default: 4 MiB).
+    n_workers : int, optional
+        Number of worker processes; None uses all the CPUs and 1 hashes in the
+        current process (default: None).
+    chunksize : int, optional
+        Number of files sent to a worker at once (default: 32).
+
+    Returns
+    -------
+    int
+        Number of rows written.
+
+    Notes
+    -----
+    Each worker reads, decodes and hashes its files in memory: there is no
+    process spawned per file, so throughput is bounded by disk and decode speed.
+    Rows are written in the order of file_paths as results arrive.
+    """
+    worker = partial(hash_row, buffer_size=buffer_size)
+    n_rows = 0
+    with open(output_csv, "w") as out:
+        out.write(",".join(HASH_CSV_COLUMNS) + "\n")
+        if n_workers == 1:
+            rows = map(worker, file_paths)
+            for row in tqdm(rows, total=len(file_paths), unit="file"):
+                out.write(row + "\n")
+                n_rows += 1
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                rows = executor.map(worker, file_paths, chunksize=chunksize)
+                for row in tqdm(rows, total=len(file_paths), unit="file"):
+                    out.write(row + "\n")
+                    n_rows += 1
+    return n_rows
+
+
+def write_hash_manifest(output_csv, cleaned_dir, manifest_format="parquet"):
+    """
+    Add the hashes of a cleaned arborescence to its Parquet manifests.
+
+    Parameters
+    ----------
+    output_csv : str
+        CSV written by write_hash_csv for files under cleaned_dir.
+    cleaned_dir : str
+        Path to the cleaned arborescence; the 'hashes' manifest is written to
+        its .tmp/manifest directory, partitioned by the year and station
+        folders of the files (see manifest_store.partitions_from_paths).
+    manifest_format : str, optional
+        'parquet' or 'csv' (default: "parquet"); nothing is written in CSV,
+        output_csv already being the CSV manifest.
+
+    Returns
+    -------
+    int
+        Number of rows of the manifest.
+    """
+    hashes = pd.read_csv(output_csv, dtype=str)
+    hashes = hashes.join(partitions_from_paths(hashes["file_path"], cleaned_dir))
+    store = ManifestStore(os.path.join(cleaned_dir, ".tmp"), None, manifest_format)
+    store.write("hashes", hashes)
+    return len(hashes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compute the SHA-256 and pixel MD5 of every JPG/JPEG of a directory."
+    )
+    parser.add_argument("directory", help="Directory to scan")
+    parser.add_argument("output_csv", help="CSV file to write")
+    parser.add_argument(
+        "--buffer-size",
+        type=int,
+        default=DEFAULT_BUFFER_SIZE,
+        help="Read buffer size in bytes (default: 4 MiB)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        metavar="CLEANED_DIR",
+        help="Also write the hashes to the Parquet manifests of this cleaned "
+        "arborescence",
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: Directory '{args.directory}' not found.")
+        sys.exit(1)
+
+    start_time = time.time()
+    files = find_images(args.directory)
+    if not files:
+        print("Aucun fichier JPG/JPEG trouvé. Arrêt.")
+    else:
+        print(f"Calcul des hashes pour {len(files)} fichiers...")
+    # Le fichier (éventuellement vide, avec en-têtes) est toujours créé pour l'étape suivante
+    write_hash_csv(files, args.output_csv, args.buffer_size, n_workers=args.workers)
+    print(
+        f"Calcul des hashes terminé en {int(time.time() - start_time)} secondes. "
+        f"Résultats dans {args.output_csv}"
+    )
+    if args.manifest is not None:
+        n_rows = write_hash_manifest(args.output_csv, args.manifest)
+        print(f"{n_rows} hashes ajoutés au manifeste de {args.manifest}")
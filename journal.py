@@ -0,0 +1,316 @@
+import json
+import os
+import threading
+
+from placement import COPY_MODES, PART_SUFFIX, merge_stats, place_files
+
+JOURNAL_FILENAME = "placement_journal.jsonl"
+
+# Nombre d'opérations terminées écrites entre deux fsync du journal
+JOURNAL_FSYNC_EVERY = 1000
+
+
+def get_journal_path(cleaned_dir):
+    """Return the path of the placement journal of a cleaned arborescence."""
+    return os.path.join(cleaned_dir, ".tmp", JOURNAL_FILENAME)
+
+
+class PlacementJournal:
+    """
+    Write-ahead journal of the file placements, stored as JSON lines.
+
+    Parameters
+    ----------
+    path : str
+        Path of the journal (created if missing).
+    resume : bool, optional
+        If True, load the operations of the previous run and continue it; if
+        False, start a new run: the journal is compacted (see compact) and a
+        run marker is appended (default: False).
+    fsync_every : int, optional
+        Number of completed operations between two fsync (default: 1000).
+    checksum : bool, optional
+        If True, copies compute the MD5 of their data, recorded in the 'done'
+        records for --verify; otherwise they use shutil.copy2 and 'hash' is
+        None (default: False).
+
+    Notes
+    -----
+    Each record is one line:
+    - {"op": "plan", "src", "dst", "mode"}: written and fsync'd before any of
+      the planned files is touched,
+    - {"op": "done", "src", "dst", "size", "hash"}: written once the file is
+      complete at its final name ('hash' is the MD5 computed while copying
+      with checksum, None otherwise).
+    Files are placed under a temporary name and renamed when complete (see
+    placement.place_file_atomic), so a destination at its final name is
+    always complete. Neither the placed files nor the completions are
+    fsync'd one by one: the 'done' records are held in memory and, every
+    fsync_every completions, the files they describe and their folders are
+    fsync'd, then the records are written and the journal is fsync'd. Each
+    'done' record that reaches the disk thus describes a file whose data is
+    on disk, without flushing the other filesystems of the host; the
+    operations without one are checked again by replay_journal.
+    A line cut by a crash is ignored when the journal is loaded.
+    The journal is only ever appended to, so that the MD5 of the files placed
+    by the earlier runs stay available to read_journal_hashes. Each run
+    starts with a {"op": "run"} record; resume only loads the records after
+    the last one.
+    """
+
+    def __init__(
+        self, path, resume=False, fsync_every=JOURNAL_FSYNC_EVERY, checksum=False
+    ):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.checksum = checksum
+        self.pending = {}
+        self.completed = {}
+        self.lock = threading.Lock()
+        self.unsynced = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if resume and os.path.exists(path):
+            self._load()
+        elif os.path.exists(path):
+            self.compact()
+        self.file = open(path, "a", encoding="utf-8")
+        if not resume:
+            self._write({"op": "run"})
+            self._sync()
+
+    def _load(self):
+        for record in _read_records(self.path):
+            if record.get("op") == "run":
+                # Opérations des exécutions précédentes : déjà reprises ou abandonnées
+                self.pending.clear()
+                self.completed.clear()
+            elif record.get("op") == "plan":
+                self.pending[record["dst"]] = record
+            elif record.get("op") == "done":
+                self.pending.pop(record["dst"], None)
+                self.completed[record["dst"]] = record
+
+    def compact(self):
+        """
+        Rewrite the journal with only the MD5 of the completed copies.
+
+        Notes
+        -----
+        Keeps the last 'done' record with a hash of each destination that was
+        not planned again afterwards (see read_journal_hashes). The plans of
+        the earlier runs are dropped: a run started without resume does not
+        replay them. The journal is replaced atomically.
+        """
+        records = _completed_copies(_read_records(self.path))
+        tmp = self.path + ".compact"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for record in records.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def sync(self):
+        """Flush the placed files, then the journal, to disk."""
+        with self.lock:
+            self._sync()
+
+    def _sync(self):
+        # Données des fichiers placés sur disque avant leurs lignes 'done'
+        directories = set()
+        for record, mode in self.unsynced:
+            if mode != "symlink":
+                _fsync_path(record["dst"])
+            directories.add(os.path.dirname(record["dst"]))
+        for directory in directories:
+            _fsync_path(directory)
+        for record, _ in self.unsynced:
+            self._write(record)
+        self.unsynced = []
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def plan(self, pairs, mode):
+        """
+        Record placements before they start.
+
+        Parameters
+        ----------
+        pairs : list of (str, str)
+            (source, destination) paths.
+        mode : str
+            Placement mode of the files.
+        """
+        with self.lock:
+            for src, dst in pairs:
+                record = {"op": "plan", "src": src, "dst": dst, "mode": mode}
+                self._write(record)
+                self.pending[dst] = record
+            self._sync()
+
+    def done(self, src, dst, size, digest=None):
+        """Record a placement whose destination is complete."""
+        record = {"op": "done", "src": src, "dst": dst, "size": size, "hash": digest}
+        with self.lock:
+            planned = self.pending.pop(dst, None)
+            self.completed[dst] = record
+            self.unsynced.append((record, planned and planned["mode"]))
+            if len(self.unsynced) >= self.fsync_every:
+                self._sync()
+
+    def is_done(self, dst):
+        """Return True if the journal records dst as complete."""
+        return dst in self.completed
+
+    def unfinished(self):
+        """Return the planned operations without completion record."""
+        with self.lock:
+            return list(self.pending.values())
+
+    def close(self):
+        """Flush and close the journal."""
+        with self.lock:
+            if not self.file.closed:
+                self._sync()
+                self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _fsync_path(path):
+    """fsync a file or a folder given by its path, where the system allows it."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Dossiers non synchronisables (Windows)
+        pass
+    finally:
+        os.close(fd)
+
+
+def _read_records(path):
+    """Yield the records of a journal, skipping a line cut by a crash."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Dernière ligne tronquée par l'interruption
+                continue
+
+
+def _completed_copies(records):
+    """
+    Last 'done' record with a hash of each destination.
+
+    A destination planned again, or placed again without hash, loses its
+    hash: its file may have been replaced.
+    """
+    completed = {}
+    for record in records:
+        if record.get("op") == "plan" or (
+            record.get("op") == "done" and not record.get("hash")
+        ):
+            completed.pop(record["dst"], None)
+        elif record.get("op") == "done":
+            completed[record["dst"]] = record
+    return completed
+
+
+def read_journal_hashes(cleaned_dir):
+    """
+    Read the MD5 computed while copying from the placement journal.
+
+    Parameters
+    ----------
+    cleaned_dir : str
+        Path to the cleaned arborescence.
+
+    Returns
+    -------
+    dict
+        Mapping absolute destination path -> (size, md5), for the completed
+        copies of all the runs recorded in the journal.
+    """
+    path = get_journal_path(cleaned_dir)
+    if not os.path.exists(path):
+        return {}
+    return {
+        os.path.abspath(dst): (record["size"], record["hash"])
+        for dst, record in _completed_copies(_read_records(path)).items()
+    }
+
+
+def replay_journal(journal, n_workers=8):
+    """
+    Finish the placements left unfinished by an interrupted run.
+
+    Parameters
+    ----------
+    journal : PlacementJournal
+        Journal opened with resume=True.
+    n_workers : int, optional
+        Number of placement threads (default: 8).
+
+    Returns
+    -------
+    dict
+        Merged placement statistics (see placement.place_files).
+
+    Notes
+    -----
+    Only the operations planned without completion record are replayed:
+    - a move whose source is gone and whose destination is still under its
+      temporary name (dst + PART_SUFFIX) was interrupted before the rename:
+      the temporary file is the only copy and is renamed to dst,
+    - a copy whose destination exists may not have its data on disk yet
+      (it is flushed in batches), so it is copied again,
+    - other destinations that exist are complete and just recorded as done,
+    - the others are placed again from the start, replacing their temporary
+      file.
+    """
+    by_mode = {}
+    n_renamed = 0
+    for record in journal.unfinished():
+        src, dst = record["src"], record["dst"]
+        tmp = dst + PART_SUFFIX
+        if not os.path.lexists(src):
+            if not os.path.lexists(dst) and os.path.lexists(tmp):
+                # Déplacé sous le nom temporaire, pas encore renommé
+                os.replace(tmp, dst)
+                n_renamed += 1
+            elif not os.path.lexists(dst):
+                print(f"Error: {src} introuvable, {dst} non placé")
+                continue
+        elif record["mode"] in COPY_MODES and os.path.lexists(dst):
+            # Copie renommée, mais ses données n'étaient peut-être pas sur disque
+            os.remove(dst)
+        by_mode.setdefault(record["mode"], []).append(record)
+
+    stats = [
+        place_files(
+            [r["src"] for r in records],
+            [r["dst"] for r in records],
+            mode=mode,
+            n_workers=n_workers,
+            journal=journal,
+        )
+        for mode, records in by_mode.items()
+    ]
+    n_replayed = sum(len(records) for records in by_mode.values())
+    print(
+        f"Reprise: {n_replayed} placements non terminés rejoués, dont "
+        f"{n_renamed} fichiers temporaires renommés"
+    )
+    return merge_stats(*stats)
@@ -1,59 +1,25 @@
 import os, sys, shutil, re, time, glob
+import numpy as np
 import pandas as pd
 from PIL import Image
 from PIL.ExifTags import TAGS, GPSTAGS
-from joblib import Parallel, delayed
+from joblib import Parallel, delayed, effective_n_jobs
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
 import shutil, hashlib
 from datetime import datetime
 import subprocess
 import json
-
-
-def get_video_creation_date(video_path):
-    """
-    Extract the creation date from a video file using ffprobe.
-
-    Parameters
-    ----------
-    video_path : str
-        Path to the video file.
-
-    Returns
-    -------
-    str or None
-        The creation time as a string in ISO format, or None if extraction fails.
-
-    Notes
-    -----
-    This function uses ffprobe from the ffmpeg suite to extract metadata.
-    """
-    # Run ffprobe command to get video metadata
-    command = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-select_streams",
-        "v:0",
-        "-show_entries",
-        "format_tags=creation_time",
-        "-of",
-        "json",
-        video_path,
-    ]
-
-    result = subprocess.run(
-        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-    )
-
-    if result.returncode != 0:
-        print("Error:", result.stderr)
-        return None
-
-    # Parse the JSON output
-    metadata = json.loads(result.stdout)
-    creation_time = metadata.get("format", {}).get("tags", {}).get("creation_time")
-
-    return creation_time
+from exif_reader import read_datetime_original
+from naming import add_sequence_suffix, build_names, find_collisions
+from date_correction import apply_date_corrections
+from timelapse import DEFAULT_TOLERANCE, FALLBACK_SCHEDULE, timelapse_mask
+from video_metadata import get_video_creation_date, read_video_creation_date
+from hashing import DEFAULT_EDGE_SIZE, hash_edges, hash_file
+from discovery import discover_files, filter_manifest, manifest_stats
+from placement import PLACEMENT_MODES, copy_file_hashed, place_file, place_files
+from metrics import expect_files, map_measured, report_progress, report_worker_usage
+from verification import compare_trees, save_report, verify_copies, verify_journal
 
 
 def calculate_md5(file_path):
@@ -72,13 +38,10 @@ def calculate_md5(file_path):
 
     Notes
     -----
-    The file is read in chunks of 4096 bytes to handle large files efficiently.
+    The file is read in large blocks (see hashing.hash_file); use hash_file
+    directly to compute several digests in the same read.
     """
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+    return hash_file(file_path, algorithms=("md5",))["md5"]
 
 
 def copy_file(src, dst):
@@ -99,7 +62,7 @@ def copy_file(src, dst):
     shutil.copy2(src, dst)
 
 
-def verify_files(src, dst):
+def verify_files(src, dst, n_workers=8):
     """
     Verify that files in source and destination directories are identical by comparing MD5 hashes.
 
@@ -109,6 +72,8 @@ def verify_files(src, dst):
         Source directory path.
     dst : str
         Destination directory path.
+    n_workers : int, optional
+        Number of hashing threads (default: 8).
 
     Returns
     -------
@@ -117,31 +82,13 @@ def verify_files(src, dst):
 
     Notes
     -----
-    Compares file count and MD5 hashes of all files in both directories.
+    Files are matched by relative path in nested trees and hashed in a
+    thread pool. verification.compare_trees returns the per-file report.
+    When the files were just copied, verification.verify_copies with the
+    hashes computed during the copy reads each file only once.
     """
-    src_files = sorted(
-        [
-            os.path.join(src, f)
-            for f in os.listdir(src)
-            if os.path.isfile(os.path.join(src, f))
-        ]
-    )
-    dst_files = sorted(
-        [
-            os.path.join(dst, f)
-            for f in os.listdir(dst)
-            if os.path.isfile(os.path.join(dst, f))
-        ]
-    )
-
-    if len(src_files) != len(dst_files):
-        return False
-
-    for src_file, dst_file in zip(src_files, dst_files):
-        if calculate_md5(src_file) != calculate_md5(dst_file):
-            return False
-
-    return True
+    report = compare_trees(src, dst, n_workers=n_workers)
+    return bool((report["status"] == "ok").all())
 
 
 def copy_files_with_verification(src_dir, dst_dir, n_jobs=1):
@@ -155,34 +102,49 @@ def copy_files_with_verification(src_dir, dst_dir, n_jobs=1):
     dst_dir : str
         Destination directory path.
     n_jobs : int, optional
-        Number of parallel jobs for copying (default: 1).
+        Number of parallel jobs for copying and verifying (default: 1).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Per-file verification report (see verification.verify_copies).
 
     Notes
     -----
-    Creates the destination directory if it doesn't exist and verifies all files after copying.
-    Uses joblib for parallel file copying operations.
+    Copies the whole tree, subdirectories included. Each file is hashed while
+    it is copied (placement.copy_file_hashed), then only the destination is
+    read back and compared with that hash: one read per file instead of two.
     """
-    if not os.path.exists(dst_dir):
-        os.makedirs(dst_dir)
-
-    src_files = [
-        os.path.join(src_dir, f)
-        for f in os.listdir(src_dir)
-        if os.path.isfile(os.path.join(src_dir, f))
-    ]
-    dst_files = [os.path.join(dst_dir, os.path.basename(f)) for f in src_files]
-
-    Parallel(n_jobs=n_jobs)(
-        delayed(copy_file)(src, dst) for src, dst in zip(src_files, dst_files)
+    src_files = []
+    for root, _, names in os.walk(src_dir):
+        src_files.extend(os.path.join(root, name) for name in names)
+    dst_files = [os.path.join(dst_dir, os.path.relpath(f, src_dir)) for f in src_files]
+    for directory in {os.path.dirname(f) for f in dst_files} | {dst_dir}:
+        os.makedirs(directory, exist_ok=True)
+
+    hashes = Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(copy_file_hashed)(src, dst) for src, dst in zip(src_files, dst_files)
+    )
+    report = verify_copies(
+        pd.DataFrame(
+            {
+                "src": src_files,
+                "dst": dst_files,
+                "size": [os.path.getsize(f) for f in src_files],
+                "hash": hashes,
+            }
+        ),
+        n_workers=n_jobs,
     )
 
-    if verify_files(src_dir, dst_dir):
+    if (report["status"] == "ok").all():
         print("Tous les fichiers ont été copiés et vérifiés avec succès.")
     else:
         print("Erreur lors de la vérification des fichiers copiés.")
+    return report
 
 
-def get_file_paths(directory, save_path=None, type_file=".jpg"):
+def get_file_paths(directory, save_path=None, type_file=".jpg", manifest=None):
     """
     Get all file paths of a specific type from a directory and its subdirectories.
 
@@ -194,6 +156,9 @@ def get_file_paths(directory, save_path=None, type_file=".jpg"):
         Path to save the list of files (default: None).
     type_file : str, optional
         File extension to search for (default: ".jpg").
+    manifest : pandas.DataFrame, optional
+        File manifest from discovery.discover_files; the directory is walked
+        only if it is not given (default: None).
 
     Returns
     -------
@@ -207,19 +172,16 @@ def get_file_paths(directory, save_path=None, type_file=".jpg"):
 
     Notes
     -----
-    Recursively searches all subdirectories if no files are found in the root directory.
+    Only the files of the root directory are returned if it contains any;
+    subdirectories are searched otherwise.
     """
-    lst_img = os.walk(directory).__next__()[2]
-    full_name = [
-        os.path.join(directory, l) for l in lst_img if l.lower().endswith((type_file))
-    ]
-    if full_name == []:
-        for dirpath, _, filenames in os.walk(directory):
-            # Filtrer les fichiers jpg et construire leur chemin absolu
-            # print(dirpath)
-            for f in filenames:
-                if f.lower().endswith(type_file):
-                    full_name.append(os.path.join(dirpath, f))
+    if manifest is None:
+        manifest = discover_files(directory)
+    full_name = filter_manifest(manifest, type_file)["file_path"].tolist()
+    root = os.path.abspath(directory)
+    root_files = [f for f in full_name if os.path.dirname(os.path.abspath(f)) == root]
+    if root_files:
+        full_name = root_files
     full_name.sort()
     if full_name == []:
         raise ValueError(f"No jpg files found in {directory} or subdirectories")
@@ -276,137 +238,211 @@ def normalize_station_name(name):
     return re.sub(r"[\s\-]", "", name.lower())
 
 
-def get_new_dir(file_path, corresponding_dir=None):
+class StationResolver:
     """
-    Determine the new directory name for a file based on correspondence mapping.
+    Precompiled station-name lookup built once from a correspondence table.
 
     Parameters
     ----------
-    file_path : str
-        Path to the file to process.
     corresponding_dir : pandas.DataFrame, optional
         DataFrame containing station name mappings. Can have two structures:
         - Structure 1: columns 'current_name' and 'replacement_name'
         - Structure 2: columns 'station', 'running', 'move_to'
 
-    Returns
-    -------
-    str
-        The new directory name for the file.
-
     Raises
     ------
     ValueError
         If the correspondence DataFrame structure is not recognized.
-    Warning
-        If no correspondence is found for the file path.
 
     Notes
     -----
-    Automatically detects the DataFrame structure and applies the appropriate mapping logic.
-    For structure 1: directly maps current_name to replacement_name.
-    For structure 2: considers running status and move_to fields.
-    """
-    components = split_path(os.path.abspath(file_path))
-    if corresponding_dir is None:
-        return components[-2]
-
-    # Préparer DataFrame
-    corresponding_dir = corresponding_dir.copy()
-
-    # Détecter automatiquement la structure du DataFrame
-    if (
-        "current_name" in corresponding_dir.columns
-        and "replacement_name" in corresponding_dir.columns
-    ):
-        # Structure avec current_name et replacement_name
-        corresponding_dir["normalized_current"] = corresponding_dir[
-            "current_name"
-        ].apply(normalize_station_name)
+    Station names are normalized once when the resolver is built, so resolving a
+    file is a dictionary probe per path component instead of a DataFrame scan.
+    Results are memoized per parent directory: all the images of a folder are
+    resolved with a single lookup. Resolution only depends on the directory
+    components of the path, never on the file name itself.
+    The memo is left out when the resolver is pickled, so sending it to a
+    worker process only costs the two lookup tables.
+    """
 
-        # Essayer de trouver une correspondance pour chaque composant du chemin
-        for comp in components:
-            normalized_comp = normalize_station_name(comp)
-            match_row = corresponding_dir[
-                corresponding_dir["normalized_current"] == normalized_comp
-            ]
-
-            if not match_row.empty:
-                match_row = match_row.iloc[0]
-                return match_row["replacement_name"]
-
-    elif "station" in corresponding_dir.columns:
-        # Structure avec station, running, move_to
-        corresponding_dir["normalized_station"] = corresponding_dir["station"].apply(
-            normalize_station_name
+    def __init__(self, corresponding_dir=None):
+        # normalized name -> target directory (first row wins, as with iloc[0])
+        self.lookup = {}
+        # second chance lookup on the replacement names (structure 1 only)
+        self.fallback_lookup = {}
+        self._cache = {}
+
+        if corresponding_dir is None:
+            self.schema = None
+        elif (
+            "current_name" in corresponding_dir.columns
+            and "replacement_name" in corresponding_dir.columns
+        ):
+            # Structure avec current_name et replacement_name
+            self.schema = "replacement"
+            for current, replacement in zip(
+                corresponding_dir["current_name"], corresponding_dir["replacement_name"]
+            ):
+                if pd.notna(current):
+                    self.lookup.setdefault(
+                        normalize_station_name(str(current)), replacement
+                    )
+                if pd.notna(replacement):
+                    self.fallback_lookup.setdefault(
+                        normalize_station_name(str(replacement)), replacement
+                    )
+        elif "station" in corresponding_dir.columns:
+            # Structure avec station, running, move_to
+            self.schema = "station"
+            n_rows = len(corresponding_dir)
+            running = (
+                corresponding_dir["running"]
+                if "running" in corresponding_dir.columns
+                else pd.Series(["N"] * n_rows, index=corresponding_dir.index)
+            )
+            move_to = (
+                corresponding_dir["move_to"]
+                if "move_to" in corresponding_dir.columns
+                else pd.Series([None] * n_rows, index=corresponding_dir.index)
+            )
+            for station, is_running, target in zip(
+                corresponding_dir["station"], running, move_to
+            ):
+                if pd.isna(station):
+                    continue
+                if is_running != "Y" and pd.notna(target):
+                    new_dir = target
+                else:
+                    new_dir = station
+                self.lookup.setdefault(normalize_station_name(str(station)), new_dir)
+        else:
+            raise ValueError(
+                "Structure de correspondance non reconnue. Colonnes attendues: ('current_name', 'replacement_name') ou ('station')"
+            )
+
+    def __getstate__(self):
+        # Le cache par dossier n'est pas envoyé aux processus de travail
+        state = self.__dict__.copy()
+        state["_cache"] = {}
+        return state
+
+    def fingerprint(self):
+        """
+        Return a digest identifying the mapping held by the resolver.
+
+        Returns
+        -------
+        str
+            MD5 of the schema and lookup tables, used to invalidate cached
+            'new_dir' values when the correspondence table changes.
+        """
+        content = repr(
+            (
+                self.schema,
+                sorted(self.lookup.items()),
+                sorted(self.fallback_lookup.items()),
+            )
         )
+        return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+    def resolve(self, file_path):
+        """
+        Determine the new directory name for a file.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to the file to process.
+
+        Returns
+        -------
+        str
+            The new directory name for the file.
+
+        Raises
+        ------
+        Warning
+            If no correspondence is found for the file path.
+        """
+        parent = os.path.dirname(os.path.abspath(file_path))
+        try:
+            return self._cache[parent]
+        except KeyError:
+            pass
+        new_dir = self._resolve_components(split_path(parent), file_path)
+        self._cache[parent] = new_dir
+        return new_dir
+
+    def _resolve_components(self, components, file_path):
+        if self.schema is None:
+            return components[-1]
+
+        normalized = [normalize_station_name(comp) for comp in components]
 
         # Essayer de trouver une correspondance pour chaque composant du chemin
-        for comp in components:
-            normalized_comp = normalize_station_name(comp)
-            match_row = corresponding_dir[
-                corresponding_dir["normalized_station"] == normalized_comp
-            ]
-
-            if not match_row.empty:
-                match_row = match_row.iloc[0]
-                if match_row.get("running", "N") != "Y" and pd.notna(
-                    match_row.get("move_to", None)
-                ):
-                    return match_row["move_to"]
-                else:
-                    return match_row["station"]
-    else:
-        raise ValueError(
-            "Structure de correspondance non reconnue. Colonnes attendues: ('current_name', 'replacement_name') ou ('station')"
-        )
+        for normalized_comp in normalized:
+            if normalized_comp in self.lookup:
+                return self.lookup[normalized_comp]
 
-    # Si aucune correspondance trouvée, essayer de matcher sur replacement_name/station
-    if (
-        "current_name" in corresponding_dir.columns
-        and "replacement_name" in corresponding_dir.columns
-    ):
-        # Chercher dans replacement_name
-        for comp in components:
-            normalized_comp = normalize_station_name(comp)
-            match_row = corresponding_dir[
-                corresponding_dir["replacement_name"].apply(normalize_station_name)
-                == normalized_comp
-            ]
-            if not match_row.empty:
-                match_row = match_row.iloc[0]
-                return match_row["replacement_name"]
-
-    elif "station" in corresponding_dir.columns:
-        # Chercher dans station (déjà fait ci-dessus)
-        pass
-
-    # Si toujours aucune correspondance, prendre le nom du dossier au niveau 4
-    # Exemple: /data/RAW/BELLEDONNE/bel02/100RECNX/ -> bel02
-    try:
-        # Chercher le niveau approprié dans les composants du chemin
-        for i, comp in enumerate(components):
-            if comp in ["RAW"]:
-                # Le niveau 4 serait à l'index i+2 (RAW -> massif -> station)
-                if i + 2 < len(components):
-                    fallback_name = components[i + 2]
-                    print(
-                        f"Warning: Aucune correspondance trouvée pour {file_path}, utilisation du nom de dossier: {fallback_name}"
-                    )
-                    return fallback_name
+        # Si aucune correspondance trouvée, essayer de matcher sur replacement_name
+        for normalized_comp in normalized:
+            if normalized_comp in self.fallback_lookup:
+                return self.fallback_lookup[normalized_comp]
 
-        # Si pas de structure RAW trouvée, prendre l'avant-dernier composant
-        if len(components) >= 2:
-            fallback_name = components[-2]
+        # Si toujours aucune correspondance, prendre le nom du dossier au niveau 4
+        # Exemple: /data/RAW/BELLEDONNE/bel02/100RECNX/ -> bel02
+        for i, comp in enumerate(components):
+            if comp in ["RAW"] and i + 2 < len(components):
+                fallback_name = components[i + 2]
+                print(
+                    f"Warning: Aucune correspondance trouvée pour {file_path}, utilisation du nom de dossier: {fallback_name}"
+                )
+                return fallback_name
+
+        # Si pas de structure RAW trouvée, prendre le nom du dossier parent
+        if len(components) >= 1 and components[-1]:
+            fallback_name = components[-1]
             print(
                 f"Warning: Aucune correspondance trouvée pour {file_path}, utilisation du nom de dossier: {fallback_name}"
             )
             return fallback_name
-    except Exception as e:
-        print(f"Error extracting folder name from path {file_path}: {e}")
 
-    # En dernier recours, lever l'exception
-    raise Warning(f"Aucune correspondance trouvée pour {file_path}")
+        # En dernier recours, lever l'exception
+        raise Warning(f"Aucune correspondance trouvée pour {file_path}")
+
+
+def get_new_dir(file_path, corresponding_dir=None):
+    """
+    Determine the new directory name for a file based on correspondence mapping.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file to process.
+    corresponding_dir : pandas.DataFrame or StationResolver, optional
+        Station name mappings, either as a prebuilt StationResolver or as a
+        DataFrame with one of the structures accepted by StationResolver.
+
+    Returns
+    -------
+    str
+        The new directory name for the file.
+
+    Raises
+    ------
+    ValueError
+        If the correspondence DataFrame structure is not recognized.
+    Warning
+        If no correspondence is found for the file path.
+
+    Notes
+    -----
+    Passing a DataFrame builds a throwaway resolver on every call; callers
+    processing many files should build a StationResolver once and pass it.
+    """
+    if not isinstance(corresponding_dir, StationResolver):
+        corresponding_dir = StationResolver(corresponding_dir)
+    return corresponding_dir.resolve(file_path)
 
 
 def get_metadata_structure(file_path, corresponding_dir=None, type_file=".jpg"):
@@ -417,8 +453,8 @@ def get_metadata_structure(file_path, corresponding_dir=None, type_file=".jpg"):
     ----------
     file_path : str
         Path to the file to process.
-    corresponding_dir : pandas.DataFrame, optional
-        DataFrame containing station name mappings (default: None).
+    corresponding_dir : pandas.DataFrame or StationResolver, optional
+        Station name mappings, preferably a prebuilt StationResolver (default: None).
     type_file : str, optional
         File extension to process (default: ".jpg").
 
@@ -433,8 +469,10 @@ def get_metadata_structure(file_path, corresponding_dir=None, type_file=".jpg"):
     Notes
     -----
     Supports various image formats (jpg, png, tiff, bmp) and video formats (avi, mov, mp4).
-    For images, extracts DateTimeOriginal from EXIF data.
-    For videos, uses ffprobe to extract creation time.
+    For images, extracts DateTimeOriginal from the EXIF APP1 segment only, with
+    Pillow as a fallback (see exif_reader.read_datetime_original).
+    For videos, reads the AVI RIFF header or the MP4/MOV 'mvhd' box, with
+    ffprobe as a fallback (see video_metadata.read_video_creation_date).
     """
     if file_path.lower().endswith(type_file):
         new_dir = get_new_dir(file_path, corresponding_dir)
@@ -453,31 +491,13 @@ def get_metadata_structure(file_path, corresponding_dir=None, type_file=".jpg"):
             ".BMP",
         ]:
             try:
-                image = Image.open(file_path)
-                exif_data = image._getexif()
-
-                # Extraire la date d'acquisition
-                if exif_data is not None:
-                    for tag_id, value in exif_data.items():
-                        tag = TAGS.get(tag_id, tag_id)
-                        if tag == "DateTimeOriginal":
-                            date_acquisition = datetime.strptime(
-                                value, "%Y:%m:%d %H:%M:%S"
-                            )
-                            break
-
-                    else:
-                        date_acquisition = None
-                else:
-                    date_acquisition = None
-
+                date_acquisition = read_datetime_original(file_path)
             except Exception as e:
                 print(f"Erreur lors de la lecture des métadonnées de {file_path}: {e}")
                 date_acquisition = None
         elif type_file in [".AVI", ".avi", ".MOV", ".mov", ".MP4", ".mp4"]:
             try:
-                value = get_video_creation_date(file_path)
-                date_acquisition = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+                date_acquisition = read_video_creation_date(file_path)
             except Exception as e:
                 print(f"Erreur lors de la lecture des métadonnées de {file_path}: {e}")
                 date_acquisition = None
@@ -491,7 +511,157 @@ def get_metadata_structure(file_path, corresponding_dir=None, type_file=".jpg"):
     }
 
 
-def prepare_cleaned_structure(files_path, structure, timelapse=True):
+def get_cleaned_dir(files_path):
+    """
+    Return the path of the cleaned directory associated with a files directory.
+
+    Parameters
+    ----------
+    files_path : str
+        Path to the original files directory.
+
+    Returns
+    -------
+    str
+        Path to the 'CLEANED' directory alongside the original directory.
+    """
+    abs_dir, _ = os.path.split(os.path.abspath(files_path))
+    return os.path.join(abs_dir, "CLEANED")
+
+
+# Nombre de fichiers envoyés à la fois à un processus d'extraction
+METADATA_CHUNK_SIZE = 256
+
+# État des processus d'extraction, initialisé une seule fois par processus
+_worker_resolver = None
+_worker_type_file = None
+
+
+def _init_metadata_worker(resolver, type_file):
+    global _worker_resolver, _worker_type_file
+    _worker_resolver = resolver
+    _worker_type_file = type_file
+
+
+def _extract_metadata_file(file_path):
+    return get_metadata_structure(file_path, _worker_resolver, _worker_type_file)
+
+
+def _extract_metadata_chunk(files_name):
+    return map_measured(_extract_metadata_file, files_name)
+
+
+def extract_metadata(
+    files_name,
+    resolver,
+    type_file=".jpg",
+    cache=None,
+    stats=None,
+    progress=True,
+    n_workers=None,
+    chunk_size=METADATA_CHUNK_SIZE,
+):
+    """
+    Extract the metadata structure of a list of files, reusing cached values.
+
+    Parameters
+    ----------
+    files_name : list of str
+        Paths of the files to process.
+    resolver : StationResolver
+        Prebuilt station-name resolver.
+    type_file : str, optional
+        File extension to process (default: ".jpg").
+    cache : MetadataCache, optional
+        Persistent cache; only new or modified files are read (default: None).
+    stats : dict, optional
+        Mapping path -> (size, mtime_ns, inode) from the discovery manifest, to
+        validate cache entries without another stat (default: None).
+    progress : bool, optional
+        Show the extraction progress bar (default: True).
+    n_workers : int, optional
+        Number of worker processes; None uses all the CPUs (default: None).
+    chunk_size : int, optional
+        Number of files sent to a worker at once; fewer files are extracted
+        in the current process (default: 256).
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame with 'file_path', 'date_acquisition' and 'new_dir' columns,
+        in the order of files_name.
+
+    Notes
+    -----
+    Cached 'new_dir' values are only reused if they were resolved with the same
+    correspondence table; otherwise they are resolved again (cheap dictionary
+    lookups) while the cached acquisition date is kept.
+    Entries with a 'resolver_key' were written by a previous extraction and
+    are reused even if their date is missing (unreadable or dateless file);
+    entries without one only hold hashes and the file is extracted.
+    The resolver is sent once to each worker process through the pool
+    initializer, and the files by chunks, instead of pickling the resolver
+    (or the correspondence table) with every file.
+    """
+    records = {}
+    to_store = []
+    if cache is not None:
+        resolver_key = resolver.fingerprint()
+        for path, entry in cache.get_many(files_name, stats=stats).items():
+            if entry["resolver_key"] is None:
+                # Entrée écrite par le calcul des hash : jamais extraite
+                continue
+            records[path] = {
+                "file_path": path,
+                "date_acquisition": entry["date_acquisition"],
+                "new_dir": entry["new_dir"],
+            }
+            if entry["resolver_key"] != resolver_key:
+                records[path]["new_dir"] = resolver.resolve(path)
+                to_store.append(records[path])
+
+    to_extract = [f for f in files_name if f not in records]
+    expect_files(len(files_name))
+    report_progress(len(records))
+    chunks = [
+        to_extract[i : i + chunk_size] for i in range(0, len(to_extract), chunk_size)
+    ]
+    extracted = []
+    with tqdm(
+        total=len(to_extract), desc="Extracting metadata", disable=not progress
+    ) as pbar:
+        if len(chunks) <= 1 or n_workers == 1:
+            # Trop peu de fichiers pour amortir le démarrage des processus
+            for chunk in chunks:
+                extracted.extend(
+                    get_metadata_structure(f, resolver, type_file) for f in chunk
+                )
+                pbar.update(len(chunk))
+                report_progress(len(chunk))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                initializer=_init_metadata_worker,
+                initargs=(resolver, type_file),
+            ) as executor:
+                for records_chunk, usage in executor.map(
+                    _extract_metadata_chunk, chunks
+                ):
+                    report_worker_usage(usage)
+                    extracted.extend(records_chunk)
+                    pbar.update(len(records_chunk))
+                    report_progress(len(records_chunk))
+    for record in extracted:
+        records[record["file_path"]] = record
+    to_store.extend(extracted)
+
+    if cache is not None:
+        cache.put_many(dict(record, resolver_key=resolver_key) for record in to_store)
+
+    return pd.DataFrame([records[f] for f in files_name])
+
+
+def prepare_cleaned_structure(files_path, structure, timelapse=True, cleaned_dir=None):
     """
     Create a cleaned directory structure for organizing processed files.
 
@@ -503,6 +673,9 @@ def prepare_cleaned_structure(files_path, structure, timelapse=True):
         DataFrame containing file metadata with 'date_acquisition' column.
     timelapse : bool, optional
         Whether to create a timelapse subdirectory (default: True).
+    cleaned_dir : str, optional
+        Final destination of the cleaned files (default: None, a 'CLEANED'
+        directory alongside the original directory).
 
     Returns
     -------
@@ -511,12 +684,13 @@ def prepare_cleaned_structure(files_path, structure, timelapse=True):
 
     Notes
     -----
-    Creates a 'CLEANED' directory alongside the original directory.
+    Creates a 'CLEANED' directory alongside the original directory, unless an
+    explicit destination is given.
     Creates year-based subdirectories based on acquisition dates.
     Sets directory permissions to 777 for full access.
     """
-    abs_dir, dir = os.path.split(os.path.abspath(files_path))
-    cleaned_dir = os.path.join(abs_dir, f"CLEANED")
+    if cleaned_dir is None:
+        cleaned_dir = get_cleaned_dir(files_path)
     os.makedirs(cleaned_dir, exist_ok=True)
     os.chmod(cleaned_dir, 0o777)  # Lecture/écriture/exécution pour tous
 
@@ -527,78 +701,68 @@ def prepare_cleaned_structure(files_path, structure, timelapse=True):
     return cleaned_dir
 
 
-def add_sequence_column(df):
+def add_file_number(structure):
     """
-    Add sequence numbers to consecutive images taken within 1-minute intervals.
+    Add the Reconyx image number of each file.
 
     Parameters
     ----------
-    df : pandas.DataFrame
-        DataFrame containing 'date_acquisition' column with datetime information.
+    structure : pandas.DataFrame
+        DataFrame containing a 'file_path' column.
 
     Returns
     -------
     pandas.DataFrame
-        DataFrame with added 'sequence' column indicating consecutive image numbers.
-
-    Notes
-    -----
-    Images taken within 1 minute of each other are considered part of the same sequence.
-    Sequence counter resets when there's a gap longer than 1 minute between images.
-    Modifies the input DataFrame in place and also returns it.
+        DataFrame with an added 'file_number' column: the number of 'RCNXnnnn'
+        files, a random negative number otherwise.
     """
-    # Trier les données par date d'acquisition
-    df.sort_values("date_acquisition", inplace=True)
-
-    # Convertir la colonne 'date_acquisition' en datetime
-    df["date_acquisition"] = pd.to_datetime(df["date_acquisition"])
-
-    # Initialiser la colonne 'sequence'
-    df["sequence"] = 1
-
-    # Initialiser le compteur de séquence
-    sequence_counter = 1
-
-    # Parcourir les lignes pour attribuer les numéros de séquence
-    time_ref = df.loc[0, "date_acquisition"]
-    for i in range(1, len(df)):
-        current_time = pd.to_datetime(df.loc[i, "date_acquisition"])
-        if current_time <= time_ref + pd.Timedelta(minutes=1):
-            sequence_counter += 1
-            df.loc[i, "sequence"] = sequence_counter
-        else:
-            time_ref = pd.to_datetime(df.loc[i, "date_acquisition"])
-            sequence_counter = 1
-            df.loc[i, "sequence"] = sequence_counter
-    return df
+    structure["file_number"] = structure["file_path"].apply(
+        lambda x: (
+            int(os.path.basename(x)[4:8])
+            if "RCNX" in x
+            else np.random.randint(-9999, -1)
+        )
+    )
+    return structure
 
 
-def add_sequence2name(df):
+def parallel_map(func, items, n_jobs=-1):
     """
-    Add sequence numbers to filenames by modifying the 'new_name' column.
+    Apply a function to a list of items with joblib worker processes.
 
     Parameters
     ----------
-    df : pandas.DataFrame
-        DataFrame containing 'new_name' column with .jpg filenames.
+    func : callable
+        Function applied to each item.
+    items : list
+        Items to process.
+    n_jobs : int, optional
+        Number of processes, -1 for all the cores (default: -1).
 
     Returns
     -------
-    pandas.DataFrame
-        DataFrame with updated 'new_name' column including sequence numbers.
+    list
+        Results, in the order of items.
 
     Notes
     -----
-    Replaces '.jpg' extension with '(sequence_number).jpg' format.
-    Assumes the DataFrame already has a 'sequence' column.
+    Items are sent by chunks, four per process, and each chunk returns the
+    CPU time and I/O of its worker, added to the run metrics (see
+    metrics.map_measured).
     """
-    df["new_name"] = df.apply(
-        lambda x: x.new_name.replace(".jpg", f"({x.sequence}).jpg"), axis=1
+    size = max(1, -(-len(items) // (4 * effective_n_jobs(n_jobs))))
+    chunks = Parallel(n_jobs=n_jobs)(
+        delayed(map_measured)(func, items[i : i + size])
+        for i in range(0, len(items), size)
     )
-    return df
+    results = []
+    for chunk, usage in chunks:
+        report_worker_usage(usage)
+        results.extend(chunk)
+    return results
 
 
-def calculate_hash_df(df):
+def calculate_hash_df(df, cache=None, n_jobs=-1):
     """
     Calculate MD5 hashes for all files in a DataFrame using parallel processing.
 
@@ -606,6 +770,11 @@ def calculate_hash_df(df):
     ----------
     df : pandas.DataFrame
         DataFrame containing a 'file_path' column.
+    cache : MetadataCache, optional
+        Persistent cache; hashes of unchanged files are read from it and new
+        hashes are stored back (default: None).
+    n_jobs : int, optional
+        Number of hashing processes, -1 for all the cores (default: -1).
 
     Returns
     -------
@@ -614,23 +783,47 @@ def calculate_hash_df(df):
 
     Notes
     -----
-    Uses joblib for parallel hash calculation with all available cores (-1).
+    Uses joblib for parallel hash calculation (see parallel_map), with all
+    available cores by default.
     """
+    file_paths = list(df["file_path"])
+    hashes = {}
+    if cache is not None:
+        for path, entry in cache.get_many(file_paths).items():
+            if entry["hash_md5"] is not None:
+                hashes[path] = entry["hash_md5"]
+
     # Utiliser joblib pour paralléliser l'application de calculate_md5
-    df["hash"] = Parallel(n_jobs=-1)(
-        delayed(calculate_md5)(file_path) for file_path in df["file_path"]
-    )
+    to_hash = [p for p in dict.fromkeys(file_paths) if p not in hashes]
+    computed = parallel_map(calculate_md5, to_hash, n_jobs=n_jobs)
+    hashes.update(zip(to_hash, computed))
+    if cache is not None:
+        cache.put_many(
+            {"file_path": p, "hash_md5": h} for p, h in zip(to_hash, computed)
+        )
+    if "size" in df.columns:
+        sizes = dict(zip(df["file_path"], df["size"]))
+        report_progress(len(df), int(sum(sizes[p] for p in to_hash)))
+    else:
+        report_progress(len(df), sum(os.path.getsize(p) for p in to_hash))
+
+    df["hash"] = [hashes[p] for p in file_paths]
     return df
 
 
-def check_doublon(df):
+def check_doublon(df, cache=None, n_jobs=-1):
     """
     Identify and remove duplicate files based on MD5 hash comparison.
 
     Parameters
     ----------
     df : pandas.DataFrame
-        DataFrame containing file information with 'file_path' column.
+        DataFrame containing file information with 'file_path' column, and
+        optionally a 'size' column (file size in bytes) from the discovery stat.
+    cache : MetadataCache, optional
+        Persistent cache used to skip hashing unchanged files (default: None).
+    n_jobs : int, optional
+        Number of hashing processes, -1 for all the cores (default: -1).
 
     Returns
     -------
@@ -640,20 +833,61 @@ def check_doublon(df):
 
     Notes
     -----
-    Calculates MD5 hashes for all files and removes duplicates based on hash values.
-    The first occurrence of each unique hash is kept.
+    Duplicates are searched in three stages, each one only looking at the
+    files still colliding after the previous one:
+    1. file size (identical files have identical sizes),
+    2. MD5 of the first and last 16 KiB (hashing.hash_edges),
+    3. full MD5 of the file.
+    The kept and dropped files are the same as when hashing every file; the
+    'hash' column is only filled for the files that reached stage 3. Each
+    file is counted once with metrics.report_progress, with the bytes read
+    by stages 2 and 3.
     """
-    # Calculer les hash pour le DataFrame
-    df_hash = calculate_hash_df(df).copy(deep=True)
+    df_hash = df.copy(deep=True)
+    df_hash["hash"] = None
+    expect_files(len(df_hash))
+
+    # Étape 1 : regrouper par taille
+    if "size" in df_hash.columns:
+        sizes = df_hash["size"]
+    else:
+        sizes = pd.Series(
+            [os.path.getsize(p) for p in df_hash["file_path"]], index=df_hash.index
+        )
+    candidates = df_hash[sizes.duplicated(keep=False).values]
+    # Fichiers de taille unique : écartés sans être lus
+    report_progress(len(df_hash) - len(candidates))
+
+    # Étape 2 : hash du début et de la fin des fichiers de même taille
+    if len(candidates) > 0:
+        edges = parallel_map(hash_edges, list(candidates["file_path"]), n_jobs=n_jobs)
+        keys = pd.DataFrame(
+            {"size": sizes[candidates.index].values, "edges": edges},
+            index=candidates.index,
+        )
+        n_candidates = len(candidates)
+        edge_bytes = int(
+            np.minimum(sizes[candidates.index], 2 * DEFAULT_EDGE_SIZE).sum()
+        )
+        candidates = candidates[keys.duplicated(keep=False).values]
+        report_progress(n_candidates - len(candidates), edge_bytes)
+
+    # Étape 3 : hash complet des fichiers qui collisionnent encore
+    if len(candidates) > 0:
+        candidates = calculate_hash_df(candidates.copy(), cache=cache, n_jobs=n_jobs)
+        df_hash.loc[candidates.index, "hash"] = candidates["hash"]
 
     # Identifier les doublons
-    duplicated = df_hash[df_hash.duplicated(subset="hash", keep="first")]
+    duplicated_mask = pd.Series(False, index=df_hash.index)
+    duplicated_mask[candidates.index] = candidates.duplicated(
+        subset="hash", keep="first"
+    ).values
 
     # Supprimer les doublons basés sur la colonne 'hash'
-    df_unique = df_hash.drop_duplicates(subset="hash", keep="first")
+    df_unique = df_hash[~duplicated_mask.values]
 
     # Obtenir la liste des fichiers supprimés
-    dropped_files = duplicated["file_path"]
+    dropped_files = df_hash.loc[duplicated_mask.values, "file_path"]
 
     return df_unique, dropped_files
 
@@ -738,75 +972,193 @@ def patch_area(structure, area2patch, last_image_issue, correct_date, query_cond
     -----
     Calculates time offset from reference image and applies it to selected files.
     Used to fix systematic timestamp errors in camera trap data.
+    Single-rule shortcut of date_correction.apply_date_corrections, which
+    applies several areas at once.
+    """
+    rule = {
+        "station": area2patch,
+        "selector": query_condition,
+        "reference_image": last_image_issue,
+        "true_date": correct_date,
+    }
+    return apply_date_corrections(structure, [rule], audit=False)
+
+
+def add_new_names(structure, type_file=".jpg"):
+    """
+    Build the new name of every file from its station and acquisition date.
+
+    Parameters
+    ----------
+    structure : pandas.DataFrame
+        DataFrame with 'new_dir' and 'date_acquisition' columns.
+    type_file : str, optional
+        File extension of the new names, with or without '.' (default: ".jpg").
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame with an added 'new_name' column,
+        '<new_dir>__<YYYY-MM-DD>__<HH-MM-SS><ext>' (None without date).
+
+    Notes
+    -----
+    The names are built for all the files at once (naming.build_names).
     """
-    sub_df = structure.loc[structure.new_dir == area2patch, :]
-    idx = extract_indice_to_rename(sub_df, query_condition)
-    sub_df = sub_df.loc[idx]
-    delta = delta_enregistrement(sub_df, last_image_issue, correct_date)
-    sub_df.date_acquisition = sub_df.date_acquisition.apply(
-        lambda x: pd.to_datetime(x) + delta
+    structure["new_name"] = build_names(
+        structure["new_dir"], structure["date_acquisition"], type_file
     )
-    # convert to datetime64
-    sub_df.date_acquisition = pd.to_datetime(sub_df.date_acquisition)
-    idx_structure = structure.index[structure.new_dir == area2patch][idx]
-    structure.loc[idx_structure, "date_acquisition"] = sub_df.date_acquisition
     return structure
 
 
-def add_sequence_column(df):
+def split_timelapse(structure, corresponding_dir, tolerance=DEFAULT_TOLERANCE):
     """
-    Add sequence numbers to consecutive images taken within 1-minute intervals (improved version).
+    Separate the timelapse shots from the camera trap triggers.
+
+    Parameters
+    ----------
+    structure : pandas.DataFrame
+        DataFrame with 'new_name' and 'date_acquisition' columns.
+    corresponding_dir : pandas.DataFrame
+        Correspondence table of the stations, with an optional 'timelapse'
+        column giving the schedule of each station ('9am', '9am, 4pm',
+        'every 30m'...; see timelapse.parse_timelapse_schedule).
+    tolerance : int, optional
+        Maximum delay in seconds after the scheduled time (default: 9).
+
+    Returns
+    -------
+    tuple of (pandas.DataFrame, pandas.DataFrame)
+        - Timelapse files
+        - Camera trap files
+
+    Notes
+    -----
+    Adds a 'station' column (prefix of 'new_name' before '__', taken from
+    'new_dir' which starts every name), and 'timelapse' and
+    'is_timelapse' columns when the table has a schedule. Without 'timelapse'
+    column, every photo taken at minute 0 and seconds 00 to 09 is considered
+    a timelapse shot. The schedules are parsed once per distinct value and
+    the photos are classified with a single vectorized mask; the index of
+    structure is kept.
+    """
+    # Station = début de new_name avant '__' ; new_name commençant par new_dir,
+    # seules les valeurs distinctes de new_dir sont découpées
+    codes, uniques = pd.factorize(structure["new_dir"])
+    prefixes = np.array([str(d).split("__")[0] for d in uniques] + [None], dtype=object)
+    structure["station"] = pd.Series(prefixes[codes], index=structure.index).where(
+        structure["new_name"].notna(), None
+    )
+
+    # Check if timelapse column exists in corresponding_dir
+    if "timelapse" in corresponding_dir.columns:
+        # Programme de chaque station (première ligne si la station est répétée)
+        schedules = corresponding_dir.drop_duplicates("station").set_index("station")[
+            "timelapse"
+        ]
+        structure["timelapse"] = structure["station"].map(schedules)
+        structure["is_timelapse"] = timelapse_mask(
+            structure["date_acquisition"], structure["timelapse"], tolerance
+        )
+        mask = structure["is_timelapse"].to_numpy()
+    else:
+        print(
+            "Warning: 'timelapse' column not found in corresponding_dir. Using date-based separation."
+        )
+        mask = timelapse_mask(
+            structure["date_acquisition"],
+            pd.Series(FALLBACK_SCHEDULE, index=structure.index),
+            tolerance,
+        )
+    return structure[mask].copy(deep=True), structure[~mask].copy(deep=True)
+
+
+def add_sequence_column(df, by=None, gap=pd.Timedelta(minutes=1)):
+    """
+    Add sequence numbers to consecutive images taken within 1-minute intervals.
 
     Parameters
     ----------
     df : pandas.DataFrame
         DataFrame containing 'date_acquisition' column with datetime information.
+    by : str, optional
+        Column identifying independent groups (e.g. 'new_dir'); sequences are
+        numbered separately in each group in a single pass (default: None).
+    gap : pandas.Timedelta, optional
+        Maximum delay from the first image of a sequence (default: 1 minute).
 
     Returns
     -------
     pandas.DataFrame
-        DataFrame with added 'sequence' column indicating consecutive image numbers.
+        Copy of the DataFrame sorted by date (by group then date if by is given),
+        with an added 'sequence' column indicating consecutive image numbers.
 
     Notes
     -----
-    Images taken within 1 minute of each other are considered part of the same sequence.
-    Sequence counter resets when there's a gap longer than 1 minute between images.
-    This version uses .copy() and .loc[] for safer DataFrame operations.
+    Images taken within 1 minute of the first image of the current sequence are
+    part of that sequence; the reference time and the counter (restarting at 1)
+    are reset on the first image beyond that delay. Images without date each
+    form their own sequence.
+    The next sequence start of every image is found with one vectorized
+    searchsorted per group, so the only Python loop walks sequence starts.
     """
     # Trier les données par date d'acquisition
-    df = df.sort_values("date_acquisition").copy()
+    sort_columns = ["date_acquisition"] if by is None else [by, "date_acquisition"]
+    df = df.sort_values(sort_columns, kind="stable", na_position="last").copy()
 
     # Convertir la colonne 'date_acquisition' en datetime
-    df.loc[:, "date_acquisition"] = pd.to_datetime(df["date_acquisition"])
-
-    # Initialiser la colonne 'sequence'
-    df.loc[:, "sequence"] = 1
+    df["date_acquisition"] = pd.to_datetime(df["date_acquisition"])
 
-    # Initialiser le compteur de séquence
-    sequence_counter = 1
+    n = len(df)
+    dates = df["date_acquisition"]
+    times = dates.values.astype("datetime64[ns]").astype(np.int64)
+    valid = dates.notna().values
+    gap_ns = np.int64(pd.Timedelta(gap).value)
 
-    # Parcourir les lignes pour attribuer les numéros de séquence
-    time_ref = df.loc[df.index[0], "date_acquisition"]
-    for i in df.index[1:]:
-        current_time = pd.to_datetime(df.loc[i, "date_acquisition"])
-        if current_time <= time_ref + pd.Timedelta(minutes=1):
-            sequence_counter += 1
-            df.loc[i, "sequence"] = sequence_counter
-        else:
-            time_ref = pd.to_datetime(df.loc[i, "date_acquisition"])
-            sequence_counter = 1
-            df.loc[i, "sequence"] = sequence_counter
+    # Bornes des groupes (un seul groupe si by est None)
+    if by is None:
+        bounds = np.array([0, n])
+    else:
+        keys = pd.factorize(df[by], use_na_sentinel=False)[0]
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1, [n]))
+
+    # Indice du premier cliché au-delà du délai, pour chaque cliché
+    next_start = np.arange(1, n + 1)
+    starts = np.ones(n, dtype=bool)
+    for g0, g1 in zip(bounds[:-1], bounds[1:]):
+        # Les dates manquantes sont triées en fin de groupe
+        v1 = g0 + int(valid[g0:g1].sum())
+        if v1 - g0 > 1:
+            t = times[g0:v1]
+            next_start[g0:v1] = np.searchsorted(t, t + gap_ns, side="right") + g0
+            starts[g0 + 1 : v1] = False
+
+    # Parcourir uniquement les débuts de séquence
+    next_start_list = next_start.tolist()
+    for g0, g1 in zip(bounds[:-1], bounds[1:]):
+        v1 = g0 + int(valid[g0:g1].sum())
+        i = int(g0)
+        while i < v1:
+            starts[i] = True
+            i = next_start_list[i]
+
+    positions = np.arange(n)
+    last_start = np.maximum.accumulate(np.where(starts, positions, 0))
+    df["sequence"] = positions - last_start + 1
     return df
 
 
-def add_sequence2name(df):
+def add_sequence2name(df, by=None):
     """
-    Add sequence numbers to filenames by modifying the 'new_name' column (improved version).
+    Add sequence numbers to filenames by modifying the 'new_name' column.
 
     Parameters
     ----------
     df : pandas.DataFrame
-        DataFrame containing 'new_name' column with .jpg filenames and 'date_acquisition' column.
+        DataFrame containing 'new_name' and 'date_acquisition' columns.
+    by : str, optional
+        Column identifying independent groups, passed to add_sequence_column
+        (default: None).
 
     Returns
     -------
@@ -815,18 +1167,16 @@ def add_sequence2name(df):
 
     Notes
     -----
-    First calls add_sequence_column() to generate sequence numbers, then updates filenames.
-    Replaces '.jpg' extension with '(sequence_number).jpg' format.
-    Uses .loc[] for safer DataFrame operations.
+    First calls add_sequence_column() to generate sequence numbers, then
+    inserts '(sequence_number)' before the extension of every name, whatever
+    the extension (naming.add_sequence_suffix).
     """
-    df = add_sequence_column(df)
-    df.loc[:, "new_name"] = df.apply(
-        lambda x: x.new_name.replace(".jpg", f"({x.sequence}).jpg"), axis=1
-    )
+    df = add_sequence_column(df, by=by)
+    df["new_name"] = add_sequence_suffix(df["new_name"], df["sequence"])
     return df
 
 
-def process_files(row, cleaned_dir, copy=False, timelapse=False):
+def process_files(row, cleaned_dir, copy=False, timelapse=False, mode=None):
     """
     Process and organize individual files into the cleaned directory structure.
 
@@ -842,8 +1192,12 @@ def process_files(row, cleaned_dir, copy=False, timelapse=False):
         Path to the cleaned directory structure.
     copy : bool, optional
         If True, copy files; if False, move files (default: False).
+        Ignored when mode is given.
     timelapse : bool, optional
         If True, organize as timelapse; if False, organize by year (default: False).
+    mode : str, optional
+        Placement strategy, one of placement.PLACEMENT_MODES ('copy', 'move',
+        'hardlink', 'reflink', 'symlink'). Overrides copy (default: None).
 
     Returns
     -------
@@ -854,15 +1208,13 @@ def process_files(row, cleaned_dir, copy=False, timelapse=False):
     -----
     Creates year-based subdirectories for regular files or timelapse subdirectory.
     Skips processing if target file already exists.
-    Uses shutil.copy2() for copying or shutil.move() for moving files.
+    Files are placed with placement.place_file().
     """
+    if mode is None:
+        mode = "copy" if copy else "move"
     if row.date_acquisition is not None:
         if not timelapse:
-            try:
-                year = row.date_acquisition.year
-            except:
-                year = pd.to_datetime(row.date_acquisition).year
-
+            year = pd.Timestamp(row.date_acquisition).year
             new_dir = os.path.join(os.path.abspath(cleaned_dir), str(year), row.new_dir)
         else:
             new_dir = os.path.join(
@@ -870,12 +1222,153 @@ def process_files(row, cleaned_dir, copy=False, timelapse=False):
             )
         os.makedirs(new_dir, exist_ok=True)
         new_file = os.path.join(new_dir, row.new_name)
-        if os.path.exists(new_file):
+        if os.path.lexists(new_file):
             print(f"File {new_file} already exists")
             return cleaned_dir
         else:
-            if copy:
-                shutil.copy2(row.file_path, new_file)
-            else:
-                shutil.move(row.file_path, new_file)
+            place_file(row.file_path, new_file, mode)
     return cleaned_dir
+
+
+def get_destinations(df, cleaned_dir, timelapse=False):
+    """
+    Build the destination path of every file of a DataFrame.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        DataFrame with 'date_acquisition', 'new_dir' and 'new_name' columns.
+    cleaned_dir : str
+        Path to the cleaned directory structure.
+    timelapse : bool, optional
+        If True, organize as timelapse; if False, organize by year (default: False).
+
+    Returns
+    -------
+    pandas.Series
+        Destination paths, <cleaned_dir>/<year or timelapse>/<new_dir>/<new_name>.
+    """
+    root = os.path.abspath(cleaned_dir) + os.sep
+    if timelapse:
+        folder = pd.Series("timelapse", index=df.index)
+    else:
+        folder = (
+            pd.to_datetime(df["date_acquisition"]).dt.year.astype("Int64").astype(str)
+        )
+    # Colonnes converties en 'str' : les chaînes pyarrow ne s'additionnent pas aux objets
+    return (
+        root
+        + folder
+        + os.sep
+        + df["new_dir"].astype(str)
+        + os.sep
+        + df["new_name"].astype(str)
+    )
+
+
+def drop_collisions(df, cleaned_dir, timelapse=False):
+    """
+    Keep a single file per destination before placing a DataFrame.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        DataFrame with 'file_path', 'date_acquisition', 'new_dir' and 'new_name'
+        columns.
+    cleaned_dir : str
+        Path to the cleaned directory structure.
+    timelapse : bool, optional
+        If True, organize as timelapse; if False, organize by year (default: False).
+
+    Returns
+    -------
+    tuple of (pandas.DataFrame, pandas.DataFrame)
+        - DataFrame without the files whose destination is already taken by
+          a previous file of df
+        - Collisions found by naming.find_collisions
+
+    Notes
+    -----
+    Timelapse and camera files are placed in different folders, so checking
+    each DataFrame before its placement finds every collision of a run.
+    """
+    destinations = get_destinations(df, cleaned_dir, timelapse=timelapse)
+    skipped = destinations.notna() & destinations.duplicated(keep="first")
+    return df[~skipped.to_numpy()], find_collisions(df, destinations)
+
+
+def place_structure(
+    df, cleaned_dir, timelapse=False, mode="copy", n_workers=8, journal=None
+):
+    """
+    Place all the files of a DataFrame into the cleaned directory structure.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        DataFrame with 'file_path', 'date_acquisition', 'new_dir' and 'new_name'
+        columns.
+    cleaned_dir : str
+        Path to the cleaned directory structure.
+    timelapse : bool, optional
+        If True, organize as timelapse; if False, organize by year (default: False).
+    mode : str, optional
+        Placement strategy, one of placement.PLACEMENT_MODES (default: "copy").
+    n_workers : int, optional
+        Number of placement threads (default: 8).
+    journal : journal.PlacementJournal, optional
+        Write-ahead journal of the placements (default: None).
+
+    Returns
+    -------
+    dict
+        Throughput statistics returned by placement.place_files.
+
+    Notes
+    -----
+    Batch equivalent of process_files: files without acquisition date are
+    skipped, target directories are created once up front and files are
+    placed by chunks in a thread pool.
+    """
+    df = df[pd.to_datetime(df["date_acquisition"]).notna() & df["new_name"].notna()]
+    destinations = get_destinations(df, cleaned_dir, timelapse=timelapse)
+    return place_files(
+        df["file_path"].tolist(),
+        destinations.tolist(),
+        mode=mode,
+        n_workers=n_workers,
+        journal=journal,
+    )
+
+
+def verify_placements(journal, cleaned_dir, n_workers=8):
+    """
+    Verify the files placed during a run against the hashes computed while copying them.
+
+    Parameters
+    ----------
+    journal : journal.PlacementJournal
+        Journal of the placements of the run.
+    cleaned_dir : str
+        Path to the cleaned directory structure; the failures are saved in
+        its .tmp folder as verification_<YYYYmmddHHMMSS>.csv.
+    n_workers : int, optional
+        Number of threads reading the destinations (default: 8).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Per-file report (see verification.verify_copies).
+
+    Notes
+    -----
+    Each placed file is read once from the destination; the sources are not
+    read again. Files placed without copy (links, moves) have no hash and are
+    only checked for presence and size.
+    """
+    report = verify_journal(journal, n_workers=n_workers)
+    id_today = time.strftime("%Y%m%d%H%M%S")
+    save_report(
+        report, os.path.join(cleaned_dir, ".tmp", f"verification_{id_today}.csv")
+    )
+    return report
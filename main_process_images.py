@@ -1,6 +1,14 @@
 from lib import *
 from display import *
-from tqdm import tqdm
+from metadata_cache import MetadataCache, get_cache_path
+from naming import save_collisions
+from journal import PlacementJournal, get_journal_path, replay_journal
+from metrics import RunMetrics
+from manifest_store import MANIFEST_FORMATS, ManifestStore
+from date_correction import apply_date_corrections, collect_rules
+from placement import format_stats, merge_stats
+from streaming import run_streaming
+from pipeline import parse_stage_workers, run_pipelined
 import numpy as np
 import pandas as pd
 
@@ -13,8 +21,177 @@ def main(
     query_condition_g,
     last_image_issue_g,
     correct_date_g,
+    use_cache=True,
+    placement="copy",
+    output_dir=None,
+    manifest=None,
+    streaming=False,
+    pipelined=False,
+    stage_workers=None,
+    timelapse_tolerance=DEFAULT_TOLERANCE,
+    resume=False,
+    verify=False,
+    manifest_format=None,
+    date_rules=None,
 ):
-    loader = TermLoading()
+    """
+    Run the whole processing pipeline on a directory of camera trap files.
+
+    Parameters
+    ----------
+    files_path : str
+        Path to the directory of raw files.
+    corresponding_dir : pandas.DataFrame
+        Correspondence table of the stations.
+    type_file : str
+        File extension to process (e.g. ".jpg", ".avi").
+    area2patch_g, query_condition_g, last_image_issue_g, correct_date_g : list
+        Date corrections to apply, one entry per area (see
+        date_correction.rules_from_patches).
+    use_cache : bool, optional
+        If False, neither read nor update the metadata cache kept in
+        CLEANED/.tmp and extract everything again (default: True).
+    placement : str, optional
+        How files are placed in the cleaned arborescence: 'copy', 'move',
+        'hardlink', 'reflink' or 'symlink' (default: "copy").
+    output_dir : str, optional
+        Final destination of the cleaned arborescence, so that no further copy
+        is needed (default: None, a 'CLEANED' directory next to files_path).
+    manifest : pandas.DataFrame, optional
+        File manifest from discovery.discover_files, shared between runs on
+        several file types of the same tree so that it is only walked once
+        (default: None, the tree is walked).
+    streaming : bool, optional
+        If True, process the files station by station (streaming.run_streaming)
+        so that memory depends on the largest station and not on the whole
+        archive (default: False).
+    pipelined : bool, optional
+        If True, process the files station by station with extraction, hashing
+        and placement running concurrently (pipeline.run_pipelined); implies a
+        bounded memory like streaming (default: False).
+    stage_workers : dict, optional
+        Number of threads of the 'extract', 'hash' and 'place' stages of the
+        pipelined mode (default: None, pipeline.DEFAULT_STAGE_WORKERS).
+    timelapse_tolerance : int, optional
+        Maximum delay in seconds between the scheduled time of a timelapse
+        shot and the acquisition date (default: 9).
+    resume : bool, optional
+        If True, first finish the placements left unfinished by an interrupted
+        run (recorded in CLEANED/.tmp/placement_journal.jsonl), then run the
+        pipeline again without placing the files it already completed
+        (default: False, a new journal is started).
+    verify : bool, optional
+        If True, read back every file placed by the run and compare it with
+        the hash computed while copying it; failures are saved in
+        CLEANED/.tmp/verification_<id>.csv (default: False).
+    manifest_format : str, optional
+        Format of the manifests of the run in CLEANED/.tmp: 'parquet' (a
+        dataset partitioned by year and station, see manifest_store) or 'csv'
+        (default: None, 'parquet' if pyarrow is installed).
+    date_rules : str or pandas.DataFrame, optional
+        More date corrections: a table of rules or the path of its CSV/JSON
+        file (see date_correction.make_rules), applied with the per-area
+        corrections in a single pass (default: None).
+
+    Notes
+    -----
+    The wall time, CPU time, files, bytes and peak memory of each step are
+    saved in CLEANED/.tmp/run_metrics_<id>.json (see metrics.RunMetrics). Set
+    the CAMTRAP_PROFILE environment variable to a directory to also dump a
+    cProfile profile of each step there.
+    """
+    if placement not in PLACEMENT_MODES:
+        raise ValueError(
+            f"Mode de placement non reconnu: {placement}. Modes possibles: {', '.join(PLACEMENT_MODES)}"
+        )
+    if output_dir is not None:
+        cleaned_dir = os.path.abspath(output_dir)
+    else:
+        cleaned_dir = get_cleaned_dir(files_path)
+    id_today = time.strftime("%Y%m%d%H%M%S")
+    # Mesures par étape, enregistrées dans .tmp/run_metrics_<id>.json
+    metrics = RunMetrics(id_today)
+    metrics.activate()
+    # Journal des placements, rejoué après une interruption
+    # Copies hachées pendant la copie seulement si --verify en a besoin
+    journal = PlacementJournal(
+        get_journal_path(cleaned_dir), resume=resume, checksum=verify
+    )
+    if resume:
+        try:
+            metrics.start("0. Replaying interrupted placements")
+            print(f"Placement: {format_stats(replay_journal(journal))}")
+            metrics.stop()
+        except Exception as e:
+            metrics.stop("failed")
+            print(f"Error: {e}")
+
+    if pipelined or streaming:
+        try:
+            metrics.start("Pipelined run" if pipelined else "Streaming run")
+            if pipelined:
+                run_pipelined(
+                    files_path,
+                    corresponding_dir,
+                    type_file,
+                    area2patch_g,
+                    query_condition_g,
+                    last_image_issue_g,
+                    correct_date_g,
+                    cleaned_dir,
+                    use_cache=use_cache,
+                    placement=placement,
+                    manifest=manifest,
+                    stage_workers=stage_workers,
+                    timelapse_tolerance=timelapse_tolerance,
+                    journal=journal,
+                    manifest_format=manifest_format,
+                    date_rules=date_rules,
+                )
+            else:
+                run_streaming(
+                    files_path,
+                    corresponding_dir,
+                    type_file,
+                    area2patch_g,
+                    query_condition_g,
+                    last_image_issue_g,
+                    correct_date_g,
+                    cleaned_dir,
+                    use_cache=use_cache,
+                    placement=placement,
+                    manifest=manifest,
+                    timelapse_tolerance=timelapse_tolerance,
+                    journal=journal,
+                    manifest_format=manifest_format,
+                    date_rules=date_rules,
+                )
+            metrics.stop()
+        except Exception as e:
+            metrics.stop("failed")
+            print(f"Error: {e}")
+        if verify:
+            try:
+                metrics.start("Verifying placed files")
+                verify_placements(journal, cleaned_dir)
+                metrics.stop()
+            except Exception as e:
+                metrics.stop("failed")
+                print(f"Error: {e}")
+        journal.close()
+        try:
+            metrics.finish(os.path.join(cleaned_dir, ".tmp"))
+        except Exception as e:
+            print(f"Error: {e}")
+        print("Terminated")
+        return
+
+    loader = TermLoading(metrics=metrics)
+    manifests = ManifestStore(
+        os.path.join(cleaned_dir, ".tmp"), id_today, manifest_format
+    )
+    cache = None
+    placement_stats = []
 
     try:
         loader.show(
@@ -22,13 +199,19 @@ def main(
             finish_message="✅ Finished extracting metadata",
             failed_message="❌ Failed extracting metadata",
         )
-        id_today = time.strftime("%Y%m%d%H%M%S")
-        files_name = get_file_paths(files_path, save_path=None, type_file=type_file)
-        structure = Parallel(n_jobs=-1)(
-            delayed(get_metadata_structure)(f, corresponding_dir, type_file)
-            for f in tqdm(files_name, desc="Extracting metadata")
+        collisions_csv = os.path.join(cleaned_dir, ".tmp", f"collisions_{id_today}.csv")
+        if manifest is None:
+            manifest = discover_files(files_path, exclude_dirs=[cleaned_dir])
+        files_name = get_file_paths(
+            files_path, save_path=None, type_file=type_file, manifest=manifest
+        )
+        resolver = StationResolver(corresponding_dir)
+        cache = MetadataCache(get_cache_path(cleaned_dir)) if use_cache else None
+        file_stats = manifest_stats(filter_manifest(manifest, type_file))
+        structure = extract_metadata(
+            files_name, resolver, type_file, cache=cache, stats=file_stats
         )
-        structure = pd.DataFrame(structure)
+        structure["size"] = [file_stats[f][0] for f in structure["file_path"]]
         loader.finished = True
     except Exception as e:
         loader.failed = True
@@ -40,15 +223,11 @@ def main(
             finish_message="✅ Finished creating cleaned arborescence",
             failed_message="❌ Failed creating cleaned arborescence",
         )
-        cleaned_dir = prepare_cleaned_structure(files_path, structure, timelapse=True)
-        os.makedirs(os.path.join(cleaned_dir, ".tmp"), exist_ok=True)
-        structure["file_number"] = structure["file_path"].apply(
-            lambda x: (
-                int(os.path.basename(x)[4:8])
-                if "RCNX" in x
-                else np.random.randint(-9999, -1)
-            )
+        cleaned_dir = prepare_cleaned_structure(
+            files_path, structure, timelapse=True, cleaned_dir=cleaned_dir
         )
+        os.makedirs(os.path.join(cleaned_dir, ".tmp"), exist_ok=True)
+        structure = add_file_number(structure)
         loader.finished = True
     except Exception as e:
         loader.failed = True
@@ -60,27 +239,33 @@ def main(
             finish_message="✅ Finished checking for duplicates",
             failed_message="❌ Failed checking for duplicates",
         )
-        structure, dropped = check_doublon(structure)
-        dropped.to_csv(os.path.join(cleaned_dir, ".tmp", f"dropped_{id_today}.csv"))
+        structure_all = structure
+        structure, dropped = check_doublon(structure, cache=cache)
+        manifests.write(
+            "dropped", dropped, station=structure_all.loc[dropped.index, "new_dir"]
+        )
+        manifests.write("structure", structure)
         loader.finished = True
     except Exception as e:
         loader.failed = True
         print(f"Error: {e}")
 
     try:
-        for area2patch, query_condition, last_image_issue, correct_date in zip(
-            area2patch_g, query_condition_g, last_image_issue_g, correct_date_g
-        ):
-            if (area2patch is None) or (area2patch == ""):
-                loader.show("4. No area to patch", finish_message="✅ No area to patch")
+        rules = collect_rules(
+            area2patch_g,
+            query_condition_g,
+            last_image_issue_g,
+            correct_date_g,
+            date_rules,
+        )
+        if len(rules) > 0:
             loader.show(
-                f"4. Correcting {area2patch} area",
-                finish_message=f"✅ Finished correcting {area2patch} area",
-                failed_message=f"❌ Failed correcting {area2patch} area",
-            )
-            structure = patch_area(
-                structure, area2patch, last_image_issue, correct_date, query_condition
+                f"4. Correcting dates ({len(rules)} rules)",
+                finish_message="✅ Finished correcting dates",
+                failed_message="❌ Failed correcting dates",
             )
+            # Toutes les règles en une passe, avec le décalage appliqué en colonne d'audit
+            structure = apply_date_corrections(structure, rules)
             loader.finished = True
     except Exception as e:
         loader.failed = True
@@ -92,19 +277,7 @@ def main(
             finish_message="✅ Finished adding new names",
             failed_message="❌ Failed adding new names",
         )
-        # utiliser l'extension fournie par type_file (ajoute '.' si absent)
-        ext = type_file if type_file.startswith(".") else f".{type_file}"
-        structure["new_name"] = structure.apply(
-            lambda x: (
-                x.new_dir
-                + "__"
-                + x.date_acquisition.strftime("%Y-%m-%d__%H-%M-%S")
-                + ext
-                if ((x.date_acquisition is not None))
-                else None
-            ),
-            axis=1,
-        )
+        structure = add_new_names(structure, type_file)
         loader.finished = True
     except Exception as e:
         loader.failed = True
@@ -117,95 +290,10 @@ def main(
             failed_message="❌ Failed separating timelapse and camera images",
         )
 
-        # Extract station from new_name column (split on '__' and take first part)
-        structure["station"] = structure["new_name"].apply(
-            lambda x: x.split("__")[0] if pd.notna(x) and "__" in x else None
+        structure_timelapse, structure_camera = split_timelapse(
+            structure, corresponding_dir, tolerance=timelapse_tolerance
         )
 
-        # Check if timelapse column exists in corresponding_dir
-        if "timelapse" in corresponding_dir.columns:
-            # Merge structure with corresponding_dir to get timelapse info
-            structure_with_timelapse = structure.merge(
-                corresponding_dir[["station", "timelapse"]],
-                on="station",
-                how="left",
-            )
-
-            # Function to convert timelapse time format to hour (24h format)
-            def convert_timelapse_to_hour(timelapse_val):
-                if pd.isna(timelapse_val) or str(timelapse_val).lower() == "non":
-                    return None
-
-                timelapse_str = str(timelapse_val).lower()
-                if "m" in timelapse_str:
-                    # Split on 'm' and take the first part
-                    time_part = timelapse_str.split("m")[0]
-                    if "a" in time_part:
-                        # AM time
-                        hour_str = time_part.replace("a", "")
-                        try:
-                            hour = int(hour_str)
-                            return hour if hour != 12 else 0  # 12am = 0h
-                        except ValueError:
-                            return None
-                    elif "p" in time_part:
-                        # PM time
-                        hour_str = time_part.replace("p", "")
-                        try:
-                            hour = int(hour_str)
-                            return (
-                                hour + 12 if hour != 12 else 12
-                            )  # 12pm = 12h, others +12
-                        except ValueError:
-                            return None
-                return None
-
-            # Function to check if a photo is timelapse based on date and timelapse schedule
-            def is_timelapse_photo(row):
-                if pd.isna(row["timelapse"]) or str(row["timelapse"]).lower() == "non":
-                    return False
-
-                timelapse_hour = convert_timelapse_to_hour(row["timelapse"])
-                if timelapse_hour is None:
-                    return False
-
-                photo_datetime = row["date_acquisition"]
-                if pd.isna(photo_datetime):
-                    return False
-
-                # Check if minute is 0, hour matches timelapse schedule, and second is 00-09
-                return (
-                    photo_datetime.minute == 0
-                    and photo_datetime.hour == timelapse_hour
-                    and photo_datetime.second <= 9  # Accept seconds 00 to 09
-                )
-
-            structure_with_timelapse["is_timelapse"] = structure_with_timelapse.apply(
-                is_timelapse_photo, axis=1
-            )
-
-            structure_timelapse = structure_with_timelapse[
-                structure_with_timelapse["is_timelapse"] == True
-            ].copy(deep=True)
-            structure_camera = structure_with_timelapse[
-                structure_with_timelapse["is_timelapse"] == False
-            ].copy(deep=True)
-        else:
-            print(
-                "Warning: 'timelapse' column not found in corresponding_dir. Using date-based separation."
-            )
-            # Use original logic based on date/time with relaxed second criteria
-            structure_timelapse = structure[
-                structure.date_acquisition.apply(
-                    lambda x: (True if (x.second <= 9) and (x.minute == 0) else False)
-                )
-            ].copy(deep=True)
-            structure_camera = structure[
-                structure.date_acquisition.apply(
-                    lambda x: (False if (x.second <= 9) and (x.minute == 0) else True)
-                )
-            ].copy(deep=True)
-
         loader.finished = True
     except Exception as e:
         loader.failed = True
@@ -217,9 +305,12 @@ def main(
             finish_message="✅ Finished saving timelapse filenames",
             failed_message="❌ Failed saving timelapse filenames",
         )
-        structure_timelapse.to_csv(
-            os.path.join(cleaned_dir, ".tmp", "structure_timelapse.csv")
+        # Écarter les fichiers qui auraient le même chemin avant de rien placer
+        structure_timelapse, collisions = drop_collisions(
+            structure_timelapse, cleaned_dir, timelapse=True
         )
+        save_collisions(collisions, collisions_csv)
+        manifests.write("timelapse", structure_timelapse)
         loader.finished = True
     except Exception as e:
         loader.failed = True
@@ -231,9 +322,14 @@ def main(
             finish_message="✅ Finished moving timelapse files to new arborescence",
             failed_message="❌ Failed moving timelapse files to new arborescence",
         )
-        Parallel(n_jobs=-1)(
-            delayed(process_files)(row, cleaned_dir, copy=True, timelapse=True)
-            for _, row in tqdm(structure_timelapse.iterrows(), desc="Moving files")
+        placement_stats.append(
+            place_structure(
+                structure_timelapse,
+                cleaned_dir,
+                timelapse=True,
+                mode=placement,
+                journal=journal,
+            )
         )
         loader.finished = True
     except Exception as e:
@@ -246,46 +342,138 @@ def main(
             finish_message="✅ Finished saving camera filenames",
             failed_message="❌ Failed saving camera filenames",
         )
-        for pp in tqdm(
-            structure_camera.new_dir.unique(), desc="Saving camera filenames"
-        ):
-            strc_cam = structure_camera[structure_camera.new_dir == pp]
-            strc_cam = add_sequence2name(strc_cam)
-            strc_cam.to_csv(
-                os.path.join(cleaned_dir, ".tmp", f"structure_camera_{pp}.csv")
-            )
+        # Numéroter les séquences de toutes les stations en une seule passe
+        structure_camera = add_sequence2name(structure_camera, by="new_dir")
+        structure_camera, collisions = drop_collisions(
+            structure_camera, cleaned_dir, timelapse=False
+        )
+        save_collisions(collisions, collisions_csv)
+        manifests.write("camera", structure_camera)
         loader.finished = True
     except Exception as e:
         loader.failed = True
         print(f"Error: {e}")
 
     try:
-        for pp in tqdm(structure_camera.new_dir.unique(), desc="Moving camera files"):
-            strc_cam = pd.read_csv(
-                os.path.join(cleaned_dir, ".tmp", f"structure_camera_{pp}.csv")
+        loader.show(
+            "10. Moving camera files to new arborescence",
+            finish_message="✅ Finished moving camera files to new arborescence",
+            failed_message="❌ Failed moving camera files to new arborescence",
+        )
+        # Placer directement depuis la structure en mémoire (dates typées)
+        placement_stats.append(
+            place_structure(
+                structure_camera,
+                cleaned_dir,
+                timelapse=False,
+                mode=placement,
+                journal=journal,
             )
+        )
+        loader.finished = True
+        print(f"Placement: {format_stats(merge_stats(*placement_stats))}")
+    except Exception as e:
+        loader.failed = True
+        print(f"Error: {e}")
+
+    if verify:
+        try:
             loader.show(
-                f"10. Moving camera files to new arborescence for {pp}",
-                finish_message=f"✅ Finished moving camera files to new arborescence for {pp}",
-                failed_message=f"❌ Failed moving camera files to new arborescence for {pp}",
-            )
-            Parallel(n_jobs=-1)(
-                delayed(process_files)(row, cleaned_dir, copy=True, timelapse=False)
-                for _, row in tqdm(strc_cam.iterrows(), desc="Moving files")
+                "11. Verifying placed files",
+                finish_message="✅ Finished verifying placed files",
+                failed_message="❌ Failed verifying placed files",
             )
+            verify_placements(journal, cleaned_dir)
             loader.finished = True
+        except Exception as e:
+            loader.failed = True
+            print(f"Error: {e}")
+
+    if cache is not None:
+        cache.close()
+    journal.close()
+    try:
+        metrics.finish(os.path.join(cleaned_dir, ".tmp"))
     except Exception as e:
-        loader.failed = True
         print(f"Error: {e}")
-
-    print("11. Terminated")
+    print("Terminated")
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Process camera trap files.")
+    parser.add_argument(
+        "files_path", nargs="?", default="../cache_hdd_molosse/Herbiland_bauges"
+    )
+    parser.add_argument(
+        "--corresponding-csv",
+        default=None,
+        help="Correspondence CSV (default: first corresp*.csv in the current directory)",
+    )
+    parser.add_argument("--type-file", default=".avi")
+    parser.add_argument(
+        "--placement",
+        choices=PLACEMENT_MODES,
+        default="copy",
+        help="How files are placed in the cleaned arborescence (default: copy)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help="Final destination of the cleaned arborescence (default: CLEANED next to files_path)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore the metadata cache of previous runs",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Process the files station by station with bounded memory",
+    )
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Process the stations with extraction, hashing and placement running concurrently",
+    )
+    parser.add_argument(
+        "--stage-workers",
+        default=None,
+        help="Threads per stage of the pipelined mode, e.g. extract=2,hash=2,place=4",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Finish the placements of an interrupted run before processing",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Read back the placed files and check them against the hashes computed while copying",
+    )
+    parser.add_argument(
+        "--manifest-format",
+        choices=MANIFEST_FORMATS,
+        default=None,
+        help="Format of the manifests in CLEANED/.tmp (default: parquet if pyarrow is installed, csv otherwise)",
+    )
+    parser.add_argument(
+        "--date-rules",
+        default=None,
+        help="CSV or JSON table of date corrections (station, selector, reference_image, true_date, offset, offset_unit)",
+    )
+    parser.add_argument(
+        "--timelapse-tolerance",
+        type=int,
+        default=DEFAULT_TOLERANCE,
+        help="Maximum delay in seconds of a timelapse shot after its scheduled time",
+    )
+    args = parser.parse_args()
 
-    files_path = "../cache_hdd_molosse/Herbiland_bauges"
-    corresponding_dir = pd.read_csv(glob.glob("corresp*.csv")[0], sep=";")
-    type_file = ".avi"
+    corresponding_csv = args.corresponding_csv or glob.glob("corresp*.csv")[0]
+    corresponding_dir = pd.read_csv(corresponding_csv, sep=None, engine="python")
     area2patch_g = []  # ['bel18']
     query_condition_g = []  # [(
     #   "(file_path.str.contains('\\(2\\)') & (date_acquisition < '2024-06-20')) | "
@@ -296,11 +484,22 @@ if __name__ == "__main__":
     correct_date_g = []  # ['2024-10-25 10:05:11']
 
     main(
-        files_path,
+        args.files_path,
         corresponding_dir,
-        type_file,
+        args.type_file,
         area2patch_g,
         query_condition_g,
         last_image_issue_g,
         correct_date_g,
+        use_cache=not args.no_cache,
+        placement=args.placement,
+        output_dir=args.output_dir,
+        streaming=args.streaming,
+        pipelined=args.pipelined,
+        stage_workers=parse_stage_workers(args.stage_workers),
+        timelapse_tolerance=args.timelapse_tolerance,
+        resume=args.resume,
+        verify=args.verify,
+        manifest_format=args.manifest_format,
+        date_rules=args.date_rules,
     )
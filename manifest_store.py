@@ -0,0 +1,334 @@
+import glob
+import os
+import shutil
+from urllib.parse import unquote
+
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.dataset as ds
+except ImportError:
+    pyarrow = None
+
+MANIFEST_FORMATS = ("parquet", "csv")
+
+# Dossier du jeu de données Parquet, dans CLEANED/.tmp
+MANIFEST_DIRNAME = "manifest"
+
+# Colonnes de partition de chaque manifeste
+PARTITIONS = {
+    "structure": ["year", "station"],
+    "timelapse": ["year", "station"],
+    "camera": ["year", "station"],
+    "dropped": ["station"],
+    "hashes": ["year", "station"],
+}
+
+# Manifestes qui existaient déjà en CSV ; les autres ne sont écrits qu'en Parquet
+CSV_KINDS = ("timelapse", "camera", "dropped")
+
+# Valeur de partition des fichiers sans date ou sans station
+UNKNOWN = "unknown"
+
+
+def resolve_format(manifest_format=None):
+    """
+    Return the manifest format to use.
+
+    Parameters
+    ----------
+    manifest_format : str, optional
+        'parquet' or 'csv' (default: None, 'parquet' if pyarrow is installed,
+        'csv' otherwise).
+
+    Returns
+    -------
+    str
+        'parquet' or 'csv'; 'csv' with a warning if 'parquet' is requested
+        without pyarrow.
+
+    Raises
+    ------
+    ValueError
+        If the format is not recognized.
+    """
+    if manifest_format is None:
+        return "parquet" if pyarrow is not None else "csv"
+    if manifest_format not in MANIFEST_FORMATS:
+        raise ValueError(
+            f"Format de manifeste non reconnu: {manifest_format}. Formats possibles: {', '.join(MANIFEST_FORMATS)}"
+        )
+    if manifest_format == "parquet" and pyarrow is None:
+        print("Warning: pyarrow n'est pas installé, les manifestes sont écrits en CSV")
+        return "csv"
+    return manifest_format
+
+
+def get_manifest_dir(cleaned_dir):
+    """Return the Parquet manifest dataset of a cleaned arborescence."""
+    return os.path.join(cleaned_dir, ".tmp", MANIFEST_DIRNAME)
+
+
+def partitions_from_paths(file_paths, cleaned_dir):
+    """
+    Return the year and station of files placed in a cleaned arborescence.
+
+    Parameters
+    ----------
+    file_paths : pandas.Series
+        Paths of files under cleaned_dir (<year>/<station>/<name> or
+        timelapse/<station>/<name>).
+    cleaned_dir : str
+        Path to the cleaned arborescence.
+
+    Returns
+    -------
+    pandas.DataFrame
+        'year' and 'station' columns aligned with file_paths, 'unknown' for
+        the files outside of the arborescence and the year of timelapses.
+    """
+    root = os.path.abspath(cleaned_dir)
+    years, stations = [], []
+    for file_path in file_paths:
+        parts = os.path.relpath(os.path.abspath(file_path), root).split(os.sep)
+        if len(parts) < 3 or parts[0] == os.pardir:
+            years.append(UNKNOWN)
+            stations.append(UNKNOWN)
+        else:
+            years.append(parts[0] if parts[0].isdigit() else UNKNOWN)
+            stations.append(parts[1])
+    return pd.DataFrame({"year": years, "station": stations}, index=file_paths.index)
+
+
+def add_partition_columns(df, partitions=("year", "station"), station=None):
+    """
+    Type the columns of a manifest and add its 'year' and 'station' partitions.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Manifest rows; existing 'year' and 'station' columns are kept.
+    partitions : sequence of str, optional
+        Partition columns to add (default: ("year", "station")).
+    station : str or pandas.Series, optional
+        Station of the rows (a value or a Series aligned with df), used when
+        df has no 'new_dir' column (default: None).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Copy of df with 'date_acquisition' as datetime64 and string partition
+        columns ('unknown' when the date or the station is missing).
+    """
+    df = df.copy()
+    if "date_acquisition" in df.columns:
+        df["date_acquisition"] = pd.to_datetime(df["date_acquisition"], errors="coerce")
+    if "year" in partitions and "year" not in df.columns:
+        if "date_acquisition" in df.columns:
+            years = df["date_acquisition"].dt.year
+            df["year"] = years.astype("Int64").astype(str).where(years.notna(), UNKNOWN)
+        else:
+            df["year"] = UNKNOWN
+    if "station" in partitions and "station" not in df.columns:
+        if "new_dir" in df.columns:
+            df["station"] = df["new_dir"]
+        elif station is not None:
+            df["station"] = station
+        else:
+            df["station"] = UNKNOWN
+        df["station"] = (
+            df["station"].astype(object).where(df["station"].notna(), UNKNOWN)
+        )
+    return df
+
+
+class ManifestStore:
+    """
+    Write the manifests of a run, as a partitioned Parquet dataset or as CSV files.
+
+    Parameters
+    ----------
+    tmp_dir : str
+        The .tmp directory of the cleaned arborescence.
+    id_today : str
+        Identifier of the run, used in the name of the dropped files CSV.
+    manifest_format : str, optional
+        'parquet' or 'csv' (default: None, see resolve_format).
+
+    Notes
+    -----
+    Parquet: each manifest is a dataset .tmp/manifest/<kind>/, partitioned
+    as in PARTITIONS (e.g. camera/year=2024/station=para1480/*.parquet) with
+    typed columns (dates stay datetimes). The first time the run writes a
+    station to a manifest, the partitions of that station (all years) left
+    by previous runs are removed; later writes add files to it, so stations
+    can be written one at a time. The stations the run does not write keep
+    the manifests of the previous runs.
+    CSV: the files of the previous versions, .tmp/structure_timelapse.csv,
+    .tmp/structure_camera_<station>.csv and .tmp/dropped_<id>.csv; the
+    manifests not in CSV_KINDS are not written.
+    """
+
+    def __init__(self, tmp_dir, id_today, manifest_format=None):
+        self.tmp_dir = tmp_dir
+        self.format = resolve_format(manifest_format)
+        self.root = os.path.join(tmp_dir, MANIFEST_DIRNAME)
+        self.csv_paths = {
+            "timelapse": os.path.join(tmp_dir, "structure_timelapse.csv"),
+            "dropped": os.path.join(tmp_dir, f"dropped_{id_today}.csv"),
+        }
+        self.written = set()
+        # Stations déjà écrites par cette exécution, par manifeste
+        self.replaced = {}
+
+    def write(self, kind, data, station=None):
+        """
+        Add rows to a manifest.
+
+        Parameters
+        ----------
+        kind : str
+            One of PARTITIONS: 'structure', 'timelapse', 'camera', 'dropped'
+            or 'hashes'.
+        data : pandas.DataFrame or pandas.Series
+            Rows of the manifest (a Series of file paths for 'dropped').
+        station : str or pandas.Series, optional
+            Station of the rows without 'new_dir', a value or a Series aligned
+            with data (default: None). Only used by the Parquet format.
+        """
+        first = kind not in self.written
+        self.written.add(kind)
+        if self.format == "parquet":
+            self._write_parquet(kind, data, station, first)
+        elif kind in CSV_KINDS:
+            self._write_csv(kind, data, first)
+
+    def _write_parquet(self, kind, data, station, first):
+        path = os.path.join(self.root, kind)
+        frame = data.to_frame() if isinstance(data, pd.Series) else data
+        if len(frame) == 0:
+            return
+        frame = add_partition_columns(frame, PARTITIONS[kind], station)
+        if "station" in PARTITIONS[kind]:
+            replaced = self.replaced.setdefault(kind, set())
+            stations = set(frame["station"].unique()) - replaced
+            _remove_station_partitions(path, stations)
+            replaced |= stations
+        elif first and os.path.isdir(path):
+            shutil.rmtree(path)
+        frame.to_parquet(path, partition_cols=PARTITIONS[kind], index=False)
+
+    def _write_csv(self, kind, data, first):
+        if kind == "camera":
+            for new_dir, group in data.groupby("new_dir", sort=False):
+                group.to_csv(
+                    os.path.join(self.tmp_dir, f"structure_camera_{new_dir}.csv")
+                )
+        elif kind in self.csv_paths:
+            data.to_csv(self.csv_paths[kind], mode="w" if first else "a", header=first)
+        else:
+            raise ValueError(f"Pas de manifeste CSV '{kind}'")
+
+
+def _remove_station_partitions(path, stations):
+    """Remove the partition folders of some stations from a Parquet dataset."""
+    if not stations or not os.path.isdir(path):
+        return
+    for root, dirs, _ in os.walk(path):
+        for name in list(dirs):
+            # Valeurs de partition encodées comme des URI (espaces, '/'...)
+            if name.startswith("station=") and unquote(name[8:]) in stations:
+                shutil.rmtree(os.path.join(root, name))
+                dirs.remove(name)
+    # Dossiers d'années vidés
+    for root, dirs, files in os.walk(path, topdown=False):
+        if root != path and not os.listdir(root):
+            os.rmdir(root)
+
+
+def _read_csv_manifest(cleaned_dir, kind):
+    tmp_dir = os.path.join(cleaned_dir, ".tmp")
+    if kind == "timelapse":
+        paths = [os.path.join(tmp_dir, "structure_timelapse.csv")]
+    elif kind == "camera":
+        paths = sorted(glob.glob(os.path.join(tmp_dir, "structure_camera_*.csv")))
+    elif kind == "dropped":
+        # Le plus récent : les noms contiennent la date de l'exécution
+        paths = sorted(glob.glob(os.path.join(tmp_dir, "dropped_*.csv")))[-1:]
+    elif kind in PARTITIONS:
+        # Manifeste écrit seulement en Parquet, absent ici
+        paths = []
+    else:
+        raise ValueError(f"Manifeste inconnu '{kind}'")
+    frames = [pd.read_csv(p, index_col=0) for p in paths if os.path.exists(p)]
+    if not frames:
+        return pd.DataFrame()
+    return add_partition_columns(pd.concat(frames))
+
+
+def read_manifest(cleaned_dir, kind, columns=None, stations=None, years=None):
+    """
+    Load a manifest of a cleaned arborescence.
+
+    Parameters
+    ----------
+    cleaned_dir : str
+        Path to the cleaned arborescence.
+    kind : str
+        One of PARTITIONS: 'structure', 'timelapse', 'camera', 'dropped' or
+        'hashes'.
+    columns : list of str, optional
+        Columns to load (default: None, all of them).
+    stations : list of str, optional
+        Only load these stations (default: None, all of them).
+    years : list of int, optional
+        Only load these years (default: None, all of them).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Manifest rows, with 'year' and 'station' columns.
+
+    Notes
+    -----
+    With the Parquet dataset, only the requested columns are read and the
+    partitions of the other stations and years are not opened at all.
+    Without it (CSV format, or pyarrow missing), the CSV files of the
+    previous versions are parsed and filtered; the manifests not in
+    CSV_KINDS are then empty.
+    """
+    path = os.path.join(get_manifest_dir(cleaned_dir), kind)
+    if pyarrow is not None and os.path.isdir(path):
+        partitioning = ds.partitioning(
+            pyarrow.schema([(name, pyarrow.string()) for name in PARTITIONS[kind]]),
+            flavor="hive",
+        )
+        dataset = ds.dataset(path, format="parquet", partitioning=partitioning)
+        # Une colonne vide dans une écriture est typée null : unifier les schémas des fichiers
+        schema = pyarrow.unify_schemas(
+            [fragment.physical_schema for fragment in dataset.get_fragments()]
+            + [partitioning.schema],
+            promote_options="permissive",
+        )
+        dataset = ds.dataset(
+            path, format="parquet", partitioning=partitioning, schema=schema
+        )
+        condition = None
+        if stations is not None and "station" in PARTITIONS[kind]:
+            condition = ds.field("station").isin(list(stations))
+        if years is not None and "year" in PARTITIONS[kind]:
+            year_condition = ds.field("year").isin([str(year) for year in years])
+            condition = (
+                year_condition if condition is None else condition & year_condition
+            )
+        return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+    df = _read_csv_manifest(cleaned_dir, kind)
+    if len(df) == 0:
+        return df
+    if stations is not None:
+        df = df[df["station"].isin(list(stations))]
+    if years is not None:
+        df = df[df["year"].isin([str(year) for year in years])]
+    return df[columns] if columns is not None else df
@@ -0,0 +1,246 @@
+import argparse
+import os
+import sqlite3
+from datetime import datetime
+
+CACHE_FILENAME = "metadata_cache.sqlite"
+
+# Colonnes mises en cache en plus de la clé (path, size, mtime_ns, inode)
+CACHED_COLUMNS = [
+    "date_acquisition",
+    "new_dir",
+    "resolver_key",
+    "hash_md5",
+    "hash_sha256",
+    "hash_pixels",
+]
+
+
+def stat_key(file_path, stat_result=None):
+    """
+    Build the cache validity key of a file.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file.
+    stat_result : os.stat_result, optional
+        Already available stat result (e.g. from os.DirEntry.stat()).
+
+    Returns
+    -------
+    tuple of (int, int, int)
+        (size, mtime_ns, inode). The inode is 0 on filesystems that do not
+        provide one.
+    """
+    st = stat_result if stat_result is not None else os.stat(file_path)
+    return st.st_size, st.st_mtime_ns, getattr(st, "st_ino", 0) or 0
+
+
+class MetadataCache:
+    """
+    Persistent on-disk cache of per-file metadata, stored in SQLite.
+
+    Parameters
+    ----------
+    db_path : str
+        Path of the SQLite database (created if missing).
+
+    Notes
+    -----
+    Entries are keyed by absolute path and only considered valid while the
+    file size, mtime_ns and inode are unchanged, so re-runs only extract
+    metadata and hashes for new or modified files. Values stored with a
+    different resolver key (correspondence table changed) are ignored for
+    'new_dir' only.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                date_acquisition TEXT,
+                new_dir TEXT,
+                resolver_key TEXT,
+                hash_md5 TEXT,
+                hash_sha256 TEXT,
+                hash_pixels TEXT
+            )
+            """)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def get_many(self, file_paths, stats=None):
+        """
+        Fetch the valid cache entries of a list of files.
+
+        Parameters
+        ----------
+        file_paths : list of str
+            Files to look up.
+        stats : dict, optional
+            Mapping path -> (size, mtime_ns, inode) already computed by the caller.
+
+        Returns
+        -------
+        dict
+            Mapping path -> dict of cached values, only for files whose size,
+            mtime_ns and inode match the cached entry. 'date_acquisition' is
+            returned as a datetime (or None).
+        """
+        hits = {}
+        keys = {}
+        for path in file_paths:
+            abs_path = os.path.abspath(path)
+            try:
+                keys[abs_path] = (
+                    stats[path]
+                    if stats is not None and path in stats
+                    else stat_key(path)
+                )
+            except OSError:
+                continue
+
+        abs_paths = list(keys)
+        columns = ", ".join(["path", "size", "mtime_ns", "inode"] + CACHED_COLUMNS)
+        # SQLite limite le nombre de paramètres par requête
+        for i in range(0, len(abs_paths), 900):
+            chunk = abs_paths[i : i + 900]
+            rows = self.conn.execute(
+                f"SELECT {columns} FROM files WHERE path IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            for row in rows:
+                path, size, mtime_ns, inode = row[:4]
+                if keys[path] != (size, mtime_ns, inode):
+                    continue
+                entry = dict(zip(CACHED_COLUMNS, row[4:]))
+                if entry["date_acquisition"] is not None:
+                    entry["date_acquisition"] = datetime.fromisoformat(
+                        entry["date_acquisition"]
+                    )
+                hits[path] = entry
+        return {
+            p: hits[os.path.abspath(p)]
+            for p in file_paths
+            if os.path.abspath(p) in hits
+        }
+
+    def put_many(self, records):
+        """
+        Insert or refresh cache entries.
+
+        Parameters
+        ----------
+        records : iterable of dict
+            Each record has a 'file_path' key and any of the cached columns.
+            Columns missing from a record keep their previous cached value as long
+            as the file is unchanged.
+        """
+        rows = []
+        for record in records:
+            path = record["file_path"]
+            try:
+                size, mtime_ns, inode = stat_key(path)
+            except OSError:
+                continue
+            values = []
+            for col in CACHED_COLUMNS:
+                value = record.get(col)
+                if col == "date_acquisition" and value is not None:
+                    try:
+                        value = value.isoformat()
+                    except AttributeError:
+                        value = str(value)
+                    if value == "NaT":
+                        value = None
+                values.append(value)
+            rows.append([os.path.abspath(path), size, mtime_ns, inode] + values)
+
+        updates = ", ".join(
+            f"{col} = COALESCE(excluded.{col}, CASE WHEN files.size = excluded.size "
+            f"AND files.mtime_ns = excluded.mtime_ns AND files.inode = excluded.inode "
+            f"THEN files.{col} END)"
+            for col in CACHED_COLUMNS
+        )
+        self.conn.executemany(
+            f"""
+            INSERT INTO files (path, size, mtime_ns, inode, {', '.join(CACHED_COLUMNS)})
+            VALUES ({', '.join('?' * (4 + len(CACHED_COLUMNS)))})
+            ON CONFLICT(path) DO UPDATE SET
+                {updates},
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns,
+                inode = excluded.inode
+            """,
+            rows,
+        )
+        self.conn.commit()
+
+    def prune(self):
+        """
+        Remove the entries of files that no longer exist on disk.
+
+        Returns
+        -------
+        int
+            Number of removed entries.
+        """
+        missing = [
+            (path,)
+            for (path,) in self.conn.execute("SELECT path FROM files")
+            if not os.path.exists(path)
+        ]
+        self.conn.executemany("DELETE FROM files WHERE path = ?", missing)
+        self.conn.commit()
+        return len(missing)
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+
+def get_cache_path(cleaned_dir):
+    """
+    Return the default location of the metadata cache for a cleaned directory.
+
+    Parameters
+    ----------
+    cleaned_dir : str
+        Path to the cleaned directory.
+
+    Returns
+    -------
+    str
+        Path to the SQLite cache inside the '.tmp' folder.
+    """
+    return os.path.join(cleaned_dir, ".tmp", CACHE_FILENAME)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the metadata cache.")
+    parser.add_argument("command", choices=["prune", "stats"])
+    parser.add_argument("db_path", help="Path to metadata_cache.sqlite")
+    args = parser.parse_args()
+
+    with MetadataCache(args.db_path) as cache:
+        if args.command == "prune":
+            removed = cache.prune()
+            print(f"{removed} entrées supprimées, {cache.count()} restantes")
+        else:
+            print(f"{cache.count()} entrées dans {args.db_path}")
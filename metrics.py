@@ -0,0 +1,513 @@
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Dossier où écrire un profil cProfile par étape (désactivé si absent)
+PROFILE_ENV = "CAMTRAP_PROFILE"
+
+METRICS_FILENAME = "run_metrics_{}.json"
+
+# Mesures en cours, alimentées par report_progress depuis les modules de traitement
+_active = None
+
+
+def report_progress(n_files=1, n_bytes=0):
+    """
+    Count files (and bytes) processed by the current stage of the active run.
+
+    Parameters
+    ----------
+    n_files : int, optional
+        Number of files processed (default: 1).
+    n_bytes : int, optional
+        Number of bytes processed (default: 0).
+
+    Notes
+    -----
+    Does nothing when no RunMetrics is active, so processing functions can
+    call it unconditionally. Safe to call from several threads.
+    """
+    metrics = _active
+    if metrics is not None:
+        metrics.advance(n_files, n_bytes)
+
+
+def expect_files(n_files):
+    """Add n_files to the number of files the current stage will process (ETA)."""
+    metrics = _active
+    if metrics is not None:
+        metrics.expect(n_files)
+
+
+def report_sub_stages(stats):
+    """
+    Attach the activity of the sub-stages of a run to the current stage.
+
+    Parameters
+    ----------
+    stats : dict
+        Mapping sub-stage name -> {'n_workers', 'n_items', 'busy',
+        'utilization'}, as returned by pipeline.StagedExecutor.stage_stats or
+        StageTimer.stage_stats.
+
+    Notes
+    -----
+    Does nothing when no RunMetrics is active.
+    """
+    metrics = _active
+    if metrics is not None:
+        metrics.annotate(
+            sub_stages={
+                name: dict(
+                    s, busy=round(s["busy"], 3), utilization=round(s["utilization"], 3)
+                )
+                for name, s in stats.items()
+            }
+        )
+
+
+def map_measured(func, items):
+    """
+    Apply func to items and measure the CPU time and I/O it used.
+
+    Parameters
+    ----------
+    func : callable
+        Function applied to each item.
+    items : list
+        Items to process.
+
+    Returns
+    -------
+    tuple of (list, dict)
+        Results of func, and the usage of the process while computing them:
+        {'pid', 'cpu_s', 'io_read_bytes', 'io_write_bytes'}.
+
+    Notes
+    -----
+    Meant to run in a worker process, whose CPU time and I/O the parent
+    cannot read: the parent adds the returned usage to its run metrics with
+    report_worker_usage.
+    """
+    start = _process_usage()
+    results = [func(item) for item in items]
+    end = _process_usage()
+    return results, {
+        "pid": os.getpid(),
+        "cpu_s": end[0] - start[0],
+        "io_read_bytes": end[1] - start[1] if end[1] is not None else 0,
+        "io_write_bytes": end[2] - start[2] if end[2] is not None else 0,
+    }
+
+
+def report_worker_usage(usage):
+    """
+    Add the usage of a worker process to the current stage of the active run.
+
+    Parameters
+    ----------
+    usage : dict
+        Usage returned by map_measured. It is ignored when it was measured in
+        this process (e.g. a pool running its tasks in the caller), whose
+        usage is already counted.
+    """
+    metrics = _active
+    if metrics is not None and usage["pid"] != os.getpid():
+        metrics.add_worker_usage(usage)
+
+
+def format_sub_stages(stats):
+    """Summary of sub-stages, e.g. 'extract 12.0 s (80%), place 3.1 s (20%)'."""
+    return ", ".join(
+        f"{name} {s['busy']:.1f} s ({s['utilization']:.0%})"
+        for name, s in stats.items()
+    )
+
+
+class StageTimer:
+    """
+    Busy time of the sub-stages of a sequential run.
+
+    Notes
+    -----
+    stage_stats() has the format of pipeline.StagedExecutor.stage_stats, so
+    that the streaming and pipelined runs record the same sub-stages. The
+    utilization of a sub-stage is its busy time over the time elapsed since
+    the timer was created.
+    """
+
+    def __init__(self):
+        self.busy = {}
+        self.n_items = {}
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def measure(self, name):
+        """Count the time spent in the block as busy time of sub-stage name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.busy[name] = self.busy.get(name, 0.0) + time.perf_counter() - start
+                self.n_items[name] = self.n_items.get(name, 0) + 1
+
+    def stage_stats(self):
+        """
+        Return the activity of each sub-stage.
+
+        Returns
+        -------
+        dict
+            Mapping name -> {'n_workers' (1), 'n_items', 'busy' (seconds),
+            'utilization' (busy time over elapsed time)}.
+        """
+        elapsed = time.perf_counter() - self.started
+        with self.lock:
+            return {
+                name: {
+                    "n_workers": 1,
+                    "n_items": self.n_items[name],
+                    "busy": busy,
+                    "utilization": busy / elapsed if elapsed > 0 else 0.0,
+                }
+                for name, busy in self.busy.items()
+            }
+
+
+def _read_proc_io():
+    """Return (bytes read, bytes written) by this process, or (None, None)."""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":") for line in f if ":" in line)
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _cpu_times():
+    """Return CPU seconds used by this process and by its finished children."""
+    if resource is None:
+        return time.process_time(), 0.0
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (
+        own.ru_utime + own.ru_stime,
+        children.ru_utime + children.ru_stime,
+    )
+
+
+def _process_usage():
+    """Return (CPU seconds, bytes read, bytes written) of this process so far."""
+    own_cpu, children_cpu = _cpu_times()
+    io_read, io_write = _read_proc_io()
+    return own_cpu + children_cpu, io_read, io_write
+
+
+def _peak_rss_mb():
+    """Return the peak resident memory (MB) of this process and of its children."""
+    if resource is None:
+        return None, None
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    unit = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(own / unit, 1), round(children / unit, 1)
+
+
+def format_duration(seconds):
+    """Format a duration in seconds as H:MM:SS."""
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class RunMetrics:
+    """
+    Wall time, CPU time, I/O and memory of each stage of a run.
+
+    Parameters
+    ----------
+    run_id : str
+        Identifier of the run, used in the metrics and profile file names.
+    profile_dir : str, optional
+        Directory where a cProfile dump of each stage is written (default:
+        None, the CAMTRAP_PROFILE environment variable, no profiling if unset).
+
+    Notes
+    -----
+    One stage runs at a time: start() ends the previous stage if needed.
+    For each stage are recorded:
+    - 'wall_s' and 'cpu_s': CPU time of the process, plus that of its worker
+      processes: the larger of the time they reported (see
+      report_worker_usage) and the time of the child processes that ended
+      during the stage (a pool shut down during the stage appears in both;
+      commands such as ffprobe only in the latter),
+    - 'cpu_utilization': cpu_s / (wall_s * number of CPUs), low for stages
+      waiting on the disks,
+    - 'files' and 'bytes': counted with report_progress by the extraction,
+      duplicate check and placement functions (None when the stage does not
+      report progress; summed over those functions in a streaming or
+      pipelined run),
+    - 'io_read_bytes' and 'io_write_bytes': bytes read and written by the
+      process (/proc/self/io, None where unavailable) and by the worker
+      processes that reported their usage,
+    - 'sub_stages': for the streaming and pipelined runs, which are a single
+      stage, the busy time, number of items (stations), workers and worker
+      utilization of each of their sub-stages (see report_sub_stages).
+    The peak resident memory ('peak_rss_mb', 'children_peak_rss_mb') can only
+    be read as a high-water mark since the start of the process, so it is
+    recorded once for the whole run, not per stage. Profiles only cover the
+    main thread; 'start' and 'end' are epoch timestamps, so that a py-spy
+    recording of the whole run (py-spy record --pid) can be cut by stage.
+    """
+
+    def __init__(self, run_id, profile_dir=None):
+        self.run_id = run_id
+        self.profile_dir = profile_dir or os.environ.get(PROFILE_ENV) or None
+        self.stages = []
+        self.current = None
+        self.lock = threading.Lock()
+        self.profiler = None
+        self.started = time.time()
+
+    def activate(self):
+        """Make this run the one counting the files reported by report_progress."""
+        global _active
+        _active = self
+
+    def close(self, status="ok"):
+        """End the current stage and stop counting the reported files."""
+        global _active
+        self.stop(status)
+        if _active is self:
+            _active = None
+
+    def __enter__(self):
+        self.activate()
+        return self
+
+    def __exit__(self, *exc):
+        self.close("failed" if exc[0] is not None else "ok")
+
+    def start(self, name, total_files=None):
+        """
+        Start measuring a stage.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage, e.g. '1. Extracting metadata'.
+        total_files : int, optional
+            Number of files the stage will process, for the ETA (default: None).
+        """
+        self.stop("ok")
+        own_cpu, children_cpu = _cpu_times()
+        io_read, io_write = _read_proc_io()
+        with self.lock:
+            self.current = {
+                "name": name,
+                "start": time.time(),
+                "status": "running",
+                "total_files": total_files,
+                "files": 0,
+                "bytes": 0,
+                "_perf": time.perf_counter(),
+                "_cpu": (own_cpu, children_cpu),
+                "_io": (io_read, io_write),
+                "_reported": False,
+                "_workers": {"cpu_s": 0.0, "io_read_bytes": 0, "io_write_bytes": 0},
+            }
+        if self.profile_dir is not None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def expect(self, n_files):
+        """Add n_files to the number of files the current stage will process."""
+        with self.lock:
+            if self.current is not None:
+                self.current["total_files"] = (
+                    self.current["total_files"] or 0
+                ) + n_files
+
+    def annotate(self, **details):
+        """Add details to the record of the current stage."""
+        with self.lock:
+            if self.current is not None:
+                self.current.update(details)
+
+    def add_worker_usage(self, usage):
+        """Add the CPU time and I/O of a worker process to the current stage."""
+        with self.lock:
+            if self.current is not None:
+                workers = self.current["_workers"]
+                for key in workers:
+                    workers[key] += usage[key]
+
+    def advance(self, n_files=1, n_bytes=0):
+        """Count files and bytes processed by the current stage."""
+        with self.lock:
+            if self.current is not None:
+                self.current["files"] += n_files
+                self.current["bytes"] += n_bytes
+                self.current["_reported"] = True
+
+    def stop(self, status="ok"):
+        """
+        End the current stage, if any.
+
+        Parameters
+        ----------
+        status : str, optional
+            'ok' or 'failed' (default: "ok").
+
+        Returns
+        -------
+        dict or None
+            Metrics of the stage.
+        """
+        if self.current is None:
+            return None
+        if self.profiler is not None:
+            self.profiler.disable()
+        own_cpu, children_cpu = _cpu_times()
+        io_read, io_write = _read_proc_io()
+        with self.lock:
+            stage, self.current = self.current, None
+        wall = time.perf_counter() - stage.pop("_perf")
+        start_own, start_children = stage.pop("_cpu")
+        workers = stage.pop("_workers")
+        cpu = own_cpu - start_own + max(children_cpu - start_children, workers["cpu_s"])
+        start_read, start_write = stage.pop("_io")
+        if not stage.pop("_reported"):
+            stage["files"] = stage["bytes"] = None
+        stage.update(
+            status=status,
+            end=time.time(),
+            wall_s=round(wall, 3),
+            cpu_s=round(cpu, 3),
+            cpu_utilization=(
+                round(cpu / (wall * (os.cpu_count() or 1)), 3) if wall > 0 else None
+            ),
+            io_read_bytes=(
+                io_read - start_read + workers["io_read_bytes"]
+                if io_read is not None
+                else None
+            ),
+            io_write_bytes=(
+                io_write - start_write + workers["io_write_bytes"]
+                if io_write is not None
+                else None
+            ),
+        )
+        if self.profiler is not None:
+            self._dump_profile(stage)
+        self.stages.append(stage)
+        return stage
+
+    def _dump_profile(self, stage):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r"[^a-z0-9]+", "_", stage["name"].lower()).strip("_")
+        path = os.path.join(
+            self.profile_dir, f"{self.run_id}_{len(self.stages):02d}_{slug}.prof"
+        )
+        self.profiler.dump_stats(path)
+        self.profiler = None
+        stage["profile"] = path
+
+    def rate_text(self):
+        """
+        Live progress of the current stage.
+
+        e.g. '0:00:14, 1200/5000 files, 85.3 files/s, 41.2 MB/s, ETA 0:00:44'.
+        """
+        with self.lock:
+            stage = self.current
+            if stage is None:
+                return ""
+            elapsed = time.perf_counter() - stage["_perf"]
+            files, n_bytes = stage["files"], stage["bytes"]
+            total, reported = stage["total_files"], stage["_reported"]
+        parts = [format_duration(elapsed)]
+        if reported and elapsed > 0:
+            done = f"{files}/{total}" if total else f"{files}"
+            parts.append(f"{done} files, {files / elapsed:.1f} files/s")
+            if n_bytes:
+                parts.append(f"{n_bytes / elapsed / 1e6:.1f} MB/s")
+            if total and 0 < files < total:
+                parts.append(
+                    f"ETA {format_duration(elapsed * (total - files) / files)}"
+                )
+        return ", ".join(parts)
+
+    def stage_summary(self, stage):
+        """Short summary of a finished stage, e.g. '12.3 s, 240 files, 45.6 MB/s'."""
+        parts = [f"{stage['wall_s']:.1f} s"]
+        if stage["files"] is not None:
+            parts.append(f"{stage['files']} files")
+            if stage["bytes"] and stage["wall_s"] > 0:
+                parts.append(f"{stage['bytes'] / stage['wall_s'] / 1e6:.1f} MB/s")
+        return ", ".join(parts)
+
+    def summary(self):
+        """Table of the stages with their share of the total wall time."""
+        total = sum(stage["wall_s"] for stage in self.stages) or 1
+        width = max((len(stage["name"]) for stage in self.stages), default=0)
+        return "\n".join(
+            f"  {stage['name']:<{width}}  {stage['wall_s']:>9.1f} s  "
+            f"{100 * stage['wall_s'] / total:5.1f} %  cpu {stage['cpu_s']:.1f} s"
+            for stage in self.stages
+        )
+
+    def to_dict(self):
+        """Metrics of the run as a JSON-serializable dict."""
+        peak_rss, children_peak_rss = _peak_rss_mb()
+        return {
+            "run_id": self.run_id,
+            "pid": os.getpid(),
+            "cpu_count": os.cpu_count(),
+            "start": self.started,
+            "wall_s": round(time.time() - self.started, 3),
+            "peak_rss_mb": peak_rss,
+            "children_peak_rss_mb": children_peak_rss,
+            "stages": self.stages,
+        }
+
+    def finish(self, directory):
+        """
+        End the run, save its metrics in directory and print the time of each stage.
+
+        Returns
+        -------
+        str
+            Path of the metrics file.
+        """
+        self.close()
+        path = self.save(directory)
+        print(f"Durée des étapes:\n{self.summary()}")
+        print(f"Métriques: {path}")
+        return path
+
+    def save(self, directory):
+        """
+        Write the metrics to directory/run_metrics_<run_id>.json.
+
+        Returns
+        -------
+        str
+            Path of the written file.
+        """
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, METRICS_FILENAME.format(self.run_id))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        return path
@@ -0,0 +1,278 @@
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+from joblib import Parallel, delayed
+from PIL import Image
+
+from hashing import find_images
+
+# Taille de l'image réduite pour le dHash (9x8 -> 64 bits)
+HASH_SIZE = 8
+
+# Distance de Hamming maximale entre deux quasi-doublons
+DEFAULT_THRESHOLD = 4
+
+
+def dhash(file_path, hash_size=HASH_SIZE):
+    """
+    Calculate the difference hash (dHash) of an image.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the image.
+    hash_size : int, optional
+        Side of the hash grid; the hash has hash_size**2 bits (default: 8).
+
+    Returns
+    -------
+    int
+        The dHash as an unsigned integer.
+
+    Notes
+    -----
+    JPEGs are decoded with Pillow's draft mode, which lets libjpeg scale the
+    image down by up to 8x during decoding, so the full-resolution image is
+    never materialized. The hash compares the luminance of horizontally
+    adjacent pixels of a (hash_size + 1) x hash_size thumbnail; it survives
+    re-encoding, re-tagging and resizing.
+    """
+    with Image.open(file_path) as image:
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        small = image.convert("L").resize(
+            (hash_size + 1, hash_size), Image.Resampling.BILINEAR
+        )
+        pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big") >> (-bits.size % 8)
+
+
+def safe_dhash(file_path, hash_size=HASH_SIZE):
+    """
+    Calculate the dHash of an image, returning None if it cannot be decoded.
+    """
+    try:
+        return dhash(file_path, hash_size)
+    except Exception as e:
+        print(f"Erreur lors du calcul du dHash de {file_path}: {e}")
+        return None
+
+
+# Nombre maximal d'identifiants par case d'une bande : au-delà, la case est
+# saturée (hashs de faible entropie, ex: images noires) et ignorée
+DEFAULT_MAX_BUCKET = 256
+
+
+def hamming(a, b):
+    """Hamming distance between two integer hashes."""
+    return bin(a ^ b).count("1")
+
+
+def popcount(values):
+    """Number of set bits of each element of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    # numpy < 2.0 : table des bits par octet
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+class MultiIndexHamming:
+    """
+    Multi-index hashing structure for Hamming-radius searches.
+
+    Parameters
+    ----------
+    threshold : int
+        Maximum Hamming distance of the searches.
+    n_bits : int, optional
+        Number of bits of the hashes (default: 64).
+    max_bucket : int, optional
+        Maximum number of hashes per band bucket (default: 256).
+
+    Notes
+    -----
+    Hashes are split into threshold + 1 disjoint bands. By the pigeonhole
+    principle, two hashes within distance threshold share at least one band
+    exactly, so candidates are found by exact dictionary lookups on each band
+    and only those candidates are compared, with a vectorized popcount.
+
+    Low-entropy hashes (night or uniform frames) share the same band values
+    and would fill a few buckets, making each query scan most of the index.
+    A bucket holding max_bucket hashes is saturated: it is no longer filled
+    nor read, so queries stay bounded. A pair whose only common band falls in
+    a saturated bucket is then missed; saturated_lookups counts the lookups
+    that hit such a bucket.
+    """
+
+    def __init__(
+        self, threshold, n_bits=HASH_SIZE * HASH_SIZE, max_bucket=DEFAULT_MAX_BUCKET
+    ):
+        self.threshold = threshold
+        self.max_bucket = max_bucket
+        n_bands = threshold + 1
+        widths = [
+            n_bits // n_bands + (1 if i < n_bits % n_bands else 0)
+            for i in range(n_bands)
+        ]
+        self.bands = []
+        shift = 0
+        for width in widths:
+            self.bands.append((shift, (1 << width) - 1))
+            shift += width
+        self.tables = [defaultdict(list) for _ in self.bands]
+        self.hashes = np.zeros(1024, dtype=np.uint64)
+        self.size = 0
+        self.saturated_lookups = 0
+
+    def add(self, value):
+        """Add a hash and return its identifier."""
+        idx = self.size
+        if idx == len(self.hashes):
+            self.hashes = np.concatenate([self.hashes, np.zeros_like(self.hashes)])
+        self.hashes[idx] = value
+        self.size += 1
+        for (shift, mask), table in zip(self.bands, self.tables):
+            bucket = table[(value >> shift) & mask]
+            if len(bucket) < self.max_bucket:
+                bucket.append(idx)
+        return idx
+
+    def query(self, value):
+        """
+        Return the identifiers of the hashes within threshold of value and
+        their distances, as two numpy arrays.
+        """
+        candidates = set()
+        for (shift, mask), table in zip(self.bands, self.tables):
+            bucket = table.get((value >> shift) & mask, ())
+            if len(bucket) >= self.max_bucket:
+                self.saturated_lookups += 1
+                continue
+            candidates.update(bucket)
+        ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        distances = popcount(self.hashes[ids] ^ np.uint64(value))
+        within = distances <= self.threshold
+        return ids[within], distances[within]
+
+
+def find_near_duplicates(
+    file_paths, hashes, threshold=DEFAULT_THRESHOLD, max_bucket=DEFAULT_MAX_BUCKET
+):
+    """
+    Group images whose perceptual hashes are within a Hamming distance.
+
+    Parameters
+    ----------
+    file_paths : list of str
+        Image paths.
+    hashes : list of int or None
+        dHash of each image (None for images that could not be decoded).
+    threshold : int, optional
+        Maximum Hamming distance between an image and the first image of its
+        group (default: 4).
+    max_bucket : int, optional
+        Bucket size of the index, see MultiIndexHamming (default: 256).
+
+    Returns
+    -------
+    list of list of str
+        Groups of near-duplicate images, largest first. The first image of a
+        group is its leader, the others follow in alphabetical order.
+
+    Notes
+    -----
+    Images are taken in order: an image joins the group of the nearest
+    leader within threshold, or becomes a new leader. Every image is thus
+    within threshold of its leader and a group spans at most 2 * threshold
+    bits, whereas connected components would chain the slowly changing frames
+    of a static scene or of a night into a single group. Only leaders are
+    indexed. The groups are a report to review, no file is removed.
+    """
+    index = MultiIndexHamming(threshold, max_bucket=max_bucket)
+    groups = []
+    for i, value in enumerate(hashes):
+        if value is None:
+            continue
+        ids, distances = index.query(value)
+        if len(ids) > 0:
+            # Identifiants de l'index = numéros des groupes (seuls les leaders)
+            groups[ids[np.argmin(distances)]].append(file_paths[i])
+        else:
+            index.add(value)
+            groups.append([file_paths[i]])
+
+    if index.saturated_lookups > 0:
+        print(
+            f"Warning: {index.saturated_lookups} recherches sur des cases saturées "
+            f"(> {max_bucket} hashs), des quasi-doublons peuvent manquer"
+        )
+    return sorted(
+        ([g[0]] + sorted(g[1:]) for g in groups if len(g) > 1), key=len, reverse=True
+    )
+
+
+def write_near_duplicates_csv(groups, file_hashes, output_csv):
+    """
+    Write near-duplicate groups in the format of run_extract_duplicates.sh.
+
+    Parameters
+    ----------
+    groups : list of list of str
+        Groups returned by find_near_duplicates.
+    file_hashes : dict
+        Mapping path -> dHash.
+    output_csv : str
+        Path of the CSV to write (columns: Occurrences,Hash,Fichiers).
+    """
+    with open(output_csv, "w") as out:
+        out.write("Occurrences,Hash,Fichiers\n")
+        for group in groups:
+            out.write(
+                f"{len(group)},{file_hashes[group[0]]:016x},{' | '.join(group)}\n"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Find re-encoded or re-tagged copies of JPG images with a perceptual hash."
+    )
+    parser.add_argument("directory", help="Directory to scan")
+    parser.add_argument(
+        "output_csv", help="CSV to write (e.g. hashes_output_duplicates_dhash.csv)"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=int,
+        default=DEFAULT_THRESHOLD,
+        help="Maximum Hamming distance to the first image of a group (default: 4)",
+    )
+    parser.add_argument(
+        "--max-bucket",
+        type=int,
+        default=DEFAULT_MAX_BUCKET,
+        help="Maximum number of hashes per index bucket (default: 256)",
+    )
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: Directory '{args.directory}' not found.")
+        sys.exit(1)
+
+    start_time = time.time()
+    files = find_images(args.directory)
+    print(f"Calcul des dHash pour {len(files)} fichiers...")
+    hashes = Parallel(n_jobs=args.n_jobs, batch_size=256)(
+        delayed(safe_dhash)(f) for f in files
+    )
+    groups = find_near_duplicates(files, hashes, args.threshold, args.max_bucket)
+    write_near_duplicates_csv(groups, dict(zip(files, hashes)), args.output_csv)
+    print(
+        f"{len(groups)} groupes de quasi-doublons trouvés en "
+        f"{int(time.time() - start_time)} secondes. Résultats dans {args.output_csv}"
+    )
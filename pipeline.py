@@ -0,0 +1,541 @@
+import heapq
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from metadata_cache import MetadataCache, get_cache_path
+from metrics import format_sub_stages, report_sub_stages
+from placement import format_stats, merge_stats
+from timelapse import DEFAULT_TOLERANCE
+from streaming import (
+    DuplicateIndex,
+    ManifestWriter,
+    extract_station,
+    get_patches,
+    load_stations,
+    name_station,
+    place_station,
+    prepare_station,
+    report_station,
+)
+
+# Nombre de workers par défaut des étapes parallélisables
+DEFAULT_STAGE_WORKERS = {"extract": 2, "hash": 2, "place": 2}
+
+# Nombre d'éléments en attente entre deux étapes
+DEFAULT_QUEUE_SIZE = 2
+
+_DONE = object()
+
+
+class _Failed:
+    """Marker of an item whose processing failed in an earlier stage."""
+
+    def __init__(self, stage, error):
+        self.stage = stage
+        self.error = error
+
+
+class Stage:
+    """
+    One stage of a StagedExecutor.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage, used in the statistics and error messages.
+    func : callable
+        Function applied to each item, func(item) or func(item, context) if a
+        context is given; it returns the item passed to the next stage.
+    n_workers : int, optional
+        Number of threads of the stage (default: 1).
+    ordered : bool, optional
+        If True, items are processed one at a time in their input order; used
+        for barriers such as global decisions (default: False).
+    context : callable, optional
+        Factory of a context manager entered once by each worker thread, e.g.
+        a database connection that cannot be shared between threads; its value
+        is passed to func (default: None).
+    """
+
+    def __init__(self, name, func, n_workers=1, ordered=False, context=None):
+        if ordered and n_workers != 1:
+            raise ValueError(f"L'étape ordonnée {name} ne peut avoir qu'un worker")
+        self.name = name
+        self.func = func
+        self.n_workers = n_workers
+        self.ordered = ordered
+        self.context = context
+
+
+class StagedExecutor:
+    """
+    Run items through a chain of stages connected by bounded queues.
+
+    Parameters
+    ----------
+    stages : list of Stage
+        Stages in processing order.
+    queue_size : int, optional
+        Maximum number of items waiting in front of each stage (default: 2).
+    on_error : callable, optional
+        Called as on_error(seq, stage_name, error) when a stage fails on an
+        item (default: None, the error is printed).
+
+    Notes
+    -----
+    All stages run at the same time, so the disk reads of one item overlap
+    the hashing or the writes of the others. An item failing in a stage is
+    reported and skipped by the next stages; it still advances ordered stages.
+    The bounded queues keep the number of items in flight, and so the memory,
+    bounded: at most queue_size + n_workers items per stage.
+
+    An ordered stage keeps the items that arrive ahead of their turn. So that
+    these pending items stay bounded too, the items are fed through a window:
+    at most the capacity (queues and workers) of the stages up to the last
+    ordered stage are in flight before it, and a new item is only fed once an
+    item has left that stage. Simply not reading the input queue of the
+    ordered stage when its pending items are full could block the item it
+    waits for behind the others.
+    """
+
+    def __init__(self, stages, queue_size=DEFAULT_QUEUE_SIZE, on_error=None):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_error = on_error
+        self.busy = {stage.name: 0.0 for stage in stages}
+        self.n_items = {stage.name: 0 for stage in stages}
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        ordered = [k for k, stage in enumerate(stages) if stage.ordered]
+        # Fenêtre des éléments en cours jusqu'à la dernière étape ordonnée
+        self._last_ordered = ordered[-1] if ordered else None
+        self.window = (
+            sum(queue_size + stage.n_workers for stage in stages[: ordered[-1] + 1])
+            if ordered
+            else None
+        )
+        self._slots = threading.Semaphore(self.window) if ordered else None
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def _acquire_slot(self):
+        while not self._stop.is_set():
+            if self._slots.acquire(timeout=0.1):
+                return True
+        return False
+
+    def _feed(self, items, out_q):
+        for seq, item in enumerate(items):
+            if self._slots is not None and not self._acquire_slot():
+                return
+            if self._stop.is_set():
+                return
+            self._put(out_q, (seq, item))
+        for _ in range(self.stages[0].n_workers):
+            self._put(out_q, _DONE)
+
+    def _process(self, stage, context, message, out_q):
+        seq, item = message
+        if not isinstance(item, _Failed):
+            start = time.perf_counter()
+            try:
+                item = (
+                    stage.func(item)
+                    if stage.context is None
+                    else stage.func(item, context)
+                )
+            except Exception as e:
+                item = _Failed(stage.name, e)
+                if self.on_error is not None:
+                    self.on_error(seq, stage.name, e)
+                else:
+                    print(f"Error: {stage.name}: {e}")
+            with self._lock:
+                self.busy[stage.name] += time.perf_counter() - start
+                self.n_items[stage.name] += 1
+        self._put(out_q, (seq, item))
+
+    def _work(self, k, in_q, out_q, remaining):
+        stage = self.stages[k]
+        try:
+            with (
+                stage.context() if stage.context is not None else nullcontext()
+            ) as context:
+                # Éléments arrivés en avance, pour une étape ordonnée
+                pending = []
+                next_seq = 0
+                while True:
+                    message = self._get(in_q)
+                    if message is _DONE:
+                        break
+                    if not stage.ordered:
+                        self._process(stage, context, message, out_q)
+                        continue
+                    # Au plus self.window éléments en attente (voir _feed)
+                    heapq.heappush(pending, message)
+                    while pending and pending[0][0] == next_seq:
+                        self._process(stage, context, heapq.heappop(pending), out_q)
+                        next_seq += 1
+                        if k == self._last_ordered:
+                            self._slots.release()
+        finally:
+            with self._lock:
+                remaining[k] -= 1
+                last = remaining[k] == 0
+            if last:
+                n_next = self.stages[k + 1].n_workers if k + 1 < len(self.stages) else 1
+                for _ in range(n_next):
+                    self._put(out_q, _DONE)
+
+    def run(self, items):
+        """
+        Process items through all the stages.
+
+        Parameters
+        ----------
+        items : iterable
+            Items given to the first stage.
+
+        Yields
+        ------
+        object
+            Output of the last stage for each successful item, in completion
+            order (input order if the last stage is ordered).
+        """
+        start = time.perf_counter()
+        queues = [
+            queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)
+        ]
+        remaining = [stage.n_workers for stage in self.stages]
+        threads = [
+            threading.Thread(target=self._feed, args=(items, queues[0]), daemon=True)
+        ]
+        for k, stage in enumerate(self.stages):
+            for _ in range(stage.n_workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._work,
+                        args=(k, queues[k], queues[k + 1], remaining),
+                        daemon=True,
+                    )
+                )
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                message = self._get(queues[-1])
+                if message is _DONE:
+                    break
+                seq, item = message
+                if not isinstance(item, _Failed):
+                    yield item
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self.elapsed = time.perf_counter() - start
+
+    def stage_stats(self):
+        """
+        Return the activity of each stage.
+
+        Returns
+        -------
+        dict
+            Mapping stage name -> {'n_workers', 'n_items', 'busy' (seconds
+            spent in func, summed over workers), 'utilization' (busy time over
+            available worker time)}.
+        """
+        stats = {}
+        for stage in self.stages:
+            available = self.elapsed * stage.n_workers
+            stats[stage.name] = {
+                "n_workers": stage.n_workers,
+                "n_items": self.n_items[stage.name],
+                "busy": self.busy[stage.name],
+                "utilization": (
+                    self.busy[stage.name] / available if available > 0 else 0.0
+                ),
+            }
+        return stats
+
+
+def parse_stage_workers(value):
+    """
+    Parse a '--stage-workers' option such as 'extract=2,hash=2,place=4'.
+
+    Returns
+    -------
+    dict
+        DEFAULT_STAGE_WORKERS updated with the given values.
+
+    Raises
+    ------
+    ValueError
+        If a stage is unknown or a number of workers is not a positive integer.
+    """
+    workers = dict(DEFAULT_STAGE_WORKERS)
+    for part in filter(None, (value or "").split(",")):
+        name, _, number = part.partition("=")
+        name = name.strip()
+        if (
+            name not in DEFAULT_STAGE_WORKERS
+            or not number.strip().isdigit()
+            or int(number) < 1
+        ):
+            raise ValueError(
+                f"Nombre de workers invalide: {part}. Étapes possibles: {', '.join(DEFAULT_STAGE_WORKERS)}"
+            )
+        workers[name] = int(number)
+    return workers
+
+
+def _open_cache(cache_path):
+    return MetadataCache(cache_path) if cache_path is not None else nullcontext()
+
+
+@contextmanager
+def _open_duplicate_index(cache_path, file_stats):
+    with _open_cache(cache_path) as cache:
+        yield DuplicateIndex(cache=cache, file_stats=file_stats)
+
+
+def stage_cpus(n_threads):
+    """
+    Number of processes given to each thread of a CPU-bound stage.
+
+    Parameters
+    ----------
+    n_threads : int
+        Number of threads of the stage.
+
+    Returns
+    -------
+    int
+        The CPUs divided between the threads, at least 1.
+    """
+    return max(1, (os.cpu_count() or 1) // n_threads)
+
+
+def run_pipelined(
+    files_path,
+    corresponding_dir,
+    type_file,
+    area2patch_g,
+    query_condition_g,
+    last_image_issue_g,
+    correct_date_g,
+    cleaned_dir,
+    use_cache=True,
+    placement="copy",
+    manifest=None,
+    stage_workers=None,
+    queue_size=DEFAULT_QUEUE_SIZE,
+    timelapse_tolerance=DEFAULT_TOLERANCE,
+    journal=None,
+    manifest_format=None,
+    date_rules=None,
+):
+    """
+    Run the pipeline with metadata extraction, hashing and placement overlapping.
+
+    Parameters
+    ----------
+    files_path : str
+        Path to the directory of raw files.
+    corresponding_dir : pandas.DataFrame
+        Correspondence table of the stations.
+    type_file : str
+        File extension to process.
+    area2patch_g, query_condition_g, last_image_issue_g, correct_date_g : list
+        Date corrections to apply, one entry per area (see
+        date_correction.rules_from_patches).
+    cleaned_dir : str
+        Final destination of the cleaned arborescence.
+    use_cache : bool, optional
+        If False, neither read nor update the metadata cache (default: True).
+    placement : str, optional
+        One of placement.PLACEMENT_MODES (default: "copy").
+    manifest : pandas.DataFrame, optional
+        File manifest from discovery.discover_files (default: None, the tree
+        is walked).
+    stage_workers : dict, optional
+        Number of threads of the 'extract', 'hash' and 'place' stages
+        (default: DEFAULT_STAGE_WORKERS). Each 'extract' and 'hash' thread
+        uses a pool of cpu_count / threads processes (see stage_cpus), so that
+        the threads of a stage share the CPUs instead of each using them all.
+    queue_size : int, optional
+        Maximum number of stations waiting in front of each stage (default: 2).
+    timelapse_tolerance : int, optional
+        Maximum delay in seconds of a timelapse shot after its scheduled time
+        (default: timelapse.DEFAULT_TOLERANCE).
+    journal : journal.PlacementJournal, optional
+        Write-ahead journal of the placements, shared by the 'place' threads
+        (default: None).
+    manifest_format : str, optional
+        'parquet' or 'csv' (default: None, see manifest_store.resolve_format).
+    date_rules : str or pandas.DataFrame, optional
+        More date corrections, see date_correction.make_rules (default: None).
+
+    Returns
+    -------
+    dict
+        Merged placement statistics.
+
+    Raises
+    ------
+    RuntimeError
+        If stations failed (see streaming.ManifestWriter.check_failures).
+
+    Notes
+    -----
+    Stations flow through four stages running concurrently:
+    1. extract: metadata of the station (streaming.extract_station),
+    2. hash: output folders and duplicates within the station,
+    3. name: duplicates with the previous stations, date corrections, names,
+       timelapse split, sequence numbering and manifests,
+    4. place: placement of the files.
+    Only the 'name' stage is a barrier: it handles stations one at a time in
+    order, because the duplicate decision is global and the sequences are
+    numbered per station. While a station is placed, the next ones are
+    already being read and hashed, so disk and CPU are busy at the same time.
+    The 'name' stage only reads the files of its own station, which are not
+    placed yet: the kept files of the previous stations are compared through
+    their hashes (see streaming.DuplicateIndex), even while they are being
+    moved by the 'place' stage. The outputs are the same as run_streaming,
+    including .tmp/failed_stations_<id>.csv.
+    """
+    workers = dict(DEFAULT_STAGE_WORKERS, **(stage_workers or {}))
+    extract_processes = stage_cpus(workers["extract"])
+    hash_processes = stage_cpus(workers["hash"])
+    id_today = time.strftime("%Y%m%d%H%M%S")
+    tmp_dir = os.path.join(cleaned_dir, ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    stations, resolver, file_stats = load_stations(
+        files_path, corresponding_dir, type_file, cleaned_dir, manifest
+    )
+    patches = get_patches(
+        area2patch_g,
+        query_condition_g,
+        last_image_issue_g,
+        correct_date_g,
+        date_rules,
+    )
+    cache_path = get_cache_path(cleaned_dir) if use_cache else None
+    manifests = ManifestWriter(tmp_dir, id_today, manifest_format)
+
+    def extract(item, cache):
+        item["structure"] = extract_station(
+            item["paths"],
+            resolver,
+            type_file,
+            file_stats,
+            cache=cache,
+            offset=item["offset"],
+            progress=False,
+            n_workers=extract_processes,
+        )
+        return item
+
+    def hash_station(item, cache):
+        item["structure"], item["dropped"] = prepare_station(
+            item["structure"],
+            files_path,
+            cleaned_dir,
+            cache=cache,
+            n_jobs=hash_processes,
+        )
+        return item
+
+    def name(item, duplicates):
+        structure, dropped = duplicates.remove_seen(
+            item.pop("structure"), item.pop("dropped")
+        )
+        item["result"] = name_station(
+            structure,
+            dropped,
+            corresponding_dir,
+            type_file,
+            patches,
+            cleaned_dir,
+            timelapse_tolerance=timelapse_tolerance,
+        )
+        # Ajouter la station aux manifestes globaux
+        manifests.append(item["new_dir"], item["result"])
+        return item
+
+    def place(item):
+        place_station(item["result"], cleaned_dir, placement=placement, journal=journal)
+        return item
+
+    failures_lock = threading.Lock()
+
+    def on_error(seq, stage_name, error):
+        new_dir, paths = stations[seq]
+        with failures_lock:
+            manifests.add_failure(new_dir, len(paths), stage_name, error)
+
+    executor = StagedExecutor(
+        [
+            Stage(
+                "extract",
+                extract,
+                workers["extract"],
+                context=lambda: _open_cache(cache_path),
+            ),
+            Stage(
+                "hash",
+                hash_station,
+                workers["hash"],
+                context=lambda: _open_cache(cache_path),
+            ),
+            Stage(
+                "name",
+                name,
+                ordered=True,
+                context=lambda: _open_duplicate_index(cache_path, file_stats),
+            ),
+            Stage("place", place, workers["place"]),
+        ],
+        queue_size=queue_size,
+        on_error=on_error,
+    )
+
+    offsets = [0]
+    for _, paths in stations:
+        offsets.append(offsets[-1] + len(paths))
+    items = (
+        {"new_dir": new_dir, "paths": paths, "offset": offset}
+        for (new_dir, paths), offset in zip(stations, offsets)
+    )
+    placement_stats = []
+    for item in executor.run(items):
+        placement_stats.extend(item["result"]["placement"])
+        report_station(item["new_dir"], item["result"])
+
+    stage_stats = executor.stage_stats()
+    report_sub_stages(stage_stats)
+    print(f"Étapes: {format_sub_stages(stage_stats)}")
+    stats = merge_stats(*placement_stats)
+    print(f"Placement: {format_stats(stats)}")
+    manifests.check_failures()
+    return stats
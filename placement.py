@@ -0,0 +1,344 @@
+import errno
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import expect_files, report_progress
+
+# Modes de placement des fichiers dans l'arborescence CLEANED
+PLACEMENT_MODES = ("copy", "move", "hardlink", "reflink", "symlink")
+
+# ioctl Linux de clonage de fichier (btrfs, XFS, bcachefs...)
+FICLONE = 0x40049409
+
+# Suffixe des fichiers en cours d'écriture, renommés une fois complets
+PART_SUFFIX = ".part"
+
+# Modes qui écrivent les données des fichiers (à recopier après une interruption)
+COPY_MODES = ("copy", "reflink")
+
+# Taille des blocs lus et écrits par copy_file_hashed
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def reflink_file(src, dst):
+    """
+    Clone a file with copy-on-write, falling back to a regular copy.
+
+    Parameters
+    ----------
+    src : str
+        Source file path.
+    dst : str
+        Destination file path.
+
+    Returns
+    -------
+    bool
+        True if the file was cloned, False if it was copied.
+
+    Notes
+    -----
+    Uses the FICLONE ioctl, which shares the data blocks of both files until
+    one of them is modified. On filesystems or platforms without reflink
+    support (ext4, exFAT, NTFS, different devices...), the file is copied with
+    shutil.copy2.
+    """
+    try:
+        import fcntl
+
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except (ImportError, OSError):
+        if os.path.exists(dst):
+            os.remove(dst)
+        shutil.copy2(src, dst)
+        return False
+
+
+def place_file(src, dst, mode="copy"):
+    """
+    Place a file at its destination with the chosen strategy.
+
+    Parameters
+    ----------
+    src : str
+        Source file path.
+    dst : str
+        Destination file path (its directory must exist).
+    mode : str, optional
+        One of PLACEMENT_MODES (default: "copy"):
+        - 'copy': physical copy with metadata (shutil.copy2)
+        - 'move': rename on the same filesystem, copy + delete otherwise
+        - 'hardlink': new directory entry for the same data (same filesystem),
+          falls back to a copy across filesystems
+        - 'reflink': copy-on-write clone, falls back to a copy
+        - 'symlink': symbolic link to the source, relative to the directory
+          of dst
+
+    Raises
+    ------
+    ValueError
+        If the mode is not supported.
+
+    Notes
+    -----
+    On the same filesystem, 'move', 'hardlink' and 'reflink' are metadata-only
+    operations: no image data is read or written. 'hardlink' and 'symlink'
+    keep the RAW files in place, so the RAW tree must not be deleted (symlink)
+    or modified in place (hardlink) afterwards. Symbolic links are relative,
+    so they stay valid when RAW and CLEANED are moved or mounted together
+    elsewhere (e.g. another container mount point or the NAS).
+    """
+    if mode == "copy":
+        shutil.copy2(src, dst)
+    elif mode == "move":
+        shutil.move(src, dst)
+    elif mode == "hardlink":
+        try:
+            os.link(src, dst)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            shutil.copy2(src, dst)
+    elif mode == "reflink":
+        reflink_file(src, dst)
+    elif mode == "symlink":
+        # Lien relatif : valable quel que soit le point de montage commun
+        os.symlink(
+            os.path.relpath(
+                os.path.abspath(src), os.path.dirname(os.path.abspath(dst))
+            ),
+            dst,
+        )
+    else:
+        raise ValueError(
+            f"Mode de placement non reconnu: {mode}. Modes possibles: {', '.join(PLACEMENT_MODES)}"
+        )
+
+
+def copy_file_hashed(src, dst, chunk_size=COPY_CHUNK_SIZE):
+    """
+    Copy a file and compute the MD5 of its data in the same pass.
+
+    Parameters
+    ----------
+    src : str
+        Source file path.
+    dst : str
+        Destination file path.
+    chunk_size : int, optional
+        Size of the blocks read and written (default: 1 MiB).
+
+    Returns
+    -------
+    str
+        MD5 hex digest of the copied data.
+
+    Notes
+    -----
+    Metadata is copied like shutil.copy2. The destination is not fsync'd:
+    the placement journal flushes the data of the placed files in batches
+    (see journal.PlacementJournal).
+    """
+    md5 = hashlib.md5()
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        while True:
+            chunk = fsrc.read(chunk_size)
+            if not chunk:
+                break
+            md5.update(chunk)
+            fdst.write(chunk)
+    shutil.copystat(src, dst)
+    return md5.hexdigest()
+
+
+def place_file_atomic(src, dst, mode="copy", checksum=False):
+    """
+    Place a file under a temporary name, then rename it to its destination.
+
+    Parameters
+    ----------
+    src : str
+        Source file path.
+    dst : str
+        Destination file path (its directory must exist).
+    mode : str, optional
+        One of PLACEMENT_MODES (default: "copy").
+    checksum : bool, optional
+        If True, copies compute the MD5 of the data while copying
+        (copy_file_hashed) instead of using shutil.copy2 (default: False).
+
+    Returns
+    -------
+    str or None
+        MD5 hex digest of a checksummed copy, None otherwise.
+
+    Notes
+    -----
+    The file is written to dst + PART_SUFFIX and renamed with os.replace, so
+    an interrupted copy never leaves an incomplete file under the final name.
+    A leftover temporary file of a previous run is replaced.
+    """
+    tmp = dst + PART_SUFFIX
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    digest = None
+    if mode == "copy" and checksum:
+        digest = copy_file_hashed(src, tmp)
+    else:
+        place_file(src, tmp, mode)
+    os.replace(tmp, dst)
+    return digest
+
+
+def _place_chunk(pairs, mode, journal=None):
+    """
+    Place a chunk of (src, dst) pairs, skipping existing destinations.
+
+    Returns
+    -------
+    tuple of (int, int, int)
+        Number of placed files, number of skipped files and bytes placed.
+    """
+    n_placed = n_skipped = n_bytes = 0
+    for src, dst in pairs:
+        if os.path.lexists(dst):
+            if journal is not None and dst in journal.pending:
+                # Renommé avant l'interruption, mais pas encore journalisé
+                journal.done(src, dst, os.lstat(dst).st_size)
+            else:
+                print(f"File {dst} already exists")
+            n_skipped += 1
+            report_progress()
+            continue
+        size = os.path.getsize(src)
+        digest = place_file_atomic(
+            src, dst, mode, checksum=journal is not None and journal.checksum
+        )
+        if journal is not None:
+            journal.done(src, dst, size, digest)
+        n_placed += 1
+        n_bytes += size
+        report_progress(1, size)
+    return n_placed, n_skipped, n_bytes
+
+
+def place_files(
+    sources,
+    destinations,
+    mode="copy",
+    n_workers=8,
+    chunk_size=2000,
+    journal=None,
+):
+    """
+    Place many files with a thread pool, creating all target directories first.
+
+    Parameters
+    ----------
+    sources : list of str
+        Source file paths.
+    destinations : list of str
+        Destination file paths, aligned with sources.
+    mode : str, optional
+        One of PLACEMENT_MODES (default: "copy").
+    n_workers : int, optional
+        Number of threads; placement is I/O bound (default: 8).
+    chunk_size : int, optional
+        Number of (src, dst) pairs sent to a thread at once (default: 2000).
+    journal : journal.PlacementJournal, optional
+        Write-ahead journal: the placements are recorded before they start and
+        once complete, and the destinations it already records as complete
+        are skipped silently. Copies are hashed while copying if its
+        'checksum' attribute is set (default: None).
+
+    Returns
+    -------
+    dict
+        Throughput statistics: 'n_files', 'n_skipped', 'n_bytes', 'elapsed',
+        'files_per_s' and 'mb_per_s'.
+
+    Notes
+    -----
+    Target directories are created once from the unique parents of the
+    destinations. When several sources share a destination, only the first
+    one is placed and the others are reported as already existing, so threads
+    never race on the same file. Files are written under a temporary name and
+    renamed when complete (place_file_atomic).
+    """
+    start = time.perf_counter()
+    for directory in sorted({os.path.dirname(dst) for dst in destinations}):
+        os.makedirs(directory, exist_ok=True)
+
+    pairs = []
+    seen = set()
+    n_skipped = 0
+    for src, dst in zip(sources, destinations):
+        if dst in seen:
+            print(f"File {dst} already exists")
+            n_skipped += 1
+            continue
+        seen.add(dst)
+        if journal is not None and journal.is_done(dst) and os.path.lexists(dst):
+            # Déjà placé par une exécution précédente
+            n_skipped += 1
+            continue
+        pairs.append((src, dst))
+    if journal is not None:
+        journal.plan(pairs, mode)
+    expect_files(len(pairs))
+
+    # Des lots assez petits pour occuper tous les threads
+    chunk_size = max(1, min(chunk_size, -(-len(pairs) // n_workers)))
+    chunks = [pairs[i : i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    n_files = n_bytes = 0
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        for placed, skipped, size in executor.map(
+            _place_chunk, chunks, [mode] * len(chunks), [journal] * len(chunks)
+        ):
+            n_files += placed
+            n_skipped += skipped
+            n_bytes += size
+
+    elapsed = time.perf_counter() - start
+    return {
+        "n_files": n_files,
+        "n_skipped": n_skipped,
+        "n_bytes": n_bytes,
+        "elapsed": elapsed,
+        "files_per_s": n_files / elapsed if elapsed > 0 else 0.0,
+        "mb_per_s": n_bytes / 1e6 / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def merge_stats(*stats):
+    """
+    Combine the statistics of several place_files calls.
+
+    Returns
+    -------
+    dict
+        Same keys as place_files, with summed counts and elapsed times.
+    """
+    total = {"n_files": 0, "n_skipped": 0, "n_bytes": 0, "elapsed": 0.0}
+    for s in stats:
+        for key in total:
+            total[key] += s[key]
+    elapsed = total["elapsed"]
+    total["files_per_s"] = total["n_files"] / elapsed if elapsed > 0 else 0.0
+    total["mb_per_s"] = total["n_bytes"] / 1e6 / elapsed if elapsed > 0 else 0.0
+    return total
+
+
+def format_stats(stats):
+    """Human readable summary of placement statistics."""
+    return (
+        f"{stats['n_files']} fichiers placés ({stats['n_skipped']} ignorés), "
+        f"{stats['n_bytes'] / 1e6:.1f} Mo en {stats['elapsed']:.1f} s : "
+        f"{stats['files_per_s']:.0f} fichiers/s, {stats['mb_per_s']:.1f} Mo/s"
+    )
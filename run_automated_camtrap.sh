@@ -41,60 +41,107 @@ BASE_DATA_PATH=$(jq -r '.base_data_path' "$CONFIG_FILE")
 OUTPUT_BASE=$(jq -r '.output_base' "$CONFIG_FILE")
 DOCKER_IMAGE=$(jq -r '.docker_image' "$CONFIG_FILE")
 VIDEO_SUBFOLDER=$(jq -r '.video_subfolder' "$CONFIG_FILE")
+# copy, move, hardlink, reflink ou symlink (défaut: copy)
+PLACEMENT=$(jq -r '.placement // "copy"' "$CONFIG_FILE")
+# Traitement station par station (mémoire bornée par la plus grosse station)
+STREAMING=$(jq -r 'if .streaming then "True" else "False" end' "$CONFIG_FILE")
+# Lecture, hachage et placement des stations en parallèle
+PIPELINED=$(jq -r 'if .pipelined then "True" else "False" end' "$CONFIG_FILE")
+# Reprise des placements d'une exécution interrompue (journal CLEANED/.tmp)
+RESUME=$(jq -r 'if .resume then "True" else "False" end' "$CONFIG_FILE")
+# Relecture des fichiers placés et comparaison avec le hash calculé à la copie
+VERIFY=$(jq -r 'if .verify then "True" else "False" end' "$CONFIG_FILE")
+# Format des manifestes de CLEANED/.tmp (parquet ou csv)
+MANIFEST_FORMAT=$(jq -r '.manifest_format // "parquet"' "$CONFIG_FILE")
+# Table des règles de correction des dates (vide : aucune)
+DATE_RULES=$(jq -r '.date_rules // ""' "$CONFIG_FILE")
 
 log_info "Base data path: $BASE_DATA_PATH"
 log_info "Output base: $OUTPUT_BASE"
 log_info "Docker image: $DOCKER_IMAGE"
+log_info "Placement mode: $PLACEMENT"
+log_info "Streaming mode: $STREAMING"
+log_info "Pipelined mode: $PIPELINED"
+log_info "Resume: $RESUME"
+log_info "Verify: $VERIFY"
+log_info "Manifest format: $MANIFEST_FORMAT"
+log_info "Date rules: ${DATE_RULES:-none}"
 
 # Créer le dossier de sortie principal
 mkdir -p "$OUTPUT_BASE"
 
-# Fonction pour traiter un dossier avec un type de fichier spécifique
+# Fonction pour traiter un dossier avec tous ses types de fichiers
+# (l'arborescence n'est parcourue qu'une seule fois pour tous les types)
 process_folder() {
     local folder_name="$1"
     local input_path="$2"
     local csv_file="$3"
-    local file_type="$4"
+    local file_types="$4"
     local output_subfolder="$5"
-    
-    print_header "Processing $folder_name with $file_type files"
-    
-    # Déterminer le sous-dossier de sortie final
-    local final_output_subfolder="$output_subfolder"
-    if [[ "$file_type" == ".avi" ]]; then
-        final_output_subfolder="${output_subfolder}/${VIDEO_SUBFOLDER}"
-    fi
-    
+
+    print_header "Processing $folder_name with $file_types files"
+
     log_info "Input path: $input_path"
     log_info "CSV file: $csv_file"
-    log_info "File type: $file_type"
-    log_info "Output subfolder: $final_output_subfolder"
-    
+    log_info "File types: $file_types"
+
+    # Liste Python des (type de fichier, sous-dossier de sortie final)
+    local py_jobs=""
+    local final_output_dirs=""
+    for file_type in $file_types; do
+        local final_output_subfolder="$output_subfolder"
+        if [[ "$file_type" == ".avi" ]]; then
+            final_output_subfolder="${output_subfolder}/${VIDEO_SUBFOLDER}"
+        fi
+        log_info "Output subfolder for $file_type: $final_output_subfolder"
+        final_output_dirs="${final_output_dirs} '/data/CLEANED/$final_output_subfolder'"
+        py_jobs="${py_jobs}(\"$file_type\", \"/data/CLEANED/$final_output_subfolder\"),"
+    done
+
     # Créer un script Python temporaire pour ce traitement
-    cat > "/tmp/process_${folder_name}_${file_type//./}.py" << EOF
+    cat > "/tmp/process_${folder_name}.py" << EOF
 from main_process_images import main
+from discovery import discover_files
 import pandas as pd
 import sys
 import os
 
 try:
-    # Configuration pour $folder_name avec $file_type
+    # Configuration pour $folder_name avec $file_types
     # print("Loading CSV file: $csv_file")
     corresponding_dir = pd.read_csv("$csv_file", sep=None, engine='python')
     print(f"CSV columns: {corresponding_dir.columns.tolist()}")
     print(f"First few rows:")
     print(corresponding_dir.head())
-    
-    print("Starting main processing...")
-    main(
-        files_path="$input_path",
-        corresponding_dir=corresponding_dir,
-        type_file="$file_type",
-        area2patch_g=[],
-        query_condition_g=[],
-        last_image_issue_g=[],
-        correct_date_g=[]
+
+    jobs = [${py_jobs%,}]
+
+    # Un seul parcours de l'arborescence pour tous les types de fichiers
+    manifest = discover_files(
+        "$input_path", exclude_dirs=[output_dir for _, output_dir in jobs]
     )
+    print(f"{len(manifest)} files found: {manifest['extension'].value_counts().to_dict()}")
+
+    for file_type, output_dir in jobs:
+        print(f"Starting main processing for {file_type} files...")
+        main(
+            files_path="$input_path",
+            corresponding_dir=corresponding_dir,
+            type_file=file_type,
+            area2patch_g=[],
+            query_condition_g=[],
+            last_image_issue_g=[],
+            correct_date_g=[],
+            placement="$PLACEMENT",
+            streaming=$STREAMING,
+            pipelined=$PIPELINED,
+            resume=$RESUME,
+            verify=$VERIFY,
+            manifest_format="$MANIFEST_FORMAT",
+            date_rules="$DATE_RULES" or None,
+            output_dir=output_dir,
+            manifest=manifest,
+        )
     print("Processing completed successfully")
 except Exception as e:
     print(f"Error during processing: {e}")
@@ -107,56 +154,38 @@ EOF
     if docker run --rm \
         --entrypoint="" \
         -v "$BASE_DATA_PATH:/data" \
-        -v "/tmp/process_${folder_name}_${file_type//./}.py:/app/auto_process.py" \
+        -v "/tmp/process_${folder_name}.py:/app/auto_process.py" \
         "$DOCKER_IMAGE" \
         /bin/bash -c "
-            echo 'Running automated processing for $folder_name with $file_type files'
-            python3 /app/auto_process.py
-            
-            # Déplacer le résultat vers le bon sous-dossier
-            if [ -d '/data/RAW/CLEANED' ]; then
-                mkdir -p '/data/CLEANED/$final_output_subfolder'
-                cp -r /data/RAW/CLEANED/* '/data/CLEANED/$final_output_subfolder/'
-                rm -rf /data/RAW/CLEANED
-                chmod -R 777 '/data/CLEANED/$final_output_subfolder'
-                echo 'Results moved to /data/CLEANED/$final_output_subfolder'
-            else
-                echo 'Warning: CLEANED folder not found in expected location'
-                # Chercher le dossier CLEANED ailleurs
-                find /data -name 'CLEANED' -type d 2>/dev/null | while read cleaned_path; do
-                    if [ \"\$cleaned_path\" != \"/data/CLEANED\" ]; then
-                        echo 'Found CLEANED at: \$cleaned_path'
-                        mkdir -p '/data/CLEANED/$final_output_subfolder'
-                        cp -r \"\$cleaned_path\"/* '/data/CLEANED/$final_output_subfolder/'
-                        rm -rf \"\$cleaned_path\"
-                        chmod -R 777 '/data/CLEANED/$final_output_subfolder'
-                        echo 'Results moved from \$cleaned_path to /data/CLEANED/$final_output_subfolder'
-                    fi
-                done
-            fi
+            echo 'Running automated processing for $folder_name with $file_types files'
+            python3 /app/auto_process.py || exit 1
+
+            # Les résultats sont écrits directement dans les sous-dossiers finaux
+            for output_dir in $final_output_dirs; do
+                chmod -R 777 \"\$output_dir\"
+                echo \"Results written to \$output_dir\"
+            done
         "; then
-        log_info "Successfully completed processing $folder_name with $file_type files"
+        log_info "Successfully completed processing $folder_name with $file_types files"
     else
-        log_error "Failed processing $folder_name with $file_type files - continuing with next folder"
+        log_error "Failed processing $folder_name with $file_types files - continuing with next folder"
     fi
-    
+
     # Nettoyer le script temporaire
-    rm -f "/tmp/process_${folder_name}_${file_type//./}.py"
-    
-    log_info "Completed processing $folder_name with $file_type files"
+    rm -f "/tmp/process_${folder_name}.py"
+
+    log_info "Completed processing $folder_name with $file_types files"
 }
 
-# Traiter chaque dossier et type de fichier
+# Traiter chaque dossier (tous ses types de fichiers dans un même conteneur)
 jq -c '.folders_to_process[]' "$CONFIG_FILE" | while read -r folder_config; do
     folder_name=$(echo "$folder_config" | jq -r '.name')
     input_path=$(echo "$folder_config" | jq -r '.input_path')
     csv_file=$(echo "$folder_config" | jq -r '.csv_file')
     output_subfolder=$(echo "$folder_config" | jq -r '.output_subfolder')
-    
-    # Traiter chaque type de fichier pour ce dossier
-    echo "$folder_config" | jq -r '.file_types[]' | while read -r file_type; do
-        process_folder "$folder_name" "$input_path" "$csv_file" "$file_type" "$output_subfolder"
-    done
+    file_types=$(echo "$folder_config" | jq -r '.file_types | join(" ")')
+
+    process_folder "$folder_name" "$input_path" "$csv_file" "$file_types" "$output_subfolder"
 done
 
 print_header "All processing completed!"
@@ -91,16 +91,38 @@ while true; do
     esac
 done
 
+# Demander à l'utilisateur s'il veut un sous-dossier
+read -e -p "Voulez-vous mettre les résultats dans un sous-dossier de CLEANED ? (o/n) [défaut: n]: " SOUSDOSSIER_REP
+SOUSDOSSIER_REP=${SOUSDOSSIER_REP:-n}
+
+ROOT_DIR="/data/CLEANED"
+
+if [[ "$SOUSDOSSIER_REP" =~ ^[Oo]$ ]]; then
+    read -e -p "Nom du sous-dossier : " SOUSDOSSIER_NOM
+    DEST_CLEANED="$ROOT_DIR/$SOUSDOSSIER_NOM"
+else
+    DEST_CLEANED="$ROOT_DIR"
+fi
+
+# Mode de placement : sur un même disque, 'move', 'hardlink' et 'reflink' ne recopient pas les données
+read -e -p "Mode de placement des fichiers (copy, move, hardlink, reflink, symlink) [défaut: copy]: " PLACEMENT
+PLACEMENT=${PLACEMENT:-copy}
+
 # --- 2. Exécution du script de traitement principal ---
 
 print_header "Étape 2: Réorganisation et renommage des fichiers"
 
+mkdir -p "$ROOT_DIR"
+mkdir -p "$DEST_CLEANED"
+chmod -R 777 "$ROOT_DIR"
+
 py_list_area2patch=$(printf "'%s'," "${AREA2PATCH_G[@]}")
 py_list_query=$(printf "'%s'," "${QUERY_CONDITION_G[@]}")
 py_list_last_image=$(printf "'%s'," "${LAST_IMAGE_ISSUE_G[@]}")
 py_list_correct_date=$(printf "'%s'," "${CORRECT_DATE_G[@]}")
 
 # Création d'un script python temporaire pour appeler votre fonction main
+# Les fichiers sont écrits directement dans leur destination finale
 echo "from main_process_images import main
 import pandas as pd
 main(
@@ -110,7 +132,9 @@ main(
     area2patch_g=[${py_list_area2patch%,}],
     query_condition_g=[${py_list_query%,}],
     last_image_issue_g=[${py_list_last_image%,}],
-    correct_date_g=[${py_list_correct_date%,}]
+    correct_date_g=[${py_list_correct_date%,}],
+    placement=\"$PLACEMENT\",
+    output_dir=\"$DEST_CLEANED\"
 )
 " > run_main.py
 
@@ -118,48 +142,7 @@ main(
 python3 run_main.py
 check_error "Réorganisation des fichiers (main_process_images.py)"
 
-# Nouvelle logique pour déplacer CLEANED à la racine du volume monté
-if [[ "$FILES_PATH" == /data/RAW* ]]; then
-    CLEANED_DIR="/data/RAW/CLEANED"
-    ROOT_DIR="/data"
-else
-    BASE_PATH="${FILES_PATH/RAW/}"
-    CLEANED_DIR="${BASE_PATH%/}/CLEANED"
-    ROOT_DIR="$(dirname "$FILES_PATH")"
-fi
-
-# Vérifier si le dossier CLEANED existe
-if [ ! -d "$CLEANED_DIR" ]; then
-    echo "Erreur: Le dossier CLEANED '$CLEANED_DIR' n'a pas été trouvé."
-    exit 1
-fi
-
-# Demander à l'utilisateur s'il veut un sous-dossier
-read -e -p "Voulez-vous mettre les résultats dans un sous-dossier de CLEANED ? (o/n) [défaut: n]: " SOUSDOSSIER_REP
-SOUSDOSSIER_REP=${SOUSDOSSIER_REP:-n}
-
-
-ROOT_DIR="/data/CLEANED"
-
-
-if [[ "$SOUSDOSSIER_REP" =~ ^[Oo]$ ]]; then
-    read -e -p "Nom du sous-dossier : " SOUSDOSSIER_NOM
-    # DEST_CLEANED="/data/CLEANED/$SOUSDOSSIER_NOM"
-    DEST_CLEANED="$ROOT_DIR/$SOUSDOSSIER_NOM"
-else
-    DEST_CLEANED="$ROOT_DIR"
-    # Créer le dossier destination si besoin
-fi
-mkdir -p "$ROOT_DIR"
-mkdir -p "$DEST_CLEANED"
-chmod -R 777 "$ROOT_DIR"
-
-# Déplacer le contenu de CLEANED dans la destination
-cp -r "$CLEANED_DIR"/* "$DEST_CLEANED"/
-check_error "Déplacement du dossier CLEANED"
-
-# Nettoyer l'ancien dossier CLEANED
-rm -rf "$CLEANED_DIR"
+CLEANED_DIR="$DEST_CLEANED"
 
 chmod -R 777 "$DEST_CLEANED"
 echo "Les fichiers traités sont dans le dossier: $DEST_CLEANED"
@@ -181,7 +164,8 @@ else
 
     # Fichier de sortie dans le dossier destination
     HASH_OUTPUT_FILE="${ROOT_DIR}/hashes_output.csv"
-    ./run_hash.sh "$ROOT_DIR" "$HASH_OUTPUT_FILE"
+    # Les hashes sont aussi ajoutés au manifeste 'hashes' de l'arborescence
+    ./run_hash.sh "$ROOT_DIR" "$HASH_OUTPUT_FILE" "$CLEANED_DIR"
     check_error "Hachage des fichiers (run_hash.sh)"
 
     # --- 4. Recherche de doublons ---
@@ -193,6 +177,10 @@ else
 
     ./run_extract_duplicates.sh "$HASH_OUTPUT_FILE"
     check_error "Détection des doublons (run_extract_duplicates.sh)"
+
+    # Quasi-doublons (images ré-encodées ou ré-étiquetées) par hash perceptuel
+    python3 phash.py "$ROOT_DIR" "${ROOT_DIR}/$(basename "$HASH_OUTPUT_FILE" .csv)_duplicates_dhash.csv"
+    check_error "Détection des quasi-doublons (phash.py)"
     echo "Les rapports sur les doublons ont été enregistrés dans le dossier '$ROOT_DIR'."
 fi
 
@@ -201,24 +189,26 @@ fi
 print_header "Étape 5: Téléversement sur le NAS"
 
 while true; do
-    read -p "Voulez-vous téléverser les résultats sur un NAS distant via SCP ? (o/n): " yn
+    read -p "Voulez-vous téléverser les résultats sur un NAS distant via SSH ? (o/n): " yn
     case $yn in
         [Oo]* ) 
             read -p " -> Nom d'utilisateur du NAS: " NAS_USER
             read -p " -> Adresse IP ou nom d'hôte du NAS: " NAS_HOST
             read -p " -> Chemin absolu du dossier de destination sur le NAS: " NAS_DEST_PATH
             read -p " -> Port SSH (laissez vide pour le port 22 par défaut): " NAS_PORT
+            read -p " -> Nombre de flux parallèles [défaut: 4]: " NAS_STREAMS
             
             PORT_OPTION=""
             if [[ ! -z "$NAS_PORT" ]]; then
-                PORT_OPTION="-P $NAS_PORT"
+                PORT_OPTION="--port $NAS_PORT"
             fi
             
             echo "Tentative de téléversement de '$CLEANED_DIR' vers '${NAS_USER}@${NAS_HOST}:${NAS_DEST_PATH}'"
-            echo "Un mot de passe ou une phrase de passe pour votre clé SSH peut vous être demandé."
+            echo "Chaque flux ouvre sa connexion SSH : utilisez de préférence une clé SSH (ssh-agent)."
             
-            scp -O -r $PORT_OPTION "$CLEANED_DIR" "${NAS_USER}@${NAS_HOST}:${NAS_DEST_PATH}"
-            check_error "Téléversement SCP"
+            # Seuls les fichiers absents ou modifiés sur le NAS sont envoyés, puis vérifiés par MD5
+            python3 upload.py "$CLEANED_DIR" "${NAS_USER}@${NAS_HOST}:${NAS_DEST_PATH}" $PORT_OPTION --streams "${NAS_STREAMS:-4}"
+            check_error "Téléversement sur le NAS"
             
             echo "Téléversement terminé avec succès."
             break
@@ -0,0 +1,843 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+from lib import (
+    StationResolver,
+    add_file_number,
+    add_new_names,
+    add_sequence2name,
+    calculate_md5,
+    check_doublon,
+    drop_collisions,
+    extract_metadata,
+    get_file_paths,
+    place_structure,
+    prepare_cleaned_structure,
+    split_timelapse,
+)
+from date_correction import apply_date_corrections, collect_rules
+from discovery import discover_files, filter_manifest, manifest_stats
+from hashing import hash_edges
+from manifest_store import ManifestStore
+from metadata_cache import MetadataCache, get_cache_path
+from metrics import StageTimer, format_sub_stages, report_sub_stages
+from naming import save_collisions
+from placement import format_stats, merge_stats
+from timelapse import DEFAULT_TOLERANCE
+
+# Nombre de stations extraites d'avance pendant le traitement de la station courante
+DEFAULT_PREFETCH = 1
+
+
+def prefetch(iterable, maxsize=DEFAULT_PREFETCH):
+    """
+    Iterate over an iterable in a background thread through a bounded queue.
+
+    Parameters
+    ----------
+    iterable : iterable
+        Items to produce, typically a generator doing I/O.
+    maxsize : int, optional
+        Maximum number of items produced ahead of the consumer (default: 1).
+
+    Yields
+    ------
+    object
+        The items of iterable, in order.
+
+    Notes
+    -----
+    The producer blocks when the queue is full, so at most maxsize + 2 items
+    are alive at once (queued, being produced and being consumed). Exceptions
+    of the producer are raised in the consumer. A generator is run entirely in
+    the producer thread, including its cleanup.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    break
+            else:
+                put((done, None))
+        except Exception as e:
+            put((done, e))
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def group_by_station(files_name, resolver):
+    """
+    Group file paths by station.
+
+    Parameters
+    ----------
+    files_name : list of str
+        Sorted file paths.
+    resolver : StationResolver
+        Station-name resolver.
+
+    Returns
+    -------
+    list of (str, list of str)
+        (new_dir, file paths) of each station, in the order of their first file.
+
+    Notes
+    -----
+    A station spread over several relevé folders forms a single group, so its
+    sequences are numbered over all its files.
+    """
+    groups = {}
+    for path in files_name:
+        groups.setdefault(resolver.resolve(path), []).append(path)
+    return list(groups.items())
+
+
+def extract_station(
+    paths,
+    resolver,
+    type_file,
+    file_stats,
+    cache=None,
+    offset=0,
+    progress=True,
+    n_workers=None,
+):
+    """
+    Extract the metadata of the files of a station.
+
+    Parameters
+    ----------
+    paths : list of str
+        File paths of the station.
+    resolver : StationResolver
+        Station-name resolver.
+    type_file : str
+        File extension to process.
+    file_stats : dict
+        Mapping path -> (size, mtime_ns, inode) from the discovery manifest.
+    cache : MetadataCache, optional
+        Persistent cache (default: None).
+    offset : int, optional
+        Number of files of the previous stations: indexes follow each other
+        from one station to the next, as in the global DataFrame of the batch
+        mode (default: 0).
+    progress : bool, optional
+        Show the extraction progress bar (default: True).
+    n_workers : int, optional
+        Number of extraction processes; None uses all the CPUs (default: None).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Metadata of the station, with a 'size' column.
+    """
+    structure = extract_metadata(
+        paths,
+        resolver,
+        type_file,
+        cache=cache,
+        stats={p: file_stats[p] for p in paths},
+        progress=progress,
+        n_workers=n_workers,
+    )
+    structure.index = pd.RangeIndex(offset, offset + len(structure))
+    structure["size"] = [file_stats[f][0] for f in structure["file_path"]]
+    return structure
+
+
+def _measure(timer, name):
+    """Time a block as sub-stage name of timer, if any."""
+    return timer.measure(name) if timer is not None else nullcontext()
+
+
+def iter_station_metadata(
+    stations, resolver, type_file, file_stats, cache_path=None, timer=None
+):
+    """
+    Extract the metadata of each station in turn.
+
+    Parameters
+    ----------
+    stations : list of (str, list of str)
+        Groups returned by group_by_station.
+    resolver : StationResolver
+        Station-name resolver.
+    type_file : str
+        File extension to process.
+    file_stats : dict
+        Mapping path -> (size, mtime_ns, inode) from the discovery manifest.
+    cache_path : str, optional
+        Metadata cache database; it is opened by the generator itself so that
+        it can run in another thread (default: None, no cache).
+    timer : metrics.StageTimer, optional
+        Records the extraction time as sub-stage 'extract' (default: None).
+
+    Yields
+    ------
+    tuple of (str, pandas.DataFrame)
+        new_dir and metadata of the station (see extract_station).
+    """
+    cache = MetadataCache(cache_path) if cache_path is not None else None
+    try:
+        offset = 0
+        for new_dir, paths in stations:
+            with _measure(timer, "extract"):
+                structure = extract_station(
+                    paths, resolver, type_file, file_stats, cache=cache, offset=offset
+                )
+            yield new_dir, structure
+            offset += len(paths)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+class DuplicateIndex:
+    """
+    Duplicate detection over all the stations, fed one station at a time.
+
+    Parameters
+    ----------
+    cache : MetadataCache, optional
+        Persistent cache used to skip hashing unchanged files (default: None).
+    file_stats : dict, optional
+        Mapping path -> (size, mtime_ns, inode) of all the files of the run
+        (default: None, every kept file is hashed).
+
+    Notes
+    -----
+    Only the hashes of the kept files are remembered, grouped by size and
+    edge hash: kept files may be moved by their placement before the next
+    stations are compared with them. They are hashed when they are kept,
+    and only if a station not yet processed has a file of the same size.
+    Each new station is first deduplicated on its own with lib.check_doublon,
+    then its files are compared with the kept files of the same size of the
+    previous stations (edge hash, then full MD5).
+    """
+
+    def __init__(self, cache=None, file_stats=None):
+        self.cache = cache
+        self.file_stats = file_stats
+        # Taille -> hash des bords -> MD5 des fichiers conservés
+        self.kept = {}
+        # Nombre de fichiers par taille dans les stations restantes
+        self.remaining = (
+            Counter(stat[0] for stat in file_stats.values())
+            if file_stats is not None
+            else None
+        )
+
+    def _full_hash(self, path):
+        entry = None
+        if self.cache is not None:
+            entry = self.cache.get_many([path]).get(path)
+        if entry is not None and entry["hash_md5"] is not None:
+            return entry["hash_md5"]
+        md5 = calculate_md5(path)
+        if self.cache is not None:
+            self.cache.put_many([{"file_path": path, "hash_md5": md5}])
+        return md5
+
+    def _is_duplicate(self, path, size, edges):
+        kept = self.kept.get(size)
+        if not kept:
+            return False
+        edges[path] = hash_edges(path)
+        md5s = kept.get(edges[path])
+        return md5s is not None and self._full_hash(path) in md5s
+
+    def _keep(self, path, size, edges):
+        if self.remaining is not None and self.remaining[size] == 0:
+            return
+        edge = edges[path] if path in edges else hash_edges(path)
+        self.kept.setdefault(size, {}).setdefault(edge, set()).add(
+            self._full_hash(path)
+        )
+
+    def remove_seen(self, df_unique, dropped):
+        """
+        Remove the files of a station already kept in a previous station.
+
+        Parameters
+        ----------
+        df_unique : pandas.DataFrame
+            Station DataFrame deduplicated on its own (lib.check_doublon), with
+            'file_path' and 'size' columns.
+        dropped : pandas.Series
+            File paths dropped by lib.check_doublon.
+
+        Returns
+        -------
+        tuple of (pandas.DataFrame, pandas.Series)
+            - DataFrame with duplicates removed
+            - Series containing file paths of all dropped duplicates
+
+        Notes
+        -----
+        Stations must be given in order, before their files are placed: the
+        kept files are hashed and added to the index.
+        """
+        if self.remaining is not None:
+            # La station n'est plus à venir
+            for path in list(df_unique["file_path"]) + list(dropped):
+                if path in self.file_stats:
+                    self.remaining[self.file_stats[path][0]] -= 1
+        edges = {}
+        duplicated_mask = np.array(
+            [
+                self._is_duplicate(path, size, edges)
+                for path, size in zip(df_unique["file_path"], df_unique["size"])
+            ],
+            dtype=bool,
+        )
+        for path, size in zip(
+            df_unique.loc[~duplicated_mask, "file_path"],
+            df_unique.loc[~duplicated_mask, "size"],
+        ):
+            self._keep(path, size, edges)
+        dropped = pd.concat(
+            [dropped, df_unique.loc[duplicated_mask, "file_path"]]
+        ).sort_index()
+        return df_unique[~duplicated_mask], dropped
+
+    def check(self, df):
+        """
+        Remove the duplicates of a station, within it and with previous stations.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            Station DataFrame with 'file_path' and 'size' columns.
+
+        Returns
+        -------
+        tuple of (pandas.DataFrame, pandas.Series)
+            - DataFrame with duplicates removed
+            - Series containing file paths of dropped duplicates
+        """
+        return self.remove_seen(*check_doublon(df, cache=self.cache))
+
+
+def load_stations(files_path, corresponding_dir, type_file, cleaned_dir, manifest=None):
+    """
+    List the files to process and group them by station.
+
+    Parameters
+    ----------
+    files_path : str
+        Path to the directory of raw files.
+    corresponding_dir : pandas.DataFrame
+        Correspondence table of the stations.
+    type_file : str
+        File extension to process.
+    cleaned_dir : str
+        Final destination of the cleaned arborescence, excluded from the walk.
+    manifest : pandas.DataFrame, optional
+        File manifest from discovery.discover_files (default: None, the tree
+        is walked).
+
+    Returns
+    -------
+    tuple of (list, StationResolver, dict)
+        Groups returned by group_by_station, the resolver and the mapping
+        path -> (size, mtime_ns, inode) of the files.
+    """
+    if manifest is None:
+        manifest = discover_files(files_path, exclude_dirs=[cleaned_dir])
+    files_name = get_file_paths(files_path, type_file=type_file, manifest=manifest)
+    file_stats = manifest_stats(filter_manifest(manifest, type_file))
+    resolver = StationResolver(corresponding_dir)
+    stations = group_by_station(files_name, resolver)
+    print(f"{len(files_name)} fichiers répartis en {len(stations)} stations")
+    return stations, resolver, file_stats
+
+
+def get_patches(
+    area2patch_g,
+    query_condition_g,
+    last_image_issue_g,
+    correct_date_g,
+    date_rules=None,
+):
+    """
+    Gather the date corrections of all the stations.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Rules returned by date_correction.collect_rules.
+    """
+    return collect_rules(
+        area2patch_g, query_condition_g, last_image_issue_g, correct_date_g, date_rules
+    )
+
+
+def prepare_station(structure, files_path, cleaned_dir, cache=None, n_jobs=-1):
+    """
+    Create the output folders of a station and remove its internal duplicates.
+
+    Parameters
+    ----------
+    structure : pandas.DataFrame
+        Metadata of the station, from iter_station_metadata.
+    files_path : str
+        Path to the directory of raw files.
+    cleaned_dir : str
+        Final destination of the cleaned arborescence.
+    cache : MetadataCache, optional
+        Persistent cache used to skip hashing unchanged files (default: None).
+    n_jobs : int, optional
+        Number of hashing processes, -1 for all the cores (default: -1).
+
+    Returns
+    -------
+    tuple of (pandas.DataFrame, pandas.Series)
+        Output of lib.check_doublon on the station, to complete with
+        DuplicateIndex.remove_seen.
+    """
+    prepare_cleaned_structure(
+        files_path, structure, timelapse=True, cleaned_dir=cleaned_dir
+    )
+    structure = add_file_number(structure)
+    return check_doublon(structure, cache=cache, n_jobs=n_jobs)
+
+
+def name_station(
+    structure,
+    dropped,
+    corresponding_dir,
+    type_file,
+    patches,
+    cleaned_dir,
+    timelapse_tolerance=DEFAULT_TOLERANCE,
+):
+    """
+    Correct the dates, name, split and number the files of a station.
+
+    Parameters
+    ----------
+    structure : pandas.DataFrame
+        Deduplicated metadata of the station.
+    dropped : pandas.Series
+        File paths of the dropped duplicates.
+    corresponding_dir : pandas.DataFrame
+        Correspondence table of the stations.
+    type_file : str
+        File extension to process.
+    patches : pandas.DataFrame
+        Date corrections returned by get_patches.
+    cleaned_dir : str
+        Final destination of the cleaned arborescence, to find the name
+        collisions.
+    timelapse_tolerance : int, optional
+        Maximum delay in seconds of a timelapse shot after its scheduled time
+        (default: timelapse.DEFAULT_TOLERANCE).
+
+    Returns
+    -------
+    dict
+        'n_files', the 'structure' before the date corrections, 'dropped',
+        'timelapse' and 'camera' DataFrames/Series of the station (None if
+        empty), the 'collisions' left out of them (see lib.drop_collisions)
+        and an empty 'placement' list.
+    """
+    raw_structure = structure.copy()
+    if len(patches) > 0:
+        # Colonnes d'audit ajoutées à toutes les stations, pour des manifestes homogènes
+        structure = apply_date_corrections(
+            structure, patches[patches["station"].isin(structure["new_dir"].unique())]
+        )
+
+    result = {
+        "n_files": len(structure) + len(dropped),
+        "dropped": dropped,
+        "structure": raw_structure,
+        "timelapse": None,
+        "camera": None,
+        "collisions": [],
+        "placement": [],
+    }
+    if len(structure) == 0:
+        return result
+
+    structure = add_new_names(structure, type_file)
+    structure_timelapse, structure_camera = split_timelapse(
+        structure, corresponding_dir, tolerance=timelapse_tolerance
+    )
+    result["timelapse"], collisions = drop_collisions(
+        structure_timelapse, cleaned_dir, timelapse=True
+    )
+    result["collisions"].append(collisions)
+    if len(structure_camera) > 0:
+        result["camera"], collisions = drop_collisions(
+            add_sequence2name(structure_camera, by="new_dir"),
+            cleaned_dir,
+            timelapse=False,
+        )
+        result["collisions"].append(collisions)
+    return result
+
+
+def place_station(result, cleaned_dir, placement="copy", n_workers=8, journal=None):
+    """
+    Place the timelapse and camera files of a named station.
+
+    Parameters
+    ----------
+    result : dict
+        Station returned by name_station; its 'placement' list is filled.
+    cleaned_dir : str
+        Final destination of the cleaned arborescence.
+    placement : str, optional
+        One of placement.PLACEMENT_MODES (default: "copy").
+    n_workers : int, optional
+        Number of placement threads (default: 8).
+    journal : journal.PlacementJournal, optional
+        Write-ahead journal of the placements (default: None).
+
+    Returns
+    -------
+    dict
+        The same result.
+    """
+    for df, timelapse in ((result["timelapse"], True), (result["camera"], False)):
+        if df is not None:
+            result["placement"].append(
+                place_structure(
+                    df,
+                    cleaned_dir,
+                    timelapse=timelapse,
+                    mode=placement,
+                    n_workers=n_workers,
+                    journal=journal,
+                )
+            )
+    return result
+
+
+def process_station(
+    structure,
+    files_path,
+    corresponding_dir,
+    type_file,
+    cleaned_dir,
+    duplicates,
+    patches,
+    placement="copy",
+    timelapse_tolerance=DEFAULT_TOLERANCE,
+    journal=None,
+    timer=None,
+):
+    """
+    Run steps 2 to 10 of the pipeline on the files of a single station.
+
+    Parameters
+    ----------
+    structure : pandas.DataFrame
+        Metadata of the station, from iter_station_metadata.
+    files_path : str
+        Path to the directory of raw files.
+    corresponding_dir : pandas.DataFrame
+        Correspondence table of the stations.
+    type_file : str
+        File extension to process.
+    cleaned_dir : str
+        Final destination of the cleaned arborescence.
+    duplicates : DuplicateIndex
+        Global duplicate index.
+    patches : pandas.DataFrame
+        Date corrections returned by get_patches.
+    placement : str, optional
+        One of placement.PLACEMENT_MODES (default: "copy").
+    timelapse_tolerance : int, optional
+        Maximum delay in seconds of a timelapse shot after its scheduled time
+        (default: timelapse.DEFAULT_TOLERANCE).
+    journal : journal.PlacementJournal, optional
+        Write-ahead journal of the placements (default: None).
+    timer : metrics.StageTimer, optional
+        Records the time of the 'hash', 'name' and 'place' sub-stages, as in
+        pipeline.run_pipelined (default: None).
+
+    Returns
+    -------
+    dict
+        Station returned by name_station, with its 'placement' statistics.
+    """
+    with _measure(timer, "hash"):
+        prepared = prepare_station(
+            structure, files_path, cleaned_dir, cache=duplicates.cache
+        )
+    with _measure(timer, "name"):
+        structure, dropped = duplicates.remove_seen(*prepared)
+        result = name_station(
+            structure,
+            dropped,
+            corresponding_dir,
+            type_file,
+            patches,
+            cleaned_dir,
+            timelapse_tolerance=timelapse_tolerance,
+        )
+    with _measure(timer, "place"):
+        return place_station(result, cleaned_dir, placement=placement, journal=journal)
+
+
+class ManifestWriter:
+    """
+    Append the stations to the global manifests of the batch mode.
+
+    Parameters
+    ----------
+    tmp_dir : str
+        The .tmp directory of the cleaned arborescence.
+    id_today : str
+        Identifier of the run, used in the name of the dropped files and name
+        collisions manifests.
+    manifest_format : str, optional
+        'parquet' or 'csv' (default: None, see manifest_store.resolve_format).
+
+    Notes
+    -----
+    The structure, dropped files, timelapse and camera manifests are added
+    station by station to the same manifest_store.ManifestStore as in the
+    batch mode; .tmp/collisions_<id>.csv is appended to. Stations that fail
+    are listed in .tmp/failed_stations_<id>.csv.
+    Stations must be appended in order.
+    """
+
+    def __init__(self, tmp_dir, id_today, manifest_format=None):
+        self.store = ManifestStore(tmp_dir, id_today, manifest_format)
+        self.collisions_csv = os.path.join(tmp_dir, f"collisions_{id_today}.csv")
+        self.failed_csv = os.path.join(tmp_dir, f"failed_stations_{id_today}.csv")
+        self.failed = []
+
+    def append(self, new_dir, result):
+        """Write the manifests of a station returned by name_station."""
+        if result["dropped"] is not None:
+            self.store.write("dropped", result["dropped"], station=new_dir)
+        self.store.write("structure", result["structure"])
+        if result["timelapse"] is not None:
+            self.store.write("timelapse", result["timelapse"])
+        if result["camera"] is not None:
+            self.store.write("camera", result["camera"])
+        for collisions in result["collisions"]:
+            save_collisions(collisions, self.collisions_csv)
+
+    def add_failure(self, new_dir, n_files, stage, error):
+        """Record a station whose processing failed, with its error."""
+        print(f"Error: station {new_dir} ({stage}): {error}")
+        self.failed.append(new_dir)
+        pd.DataFrame(
+            [
+                {
+                    "station": new_dir,
+                    "n_files": n_files,
+                    "stage": stage,
+                    "error": f"{type(error).__name__}: {error}",
+                }
+            ]
+        ).to_csv(
+            self.failed_csv,
+            mode="a",
+            header=not os.path.exists(self.failed_csv),
+            index=False,
+        )
+
+    def check_failures(self):
+        """
+        Raise if stations failed.
+
+        Raises
+        ------
+        RuntimeError
+            If add_failure was called, listing the failed stations.
+        """
+        if self.failed:
+            raise RuntimeError(
+                f"{len(self.failed)} stations en échec, fichiers non placés: "
+                f"{', '.join(self.failed)} (voir {self.failed_csv})"
+            )
+
+
+def report_station(new_dir, result):
+    """Print the summary line of a processed station."""
+    n_placed = sum(s["n_files"] for s in result["placement"])
+    print(
+        f"{new_dir}: {result['n_files']} fichiers, "
+        f"{len(result['dropped'])} doublons, {n_placed} placés"
+    )
+
+
+def run_streaming(
+    files_path,
+    corresponding_dir,
+    type_file,
+    area2patch_g,
+    query_condition_g,
+    last_image_issue_g,
+    correct_date_g,
+    cleaned_dir,
+    use_cache=True,
+    placement="copy",
+    manifest=None,
+    prefetch_stations=DEFAULT_PREFETCH,
+    timelapse_tolerance=DEFAULT_TOLERANCE,
+    journal=None,
+    manifest_format=None,
+    date_rules=None,
+):
+    """
+    Run the pipeline station by station, with memory bounded by the largest station.
+
+    Parameters
+    ----------
+    files_path : str
+        Path to the directory of raw files.
+    corresponding_dir : pandas.DataFrame
+        Correspondence table of the stations.
+    type_file : str
+        File extension to process.
+    area2patch_g, query_condition_g, last_image_issue_g, correct_date_g : list
+        Date corrections to apply, one entry per area (see
+        date_correction.rules_from_patches).
+    cleaned_dir : str
+        Final destination of the cleaned arborescence.
+    use_cache : bool, optional
+        If False, neither read nor update the metadata cache (default: True).
+    placement : str, optional
+        One of placement.PLACEMENT_MODES (default: "copy").
+    manifest : pandas.DataFrame, optional
+        File manifest from discovery.discover_files (default: None, the tree
+        is walked).
+    prefetch_stations : int, optional
+        Number of stations whose metadata is extracted ahead by a background
+        thread while the current one is deduplicated and placed (default: 1).
+    timelapse_tolerance : int, optional
+        Maximum delay in seconds of a timelapse shot after its scheduled time
+        (default: timelapse.DEFAULT_TOLERANCE).
+    journal : journal.PlacementJournal, optional
+        Write-ahead journal of the placements (default: None).
+    manifest_format : str, optional
+        'parquet' or 'csv' (default: None, see manifest_store.resolve_format).
+    date_rules : str or pandas.DataFrame, optional
+        More date corrections, see date_correction.make_rules (default: None).
+
+    Returns
+    -------
+    dict
+        Merged placement statistics.
+
+    Raises
+    ------
+    RuntimeError
+        If stations failed (see ManifestWriter.check_failures).
+
+    Notes
+    -----
+    Each station goes through extraction, deduplication, date correction,
+    naming, timelapse separation, sequence numbering and placement before
+    the next one is processed. The global manifests of the batch mode are
+    still written by appending each station (see ManifestWriter). Duplicates
+    are searched across all stations; the first file met in station order is
+    kept. A failing station is skipped and listed in
+    .tmp/failed_stations_<id>.csv; the run then ends with an error once the
+    other stations are processed.
+    """
+    id_today = time.strftime("%Y%m%d%H%M%S")
+    tmp_dir = os.path.join(cleaned_dir, ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    stations, resolver, file_stats = load_stations(
+        files_path, corresponding_dir, type_file, cleaned_dir, manifest
+    )
+    patches = get_patches(
+        area2patch_g,
+        query_condition_g,
+        last_image_issue_g,
+        correct_date_g,
+        date_rules,
+    )
+
+    cache_path = get_cache_path(cleaned_dir) if use_cache else None
+    cache = MetadataCache(cache_path) if use_cache else None
+    duplicates = DuplicateIndex(cache=cache, file_stats=file_stats)
+    manifests = ManifestWriter(tmp_dir, id_today, manifest_format)
+    timer = StageTimer()
+    placement_stats = []
+    try:
+        for new_dir, structure in prefetch(
+            iter_station_metadata(
+                stations, resolver, type_file, file_stats, cache_path, timer=timer
+            ),
+            maxsize=prefetch_stations,
+        ):
+            try:
+                result = process_station(
+                    structure,
+                    files_path,
+                    corresponding_dir,
+                    type_file,
+                    cleaned_dir,
+                    duplicates,
+                    patches,
+                    placement=placement,
+                    timelapse_tolerance=timelapse_tolerance,
+                    journal=journal,
+                    timer=timer,
+                )
+            except Exception as e:
+                manifests.add_failure(new_dir, len(structure), "process", e)
+                continue
+
+            # Ajouter la station aux manifestes globaux
+            with timer.measure("manifests"):
+                manifests.append(new_dir, result)
+            placement_stats.extend(result["placement"])
+            report_station(new_dir, result)
+            del structure, result
+    finally:
+        if cache is not None:
+            cache.close()
+
+    stage_stats = timer.stage_stats()
+    report_sub_stages(stage_stats)
+    print(f"Étapes: {format_sub_stages(stage_stats)}")
+    stats = merge_stats(*placement_stats)
+    print(f"Placement: {format_stats(stats)}")
+    manifests.check_failures()
+    return stats
@@ -0,0 +1,144 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Écart maximal (en secondes) entre l'heure programmée et la prise de vue
+DEFAULT_TOLERANCE = 9
+
+# Programme utilisé quand la table de correspondance n'a pas de colonne 'timelapse'
+FALLBACK_SCHEDULE = "every 1h"
+
+SECONDS_PER_DAY = 24 * 3600
+
+# Valeurs signifiant qu'une station n'a pas de timelapse
+NO_TIMELAPSE = {"", "no", "non", "nan", "none"}
+
+# Séparateurs de plusieurs prises de vue quotidiennes ('9am, 4pm', '9am + 4pm', '9am et 4pm')
+SHOT_SEPARATOR = re.compile(r"\s*(?:,|;|\+|\bet\b|\band\b)\s*")
+
+# Intervalle régulier ('every 30m', 'toutes les 2h')
+INTERVAL = re.compile(r"^(?:every|toutes les|tous les)\s*(\d+)\s*(h|min|mn|m|s)\b")
+
+# Heure au format 12 h ('9am', '9 am', '12:30pm')
+CLOCK_12H = re.compile(r"^(\d{1,2})(?::(\d{2}))?\s*([ap])\.?m\b")
+
+# Heure au format 24 h ('13h', '13h30', '13:30')
+CLOCK_24H = re.compile(r"^(\d{1,2})\s*(?:h|:)\s*(\d{2})?")
+
+INTERVAL_UNITS = {"h": 3600, "min": 60, "mn": 60, "m": 60, "s": 1}
+
+
+def _parse_shot(text):
+    """Parse one entry of a schedule into (offset, period) seconds, or None."""
+    match = INTERVAL.match(text)
+    if match:
+        period = int(match.group(1)) * INTERVAL_UNITS[match.group(2)]
+        return (0, period) if 0 < period <= SECONDS_PER_DAY else None
+
+    match = CLOCK_12H.match(text)
+    if match:
+        hour, minute, half = (
+            int(match.group(1)),
+            int(match.group(2) or 0),
+            match.group(3),
+        )
+        if not 1 <= hour <= 12 or minute > 59:
+            return None
+        # 12am = 0h, 12pm = 12h
+        hour = hour % 12 + (12 if half == "p" else 0)
+        return (hour * 3600 + minute * 60, SECONDS_PER_DAY)
+
+    match = CLOCK_24H.match(text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2) or 0)
+        if hour > 23 or minute > 59:
+            return None
+        return (hour * 3600 + minute * 60, SECONDS_PER_DAY)
+    return None
+
+
+def parse_timelapse_schedule(value):
+    """
+    Parse the timelapse schedule of a station from the correspondence table.
+
+    Parameters
+    ----------
+    value : str or None
+        Schedule such as '9am', '1pm depuis instal', '9am, 4pm', '13h30' or
+        'every 30m'; 'NO', 'non' or a missing value mean no timelapse.
+
+    Returns
+    -------
+    tuple of (int, int)
+        Sorted (offset, period) pairs in seconds: a photo taken at t seconds
+        after midnight is a timelapse shot if (t - offset) % period is within
+        the tolerance. A daily shot has a period of one day. Empty if the
+        station has no timelapse or the value cannot be parsed.
+
+    Notes
+    -----
+    Text following a time is ignored ('1pm depuis instal'). When the schedule
+    changed over time ('1pm depuis 11/08/18 puis 9am depuis 05/10/18'), only
+    the first one is used, as before.
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ()
+    text = str(value).lower().strip()
+    if text in NO_TIMELAPSE:
+        return ()
+    text = text.split("puis")[0]
+    shots = {_parse_shot(part.strip()) for part in SHOT_SEPARATOR.split(text)}
+    shots.discard(None)
+    return tuple(sorted(shots))
+
+
+def timelapse_mask(dates, schedules, tolerance=DEFAULT_TOLERANCE):
+    """
+    Flag the photos taken by the timelapse schedule of their station.
+
+    Parameters
+    ----------
+    dates : pandas.Series
+        Acquisition dates.
+    schedules : pandas.Series
+        Schedule of the station of each photo, aligned with dates (see
+        parse_timelapse_schedule).
+    tolerance : int, optional
+        Maximum delay in seconds after the scheduled time (default: 9, i.e.
+        seconds 00 to 09).
+
+    Returns
+    -------
+    numpy.ndarray of bool
+        True for timelapse shots. Photos without date are never timelapse.
+
+    Notes
+    -----
+    Each distinct schedule is parsed once; the classification is then a
+    single vectorized modulo test on the time of day of all the photos.
+    """
+    dates = pd.to_datetime(pd.Series(dates))
+    codes, uniques = pd.factorize(pd.Series(schedules, index=dates.index))
+    parsed = [parse_timelapse_schedule(value) for value in uniques]
+    n_shots = max((len(shots) for shots in parsed), default=0)
+    if n_shots == 0 or len(dates) == 0:
+        return np.zeros(len(dates), dtype=bool)
+
+    # Une ligne par programme, plus une dernière (vide) pour les valeurs manquantes
+    offsets = np.zeros((len(parsed) + 1, n_shots), dtype=np.int64)
+    periods = np.zeros((len(parsed) + 1, n_shots), dtype=np.int64)
+    for i, shots in enumerate(parsed):
+        for j, (offset, period) in enumerate(shots):
+            offsets[i, j] = offset
+            periods[i, j] = period
+
+    valid = dates.notna().to_numpy()
+    time_of_day = (
+        (dates.dt.hour * 3600 + dates.dt.minute * 60 + dates.dt.second)
+        .fillna(0)
+        .to_numpy(dtype=np.int64)
+    )
+    offsets, periods = offsets[codes], periods[codes]
+    delay = (time_of_day[:, None] - offsets) % np.maximum(periods, 1)
+    return ((periods > 0) & (delay <= tolerance)).any(axis=1) & valid
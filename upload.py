@@ -0,0 +1,484 @@
+import argparse
+import io
+import os
+import re
+import shlex
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from hashing import hash_file
+from journal import read_journal_hashes
+from metadata_cache import CACHE_FILENAME, MetadataCache, get_cache_path
+from placement import PART_SUFFIX, place_file_atomic
+
+# Manifeste (chemin relatif, taille, MD5) des fichiers déjà envoyés, à la racine distante
+REMOTE_MANIFEST = ".camtrap_manifest.csv"
+
+MANIFEST_COLUMNS = ["path", "size", "hash"]
+
+# Nombre de fichiers envoyés puis vérifiés ensemble par un flux
+DEFAULT_BATCH_SIZE = 500
+
+DEFAULT_STREAMS = 4
+
+# Dossier des fichiers partiellement reçus par rsync, repris au prochain envoi
+RSYNC_PARTIAL_DIR = ".rsync-partial"
+
+# Destination SSH : [utilisateur@]hôte:chemin
+SSH_DESTINATION = re.compile(r"^(?:([^@/:]+)@)?([^@/:]+):(.+)$")
+
+
+def _iter_tree(directory):
+    """Yield (path, size) of the files to upload of a tree."""
+    stack = [directory]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif (
+                    entry.is_file()
+                    and not entry.name.endswith(PART_SUFFIX)
+                    and not entry.name.startswith(CACHE_FILENAME)
+                ):
+                    yield entry.path, entry.stat().st_size
+
+
+def build_local_manifest(cleaned_dir, n_workers=DEFAULT_STREAMS):
+    """
+    List the files of a cleaned arborescence with their size and MD5.
+
+    Parameters
+    ----------
+    cleaned_dir : str
+        Root of the tree to upload.
+    n_workers : int, optional
+        Number of hashing threads (default: 4).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Columns 'file_path' (absolute local path), 'path' (relative POSIX
+        path), 'size' and 'hash', sorted by path.
+
+    Notes
+    -----
+    The MD5 of the copied files comes from the placement journal (computed
+    while copying) and the other hashes from the metadata cache of the tree;
+    only the files found in neither are read. The new hashes are stored in
+    the cache, so the next upload does not read them again. Temporary files
+    and the metadata cache itself, only valid on this machine, are not
+    listed.
+    """
+    cleaned_dir = os.path.abspath(cleaned_dir)
+    files = pd.DataFrame(list(_iter_tree(cleaned_dir)), columns=["file_path", "size"])
+    files = files.sort_values("file_path", ignore_index=True)
+    files["path"] = [
+        os.path.relpath(p, cleaned_dir).replace(os.sep, "/") for p in files["file_path"]
+    ]
+
+    hashes = {}
+    journal_hashes = read_journal_hashes(cleaned_dir)
+    for path, size in zip(files["file_path"], files["size"]):
+        known = journal_hashes.get(path)
+        if known is not None and known[0] == size:
+            hashes[path] = known[1]
+
+    with MetadataCache(get_cache_path(cleaned_dir)) as cache:
+        for path, entry in cache.get_many(
+            [p for p in files["file_path"] if p not in hashes]
+        ).items():
+            if entry["hash_md5"] is not None:
+                hashes[path] = entry["hash_md5"]
+
+        to_hash = [p for p in files["file_path"] if p not in hashes]
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            computed = list(
+                executor.map(
+                    lambda p: hash_file(p, algorithms=("md5",))["md5"], to_hash
+                )
+            )
+        hashes.update(zip(to_hash, computed))
+        cache.put_many(
+            {"file_path": p, "hash_md5": hashes[p]} for p in files["file_path"]
+        )
+    files["hash"] = files["file_path"].map(hashes)
+    return files[["file_path"] + MANIFEST_COLUMNS]
+
+
+def diff_manifests(local, remote):
+    """
+    Select the local files missing or different on the remote side.
+
+    Parameters
+    ----------
+    local : pandas.DataFrame
+        Manifest returned by build_local_manifest.
+    remote : pandas.DataFrame or None
+        Remote manifest (MANIFEST_COLUMNS), None if there is none yet.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Rows of local to send: not in the remote manifest, or with another
+        size or hash.
+    """
+    if remote is None or len(remote) == 0:
+        return local
+    remote = remote.drop_duplicates("path", keep="last").set_index("path")
+    same = local["path"].map(remote["size"]).eq(local["size"]) & local["path"].map(
+        remote["hash"]
+    ).eq(local["hash"])
+    return local[~same.to_numpy()]
+
+
+def _manifest_csv(df, header=True):
+    buffer = io.StringIO()
+    df[MANIFEST_COLUMNS].to_csv(buffer, index=False, header=header)
+    return buffer.getvalue()
+
+
+def _read_manifest_csv(text):
+    if not text.strip():
+        return None
+    return pd.read_csv(io.StringIO(text), dtype={"path": str, "hash": str})
+
+
+class LocalTransport:
+    """
+    Upload to a directory of this machine (mounted NAS share, tests).
+
+    Parameters
+    ----------
+    dest_dir : str
+        Remote root, created if missing.
+    """
+
+    def __init__(self, dest_dir):
+        self.dest_dir = os.path.abspath(dest_dir)
+        self.manifest_path = os.path.join(self.dest_dir, REMOTE_MANIFEST)
+        os.makedirs(self.dest_dir, exist_ok=True)
+
+    def read_manifest(self):
+        """Return the remote manifest, None if there is none."""
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return _read_manifest_csv(f.read())
+
+    def append_manifest(self, rows):
+        """Add verified files to the remote manifest."""
+        header = not os.path.exists(self.manifest_path)
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(_manifest_csv(rows, header=header))
+
+    def write_manifest(self, manifest):
+        """Replace the remote manifest."""
+        tmp = self.manifest_path + PART_SUFFIX
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(_manifest_csv(manifest))
+        os.replace(tmp, self.manifest_path)
+
+    def send(self, local_root, paths):
+        """Copy files given by their path relative to local_root."""
+        for path in paths:
+            dst = os.path.join(self.dest_dir, *path.split("/"))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            place_file_atomic(os.path.join(local_root, *path.split("/")), dst)
+
+    def checksums(self, paths):
+        """Return the MD5 of the remote files, missing files omitted."""
+        result = {}
+        for path in paths:
+            try:
+                result[path] = hash_file(
+                    os.path.join(self.dest_dir, *path.split("/")), algorithms=("md5",)
+                )["md5"]
+            except OSError:
+                continue
+        return result
+
+
+class SSHTransport:
+    """
+    Upload to a NAS with rsync over SSH.
+
+    Parameters
+    ----------
+    host : str
+        Host name or IP address of the NAS.
+    dest_dir : str
+        Absolute remote root.
+    user : str, optional
+        SSH user (default: None, the SSH configuration is used).
+    port : int, optional
+        SSH port (default: None, port 22).
+
+    Notes
+    -----
+    Files are sent by rsync with --partial-dir, so a file cut by an
+    interruption is completed instead of sent again, and with --ignore-times:
+    the files given to send were selected because the remote copy is missing
+    or differs from the manifest (or its checksum did not match), so rsync's
+    quick check on size and date must not skip them. An existing remote file
+    is then updated with the rsync delta algorithm. The checksums are
+    computed on the NAS with md5sum, on the data actually written there.
+    Each stream opens its own SSH connection: use a key or an ssh-agent
+    rather than a password.
+    """
+
+    def __init__(self, host, dest_dir, user=None, port=None):
+        self.target = f"{user}@{host}" if user else host
+        self.dest_dir = dest_dir.rstrip("/")
+        self.manifest_path = f"{self.dest_dir}/{REMOTE_MANIFEST}"
+        self.ssh = ["ssh"] + (["-p", str(port)] if port else [])
+        self._run(f"mkdir -p {shlex.quote(self.dest_dir)}")
+
+    def _run(self, command, data=None, check=True):
+        result = subprocess.run(
+            self.ssh + [self.target, command],
+            input=data,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if check and result.returncode != 0:
+            raise RuntimeError(
+                f"ssh {self.target} '{command}': {result.stderr.strip()}"
+            )
+        return result
+
+    def read_manifest(self):
+        """Return the remote manifest, None if there is none."""
+        path = shlex.quote(self.manifest_path)
+        return _read_manifest_csv(
+            self._run(f"if [ -f {path} ]; then cat {path}; fi").stdout
+        )
+
+    def append_manifest(self, rows):
+        """Add verified files to the remote manifest."""
+        path = shlex.quote(self.manifest_path)
+        header = shlex.quote(",".join(MANIFEST_COLUMNS))
+        self._run(
+            f"{{ [ -s {path} ] || echo {header}; cat; }} >> {path}",
+            data=_manifest_csv(rows, header=False),
+        )
+
+    def write_manifest(self, manifest):
+        """Replace the remote manifest."""
+        path = shlex.quote(self.manifest_path)
+        tmp = shlex.quote(self.manifest_path + PART_SUFFIX)
+        self._run(f"cat > {tmp} && mv {tmp} {path}", data=_manifest_csv(manifest))
+
+    def send(self, local_root, paths):
+        """Send files given by their path relative to local_root with rsync."""
+        result = subprocess.run(
+            [
+                "rsync",
+                "--archive",
+                # Fichiers à renvoyer même si taille et date sont identiques
+                "--ignore-times",
+                "--from0",
+                "--files-from=-",
+                f"--partial-dir={RSYNC_PARTIAL_DIR}",
+                "-e",
+                " ".join(shlex.quote(arg) for arg in self.ssh),
+                local_root.rstrip("/") + "/",
+                f"{self.target}:{self.dest_dir}/",
+            ],
+            input="\0".join(paths),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"rsync: {result.stderr.strip()}")
+
+    def checksums(self, paths):
+        """Return the MD5 of the remote files, missing files omitted."""
+        output = self._run(
+            f"cd {shlex.quote(self.dest_dir)} && xargs -0 md5sum --",
+            data="\0".join(paths),
+            check=False,
+        ).stdout
+        result = {}
+        for line in output.splitlines():
+            digest, _, path = line.partition("  ")
+            if path:
+                result[path] = digest
+        return result
+
+
+def get_transport(destination, port=None):
+    """
+    Build the transport of a destination.
+
+    Parameters
+    ----------
+    destination : str
+        '[user@]host:/path' for a NAS reached by SSH, a local path otherwise.
+    port : int, optional
+        SSH port (default: None, port 22).
+
+    Returns
+    -------
+    LocalTransport or SSHTransport
+    """
+    match = SSH_DESTINATION.match(destination)
+    if match and not os.path.exists(destination):
+        user, host, dest_dir = match.groups()
+        return SSHTransport(host, dest_dir, user=user, port=port)
+    return LocalTransport(destination)
+
+
+def upload_tree(
+    cleaned_dir,
+    transport,
+    n_streams=DEFAULT_STREAMS,
+    batch_size=DEFAULT_BATCH_SIZE,
+    verify=True,
+    rescan=False,
+):
+    """
+    Send the new and modified files of a cleaned arborescence.
+
+    Parameters
+    ----------
+    cleaned_dir : str
+        Root of the tree to upload.
+    transport : LocalTransport or SSHTransport
+        Remote side, rooted at the destination of cleaned_dir.
+    n_streams : int, optional
+        Number of batches sent at the same time (default: 4).
+    batch_size : int, optional
+        Number of files sent then verified together (default: 500).
+    verify : bool, optional
+        If True, compare the MD5 of the remote files with the local ones
+        after each batch and send the mismatching files once more
+        (default: True).
+    rescan : bool, optional
+        If True, ignore the remote manifest and checksum the remote files
+        instead, e.g. after files were modified on the NAS (default: False).
+
+    Returns
+    -------
+    dict
+        'n_files' (local files), 'n_sent', 'n_failed', 'n_bytes', 'elapsed'
+        and 'mb_per_s'.
+
+    Notes
+    -----
+    Only the files missing from the remote manifest, or whose size or hash
+    changed, are sent. The manifest is appended after each verified batch, so
+    an interrupted upload resumes with the files not yet verified.
+    """
+    start = time.perf_counter()
+    local = build_local_manifest(cleaned_dir, n_workers=n_streams)
+    if rescan:
+        remote_hashes = transport.checksums(local["path"].tolist())
+        remote = local[local["path"].isin(remote_hashes.keys())].copy()
+        remote["hash"] = remote["path"].map(remote_hashes)
+    else:
+        remote = transport.read_manifest()
+    to_send = diff_manifests(local, remote)
+    print(
+        f"Téléversement: {len(to_send)} fichiers à envoyer sur {len(local)} "
+        f"({to_send['size'].sum() / 1e6:.1f} Mo)"
+    )
+
+    lock = threading.Lock()
+    local_root = os.path.abspath(cleaned_dir)
+
+    def send_batch(batch):
+        paths = batch["path"].tolist()
+        transport.send(local_root, paths)
+        if verify:
+            ok = batch["path"].map(transport.checksums(paths)).eq(batch["hash"])
+            if not ok.all():
+                # Renvoyer une fois les fichiers dont le hash ne correspond pas
+                retry = batch.loc[~ok.to_numpy(), "path"].tolist()
+                transport.send(local_root, retry)
+                ok = batch["path"].map(transport.checksums(paths)).eq(batch["hash"])
+            batch = batch[ok.to_numpy()]
+        with lock:
+            transport.append_manifest(batch)
+        return batch
+
+    batches = [
+        to_send.iloc[i : i + batch_size] for i in range(0, len(to_send), batch_size)
+    ]
+    sent = []
+    with ThreadPoolExecutor(max_workers=n_streams) as executor:
+        for batch in executor.map(send_batch, batches):
+            sent.append(batch)
+
+    n_failed = len(to_send) - sum(len(batch) for batch in sent)
+    if sent or rescan:
+        # Compacter le manifeste distant
+        manifest = pd.concat(
+            [df[MANIFEST_COLUMNS] for df in [remote] + sent if df is not None]
+        ).drop_duplicates("path", keep="last")
+        transport.write_manifest(manifest.sort_values("path"))
+    if n_failed:
+        print(f"Error: {n_failed} fichiers n'ont pas le même hash une fois envoyés")
+
+    elapsed = time.perf_counter() - start
+    n_bytes = int(sum(batch["size"].sum() for batch in sent))
+    return {
+        "n_files": len(local),
+        "n_sent": len(to_send) - n_failed,
+        "n_failed": n_failed,
+        "n_bytes": n_bytes,
+        "elapsed": elapsed,
+        "mb_per_s": n_bytes / 1e6 / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Upload the new and modified files of a CLEANED tree to a NAS"
+    )
+    parser.add_argument("cleaned_dir", help="Cleaned arborescence to upload")
+    parser.add_argument(
+        "destination",
+        help="[user@]host:/path on the NAS, or a local directory; the tree is "
+        "uploaded into <destination>/<name of cleaned_dir>",
+    )
+    parser.add_argument("--port", type=int, default=None, help="SSH port")
+    parser.add_argument("--streams", type=int, default=DEFAULT_STREAMS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--no-verify", action="store_true", help="Do not checksum the sent files"
+    )
+    parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="Checksum the remote files instead of trusting the remote manifest",
+    )
+    args = parser.parse_args()
+
+    name = os.path.basename(os.path.abspath(args.cleaned_dir))
+    transport = get_transport(args.destination.rstrip("/") + "/" + name, args.port)
+    stats = upload_tree(
+        args.cleaned_dir,
+        transport,
+        n_streams=args.streams,
+        batch_size=args.batch_size,
+        verify=not args.no_verify,
+        rescan=args.rescan,
+    )
+    print(
+        f"{stats['n_sent']} fichiers envoyés ({stats['n_failed']} en échec), "
+        f"{stats['n_bytes'] / 1e6:.1f} Mo en {stats['elapsed']:.1f} s : "
+        f"{stats['mb_per_s']:.1f} Mo/s"
+    )
+    if stats["n_failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
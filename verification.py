@@ -0,0 +1,220 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from hashing import DEFAULT_BUFFER_SIZE, hash_file
+
+# Colonnes du rapport de vérification
+REPORT_COLUMNS = ["src", "dst", "size", "expected_hash", "hash", "status"]
+
+# Statuts possibles d'un fichier vérifié
+STATUS_OK = "ok"
+STATUS_MISSING = "missing"
+STATUS_SIZE = "size"
+STATUS_MISMATCH = "mismatch"
+STATUS_EXTRA = "extra"
+STATUS_NO_HASH = "no_hash"
+
+
+def hash_from_disk(file_path, buffer_size=DEFAULT_BUFFER_SIZE):
+    """
+    Calculate the MD5 of a file, read from the disk rather than the page cache.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the file.
+    buffer_size : int, optional
+        Size of the read buffer in bytes (default: 4 MiB).
+
+    Returns
+    -------
+    str
+        MD5 hex digest.
+
+    Notes
+    -----
+    A file that was just written is still in memory: the cached pages are
+    dropped first (posix_fadvise, where available) so that the digest is
+    computed on the data actually stored. Pages not yet written to the disk
+    cannot be dropped and are read from memory.
+    """
+    if hasattr(os, "posix_fadvise"):
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return hash_file(file_path, algorithms=("md5",), buffer_size=buffer_size)["md5"]
+
+
+def _check(record):
+    """Check one destination against its expected size and hash."""
+    src, dst, size, expected = record
+    try:
+        actual_size = os.path.getsize(dst)
+    except OSError:
+        return src, dst, size, expected, None, STATUS_MISSING
+    if size is not None and actual_size != size:
+        return src, dst, actual_size, expected, None, STATUS_SIZE
+    if expected is None:
+        return src, dst, actual_size, expected, None, STATUS_NO_HASH
+    digest = hash_from_disk(dst)
+    status = STATUS_OK if digest == expected else STATUS_MISMATCH
+    return src, dst, actual_size, expected, digest, status
+
+
+def verify_copies(records, n_workers=8):
+    """
+    Check copied files against the hash computed while copying them.
+
+    Parameters
+    ----------
+    records : pandas.DataFrame
+        One row per copy with 'src', 'dst', 'size' and 'hash' columns, 'hash'
+        being the MD5 of the data read from the source during the copy
+        (placement.copy_file_hashed). Missing sizes or hashes are allowed.
+    n_workers : int, optional
+        Number of threads reading the destinations (default: 8).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Report with REPORT_COLUMNS, one row per record. 'status' is 'ok',
+        'missing', 'size' (the size differs, the file is not read),
+        'mismatch' or 'no_hash' (nothing to compare with, e.g. a hard link).
+
+    Notes
+    -----
+    The sources are not read again: each copy costs a single read of its
+    destination.
+    """
+    rows = zip(
+        records["src"],
+        records["dst"],
+        records["size"].astype(object).where(records["size"].notna(), None),
+        records["hash"].astype(object).where(records["hash"].notna(), None),
+    )
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        report = list(executor.map(_check, rows))
+    return pd.DataFrame(report, columns=REPORT_COLUMNS)
+
+
+def verify_journal(journal, n_workers=8):
+    """
+    Check the files recorded as complete in a placement journal.
+
+    Parameters
+    ----------
+    journal : journal.PlacementJournal
+        Journal of the placements.
+    n_workers : int, optional
+        Number of threads reading the destinations (default: 8).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Report returned by verify_copies.
+    """
+    records = pd.DataFrame(
+        list(journal.completed.values()), columns=["src", "dst", "size", "hash"]
+    )
+    return verify_copies(records, n_workers=n_workers)
+
+
+def _list_tree(directory):
+    """Map the relative path of every file of a tree to its absolute path."""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, directory)] = path
+    return files
+
+
+def compare_trees(src, dst, n_workers=8):
+    """
+    Compare two directory trees file by file.
+
+    Parameters
+    ----------
+    src : str
+        Source directory.
+    dst : str
+        Destination directory.
+    n_workers : int, optional
+        Number of hashing threads (default: 8).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Report with REPORT_COLUMNS, one row per relative path found in either
+        tree: 'extra' for files only in dst, otherwise as verify_copies.
+
+    Notes
+    -----
+    Files are matched by relative path, in nested trees too. Without hashes
+    from the copy, both sides are read; files whose sizes differ are not.
+    """
+    src_files = _list_tree(src)
+    dst_files = _list_tree(dst)
+    paired = [p for p in src_files if p in dst_files]
+
+    def source_hash(path):
+        if os.path.getsize(src_files[path]) != os.path.getsize(dst_files[path]):
+            return None
+        return hash_file(src_files[path], algorithms=("md5",))["md5"]
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        expected = dict(zip(paired, executor.map(source_hash, paired)))
+
+    records = pd.DataFrame(
+        {
+            "src": list(src_files.values()),
+            "dst": [os.path.join(dst, p) for p in src_files],
+            "size": [os.path.getsize(path) for path in src_files.values()],
+            "hash": [expected.get(p) for p in src_files],
+        }
+    )
+    report = verify_copies(records, n_workers=n_workers)
+    extra = [
+        (None, dst_files[p], os.path.getsize(dst_files[p]), None, None, STATUS_EXTRA)
+        for p in dst_files
+        if p not in src_files
+    ]
+    if extra:
+        report = pd.concat([report, pd.DataFrame(extra, columns=REPORT_COLUMNS)])
+    return report.reset_index(drop=True)
+
+
+def summarize_report(report):
+    """Human readable summary of a verification report."""
+    counts = report["status"].value_counts()
+    details = ", ".join(f"{n} {status}" for status, n in counts.items())
+    return f"{counts.get(STATUS_OK, 0)}/{len(report)} fichiers vérifiés ({details})"
+
+
+def save_report(report, path):
+    """
+    Print the summary of a verification and save its failures.
+
+    Parameters
+    ----------
+    report : pandas.DataFrame
+        Report returned by verify_copies, verify_journal or compare_trees.
+    path : str
+        CSV written with the 'missing', 'size', 'mismatch' and 'extra' rows,
+        only if there are any.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The failed rows.
+    """
+    failed = report[~report["status"].isin([STATUS_OK, STATUS_NO_HASH])]
+    print(f"Vérification: {summarize_report(report)}")
+    if len(failed) > 0:
+        failed.to_csv(path, index=False)
+        print(f"Error: {len(failed)} fichiers en échec de vérification (voir {path})")
+    return failed
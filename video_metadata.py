@@ -0,0 +1,346 @@
+import json
+import re
+import struct
+import subprocess
+from datetime import datetime, timedelta
+
+# Origine des dates des conteneurs QuickTime/MP4 (secondes depuis 1904-01-01)
+MP4_EPOCH = datetime(1904, 1, 1)
+
+# Boîtes MP4/MOV pouvant commencer un fichier
+MP4_TOP_LEVEL_BOXES = {b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"}
+
+# Listes RIFF parcourues pour trouver la date (le flux 'movi' est sauté)
+RIFF_LISTS = {b"hdrl", b"strl", b"INFO", b"ncdt"}
+
+# Date ISO-8601 (ou EXIF 'YYYY:MM:DD HH:MM:SS') avec fraction de seconde et fuseau optionnels
+ISO_DATETIME = re.compile(
+    r"(\d{4})[-:](\d{2})[-:](\d{2})[T ]\s*(\d{1,2}):(\d{2}):(\d{2})"
+    r"(?:[.,](\d+))?\s*(Z|[+-]\d{2}(?::?\d{2})?)?",
+    re.IGNORECASE,
+)
+
+# Date au format ctime écrite dans le chunk IDIT ('Mon Jun 01 08:00:00 2024')
+CTIME_DATETIME = re.compile(
+    r"[a-z]{3}\s+([a-z]{3})\s+(\d{1,2})\s+(\d{1,2}:\d{2}:\d{2})\s+(\d{4})",
+    re.IGNORECASE,
+)
+
+
+class VideoMetadataError(Exception):
+    """Raised when the native parsers cannot read the date of a video."""
+
+
+def parse_datetime(value):
+    """
+    Parse a date written by a camera or by ffprobe.
+
+    Parameters
+    ----------
+    value : str or bytes
+        Date in ISO-8601 ('2024-06-01T08:00:00.000000Z',
+        '2024-06-01 08:00:00+02:00'...), EXIF ('2024:06:01 08:00:00') or ctime
+        ('Mon Jun 01 08:00:00 2024') format, possibly surrounded by other text
+        or NUL bytes.
+
+    Returns
+    -------
+    datetime.datetime
+        Naive datetime of the wall-clock time written in the value.
+
+    Raises
+    ------
+    ValueError
+        If no date can be found in the value.
+
+    Notes
+    -----
+    Fractional seconds are truncated to microseconds. The timezone, if any,
+    is parsed but dropped: the file names use the time as recorded, like the
+    EXIF dates of the images.
+    """
+    if isinstance(value, bytes):
+        value = value.decode("latin-1")
+    value = value.strip("\x00 \r\n")
+
+    match = ISO_DATETIME.search(value)
+    if match:
+        year, month, day, hour, minute, second, fraction, tz = match.groups()
+        microsecond = int((fraction or "0")[:6].ljust(6, "0"))
+        return datetime(
+            int(year),
+            int(month),
+            int(day),
+            int(hour),
+            int(minute),
+            int(second),
+            microsecond,
+        )
+
+    match = CTIME_DATETIME.search(value)
+    if match:
+        month, day, clock, year = match.groups()
+        return datetime.strptime(
+            f"{month.title()} {int(day):02d} {clock} {year}", "%b %d %H:%M:%S %Y"
+        )
+
+    raise ValueError(f"Date non reconnue: {value!r}")
+
+
+def _read_riff_date(f, end, depth=0):
+    """
+    Search the IDIT, ICRD or strd chunks of a RIFF list for a date.
+
+    Parameters
+    ----------
+    f : file object
+        Open file positioned at the first chunk of the list.
+    end : int
+        Offset of the end of the list.
+    depth : int, optional
+        Nesting level, to stop on corrupted files (default: 0).
+
+    Returns
+    -------
+    tuple of (datetime.datetime or None, bool)
+        The date found and whether it only comes from a 'strd' chunk. IDIT and
+        ICRD dates are returned as soon as they are found.
+    """
+    strd_date = None
+    while f.tell() + 8 <= end:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, size = struct.unpack("<4sI", header)
+        start = f.tell()
+        if chunk_id == b"LIST" and depth < 4:
+            if f.read(4) in RIFF_LISTS:
+                date, from_strd = _read_riff_date(f, min(start + size, end), depth + 1)
+                if date is not None and not from_strd:
+                    return date, False
+                strd_date = strd_date or date
+        elif chunk_id in (b"IDIT", b"ICRD"):
+            try:
+                return parse_datetime(f.read(size)), False
+            except ValueError:
+                pass
+        elif chunk_id == b"strd" and strd_date is None:
+            # Données propriétaires du constructeur : y chercher une date en texte
+            try:
+                strd_date = parse_datetime(f.read(min(size, 4096)))
+            except ValueError:
+                pass
+        # Les chunks sont alignés sur 2 octets
+        f.seek(start + size + (size & 1))
+    return strd_date, True
+
+
+def read_avi_creation_date(file_path):
+    """
+    Read the creation date of an AVI file from its RIFF header.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the AVI file.
+
+    Returns
+    -------
+    datetime.datetime or None
+        Date of the IDIT chunk (or INFO/ICRD, or a date found in a stream
+        'strd' chunk), None if the header has no date.
+
+    Raises
+    ------
+    VideoMetadataError
+        If the file is not a RIFF/AVI file.
+
+    Notes
+    -----
+    Only the header lists are read; the 'movi' list holding the frames is
+    skipped with a seek, so the cost does not depend on the clip length.
+    """
+    with open(file_path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"AVI ":
+            raise VideoMetadataError(f"{file_path} n'est pas un fichier AVI")
+        size = struct.unpack("<I", header[4:8])[0]
+        return _read_riff_date(f, 8 + size)[0]
+
+
+def _iter_boxes(f, end):
+    """Yield (type, payload offset, payload end) of the MP4 boxes up to end."""
+    while f.tell() + 8 <= end:
+        start = f.tell()
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+        elif size == 0:
+            size = end - start
+        if size < 8:
+            raise VideoMetadataError("Boîte MP4 invalide")
+        yield box_type, f.tell(), min(start + size, end)
+        f.seek(start + size)
+
+
+def read_mp4_creation_date(file_path):
+    """
+    Read the creation date of an MP4/MOV file from its 'mvhd' box.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the MP4 or MOV file.
+
+    Returns
+    -------
+    datetime.datetime or None
+        creation_time of the movie header, None if it is not set (0).
+
+    Raises
+    ------
+    VideoMetadataError
+        If the file is not an MP4/MOV file or has no 'mvhd' box.
+
+    Notes
+    -----
+    The 'mdat' box holding the frames is skipped with a seek, so a 'moov'
+    box written at the end of the file costs no more than one at the start.
+    The date is the value written by the camera, as reported by ffprobe
+    (UTC by the specification, local time on many cameras).
+    """
+    with open(file_path, "rb") as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        f.seek(0)
+        if f.read(8)[4:8] not in MP4_TOP_LEVEL_BOXES:
+            raise VideoMetadataError(f"{file_path} n'est pas un fichier MP4/MOV")
+        f.seek(0)
+        for box_type, offset, box_end in _iter_boxes(f, file_size):
+            if box_type != b"moov":
+                continue
+            f.seek(offset)
+            for sub_type, sub_offset, _ in _iter_boxes(f, box_end):
+                if sub_type != b"mvhd":
+                    continue
+                f.seek(sub_offset)
+                version = f.read(4)[0]
+                if version == 1:
+                    creation_time = struct.unpack(">Q", f.read(8))[0]
+                else:
+                    creation_time = struct.unpack(">I", f.read(4))[0]
+                if creation_time == 0:
+                    return None
+                return MP4_EPOCH + timedelta(seconds=creation_time)
+    raise VideoMetadataError(f"Pas de boîte 'mvhd' dans {file_path}")
+
+
+def get_video_creation_date(video_path):
+    """
+    Extract the creation date from a video file using ffprobe.
+
+    Parameters
+    ----------
+    video_path : str
+        Path to the video file.
+
+    Returns
+    -------
+    str or None
+        The creation time as a string in ISO format, or None if extraction fails.
+
+    Notes
+    -----
+    This function uses ffprobe from the ffmpeg suite to extract metadata.
+    """
+    # Run ffprobe command to get video metadata
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "format_tags=creation_time",
+        "-of",
+        "json",
+        video_path,
+    ]
+
+    result = subprocess.run(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+
+    if result.returncode != 0:
+        print("Error:", result.stderr)
+        return None
+
+    # Parse the JSON output
+    metadata = json.loads(result.stdout)
+    creation_time = metadata.get("format", {}).get("tags", {}).get("creation_time")
+
+    return creation_time
+
+
+def read_native_creation_date(file_path):
+    """
+    Read the creation date of a video with the pure Python container parsers.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the video file.
+
+    Returns
+    -------
+    datetime.datetime or None
+        The creation date, None if the container has none.
+
+    Raises
+    ------
+    VideoMetadataError
+        If the container is neither RIFF/AVI nor MP4/MOV.
+    """
+    with open(file_path, "rb") as f:
+        header = f.read(12)
+    if header[:4] == b"RIFF":
+        return read_avi_creation_date(file_path)
+    if header[4:8] in MP4_TOP_LEVEL_BOXES:
+        return read_mp4_creation_date(file_path)
+    raise VideoMetadataError(f"Conteneur vidéo non reconnu: {file_path}")
+
+
+def read_video_creation_date(file_path):
+    """
+    Read the creation date of a video, trying the native parsers first.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the video file.
+
+    Returns
+    -------
+    datetime.datetime or None
+        The creation date, or None if neither the container nor ffprobe
+        provide one.
+
+    Notes
+    -----
+    ffprobe is only started for files the native parsers cannot handle or
+    that have no date in their header, instead of once per video.
+    """
+    try:
+        value = read_native_creation_date(file_path)
+    except (VideoMetadataError, struct.error, IndexError):
+        value = None
+    if value is not None:
+        return value
+
+    value = get_video_creation_date(file_path)
+    if value is None:
+        return None
+    return parse_datetime(value)